@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+from mod_disk_cache import DiskCache, DEFAULT_MAX_BYTES, cache_key
+from mod_batch_converter import format_bytes
+
+# Cambiar al modificar el formato que producen los convertidores, para que
+# los resultados guardados con la versión anterior no se reutilicen
+CACHE_VERSION = 1
+
+# Carpeta de la caché por defecto
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "apa_docx")
+
+# Opciones que no cambian el documento resultante: ambos motores producen
+# el mismo documento y exportar el índice es un efecto aparte
+UNKEYED_OPTIONS = ("engine", "export_index")
+
+# Bytes leídos a la vez al calcular el hash de un documento
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def file_digest(path):
+    """Devuelve el SHA-256 del contenido de un archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+class APACache(DiskCache):
+    """Caché en disco de documentos _APA.docx, direccionada por contenido
+
+    La clave combina el hash del documento original con las opciones de
+    formato (encabezado, interlineado, umbrales de encabezados...) y el
+    convertidor usado, así que un documento reenviado sin cambios se
+    resuelve copiando el resultado anterior, sin abrirlo. Hereda de
+    DiskCache la expulsión por tamaño (LRU) y las estadísticas de aciertos.
+
+    El índice se guarda completo en cada operación: la caché debe usarse
+    desde un solo proceso (en los lotes en paralelo la consulta el proceso
+    principal).
+    """
+
+    def key_for(self, input_path, options, formatter):
+        """
+        Devuelve la clave de un documento formateado con unas opciones
+
+        Args:
+            input_path (str): Ruta del documento original
+            options (dict): Opciones completas (get_options del convertidor)
+            formatter (str): Nombre del convertidor ("basic", "enhanced"...)
+        """
+        keyed = {name: value for name, value in options.items() if name not in UNKEYED_OPTIONS}
+        parts = [CACHE_VERSION, formatter, file_digest(input_path), keyed]
+        if options.get("running_head") is None:
+            # Sin título en el documento, el encabezado sale del nombre del archivo
+            parts.append(os.path.splitext(os.path.basename(input_path))[0])
+        return cache_key(*parts)
+
+    def fetch(self, key, output_path):
+        """Copia el resultado guardado en output_path; devuelve False si no está en la caché"""
+        cached = self.get(key)
+        if cached is None:
+            return False
+        shutil.copyfile(cached[0], output_path)
+        return True
+
+    def store(self, key, output_path, input_path):
+        """Guarda una copia del resultado de un documento"""
+        self.put(key, src_path=output_path, meta={"input": os.path.basename(input_path)})
+
+def open_cache(cache_dir=None, max_mb=None):
+    """
+    Abre la caché de resultados APA
+
+    Args:
+        cache_dir (str): Carpeta de la caché (por defecto DEFAULT_CACHE_DIR)
+        max_mb (float): Tamaño máximo en MB (por defecto 1 GB)
+    """
+    max_bytes = int(max_mb * 1024 ** 2) if max_mb else DEFAULT_MAX_BYTES
+    return APACache(cache_dir or DEFAULT_CACHE_DIR, max_bytes)
+
+def format_with_cache(format_apa, input_path, output_path, options, cache, formatter):
+    """
+    Formatea un documento o, si ya se formateó igual, copia el resultado guardado
+
+    Args:
+        format_apa: Función format_apa del convertidor
+        input_path (str): Ruta del documento original
+        output_path (str): Ruta del resultado
+        options (dict): Opciones completas (get_options del convertidor)
+        cache (APACache): Caché de resultados
+        formatter (str): Nombre del convertidor, parte de la clave
+
+    Returns:
+        bool: True si el resultado salió de la caché
+    """
+    if options.get("export_index"):
+        # Exportar el índice de encabezados requiere abrir el documento
+        format_apa(input_path, output_path, options)
+        return False
+    key = cache.key_for(input_path, options, formatter)
+    if cache.fetch(key, output_path):
+        return True
+    format_apa(input_path, output_path, options)
+    cache.store(key, output_path, input_path)
+    return False
+
+def format_cache_stats(stats):
+    """Devuelve una línea con los aciertos, el porcentaje de aciertos y el tamaño de la caché"""
+    return (f"💾 Caché: {stats['hits']} aciertos, {stats['misses']} fallos "
+            f"({stats['hit_rate']:.0%} aciertos), {format_bytes(stats['bytes_saved'])} sin reprocesar, "
+            f"{stats['entries']} documentos ({format_bytes(stats['bytes'])}), "
+            f"{stats['evictions']} expulsados")
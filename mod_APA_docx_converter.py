@@ -1,112 +1,416 @@
 from docx import Document
-from docx.shared import Pt, Inches
+from docx.shared import Pt, Inches, Emu
+from docx.enum.section import WD_HEADER_FOOTER
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 import os
-from tkinter import Tk, filedialog
-
-# Ocultar la ventana principal de tkinter
-root = Tk()
-root.withdraw()
-
-# Abrir diálogo para seleccionar archivo
-print("📂 Selecciona el archivo DOCX a formatear...")
-input_path = filedialog.askopenfilename(
-    title="Seleccionar archivo DOCX",
-    filetypes=[("Documentos Word", "*.docx"), ("Todos los archivos", "*.*")]
-)
-
-# Verificar si se seleccionó un archivo
-if not input_path:
-    print("❌ No se seleccionó ningún archivo. Operación cancelada.")
-    exit()
-
-# Generar nombre de salida automáticamente
-file_dir = os.path.dirname(input_path)
-file_name = os.path.basename(input_path)
-file_name_without_ext = os.path.splitext(file_name)[0]
-output_path = os.path.join(file_dir, f"{file_name_without_ext}_APA.docx")
-
-try:
-    print(f"📄 Procesando: {file_name}")
-    
-    # Cargar el documento
-    doc = Document(input_path)
-    
-    # --- CONFIGURACIÓN GENERAL APA ---
+import argparse
+from mod_APA_cache import DEFAULT_CACHE_DIR, open_cache, format_with_cache, format_cache_stats
+
+# Opciones por defecto del formato APA
+DEFAULT_OPTIONS = {
+    # Texto del encabezado (None: título del documento o, si no tiene, nombre del archivo)
+    "running_head": None,
+    "font_name": "Times New Roman",
+    "font_size": 12,
+    "line_spacing": 2.0,  # APA usa doble espaciado
+    "first_line_indent": 0.5,  # Pulgadas
+    "margin": 1,  # Pulgadas
+    # True: fuente, interlineado y sangría se definen una vez en los estilos
+    # del documento y solo se modifican los runs/párrafos que los contradicen
+    "style_defaults": False,
+    # "python-docx" carga el documento completo; "stream" reescribe
+    # word/document.xml en streaming (mod_APA_docx_stream), para documentos muy grandes
+    "engine": "python-docx",
+}
+
+# Atributos de tema que tienen prioridad sobre el nombre de fuente en w:rFonts
+THEME_FONT_ATTRIBUTES = ["asciiTheme", "hAnsiTheme"]
+
+# APA 7: el encabezado es el título abreviado, en mayúsculas, de hasta 50 caracteres
+RUNNING_HEAD_MAX_LENGTH = 50
+
+# Ancho de la tabla del encabezado cuando no se conoce el tamaño de página (pulgadas)
+RUNNING_HEAD_WIDTH = 6.5
+
+# Descripción (w:tblCaption) que marca la tabla del encabezado APA, para
+# reemplazarla al volver a formatear un documento
+RUNNING_HEAD_CAPTION = "APA running head"
+
+def get_options(options=None):
+    """Combina las opciones recibidas con las opciones por defecto"""
+    return {**DEFAULT_OPTIONS, **(options or {})}
+
+def apa_output_path(input_path):
+    """Genera el nombre de salida: mismo directorio y nombre con sufijo _APA.docx"""
+    file_dir = os.path.dirname(input_path)
+    file_name_without_ext = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(file_dir, f"{file_name_without_ext}_APA.docx")
+
+def running_head_text(options, title=None, input_file=None):
+    """
+    Devuelve el texto del encabezado: el de las opciones o, si es None, el
+    título del documento (o el nombre del archivo) en mayúsculas y abreviado
+
+    Args:
+        options (dict): Opciones de formato
+        title (str): Título de las propiedades del documento
+        input_file (str | file-like): Documento original
+    """
+    if options["running_head"] is not None:
+        return options["running_head"]
+    if not title and isinstance(input_file, str):
+        title = os.path.splitext(os.path.basename(input_file))[0].replace("_", " ")
+    text = " ".join((title or "").split()).upper()
+    if len(text) > RUNNING_HEAD_MAX_LENGTH:
+        # Cortar en el último espacio para no partir palabras
+        text = text[:RUNNING_HEAD_MAX_LENGTH + 1].rsplit(" ", 1)[0]
+    return text
+
+def document_title(doc):
+    """Título de las propiedades del documento (sin crearlas si el documento no las tiene)"""
+    try:
+        doc.part.package.part_related_by(RT.CORE_PROPERTIES)
+    except KeyError:
+        return None
+    return doc.core_properties.title
+
+def apply_margins(doc, options):
+    """Configura los márgenes de todas las secciones"""
     for section in doc.sections:
-        section.top_margin = Inches(1)
-        section.bottom_margin = Inches(1)
-        section.left_margin = Inches(1)
-        section.right_margin = Inches(1)
-    
-    # --- FORMATO DE PÁRRAFOS ---
+        section.top_margin = Inches(options["margin"])
+        section.bottom_margin = Inches(options["margin"])
+        section.left_margin = Inches(options["margin"])
+        section.right_margin = Inches(options["margin"])
+
+def paragraph_defaults(options):
+    """Formato de párrafo APA que se guarda en los estilos del documento"""
+    return {
+        "line_spacing": options["line_spacing"],
+        "first_line_indent": Inches(options["first_line_indent"]),
+        "alignment": WD_ALIGN_PARAGRAPH.JUSTIFY,
+    }
+
+def has_theme_font(element):
+    """Indica si el rPr de un elemento usa fuentes del tema (que ignoran el nombre de fuente)"""
+    rPr = element.rPr
+    rFonts = rPr.rFonts if rPr is not None else None
+    return rFonts is not None and any(
+        rFonts.get(qn(f"w:{name}")) for name in THEME_FONT_ATTRIBUTES
+    )
+
+def set_style_defaults(doc, options, paragraph_format):
+    """
+    Define fuente y formato de párrafo una sola vez en el estilo Normal
+    y en los demás estilos de párrafo usados por el documento (Heading 1...)
+
+    Args:
+        doc: Documento de python-docx
+        options (dict): Opciones de formato
+        paragraph_format (dict): Atributos de paragraph_format y sus valores
+    """
+    style_ids = {"Normal"}
+    for paragraph in doc.paragraphs:
+        pPr = paragraph._p.pPr
+        if pPr is not None and pPr.pStyle is not None:
+            style_ids.add(pPr.pStyle.val)
+
+    for style in doc.styles:
+        if style.style_id not in style_ids:
+            continue
+        style.font.name = options["font_name"]
+        style.font.size = Pt(options["font_size"])
+        # Quitar las fuentes del tema para que se use el nombre de fuente
+        rFonts = style.element.rPr.rFonts
+        for name in THEME_FONT_ATTRIBUTES:
+            rFonts.attrib.pop(qn(f"w:{name}"), None)
+        for attribute, value in paragraph_format.items():
+            setattr(style.paragraph_format, attribute, value)
+
+def clear_overrides(paragraph, options, paragraph_format):
+    """
+    Elimina solo el formato directo que contradice los estilos: fuente o tamaño
+    distintos en los runs y formato de párrafo distinto al del estilo
+
+    Args:
+        paragraph: Párrafo de python-docx
+        options (dict): Opciones de formato
+        paragraph_format (dict): Atributos de paragraph_format y sus valores
+    """
+    font_size = Pt(options["font_size"])
+    for run in paragraph.runs:
+        font = run.font
+        if font.name not in (None, options["font_name"]) or has_theme_font(run._r):
+            run._r.rPr._remove_rFonts()
+        if font.size is not None and font.size != font_size:
+            font.size = None
+        # No dejar un rPr vacío en el run
+        rPr = run._r.rPr
+        if rPr is not None and len(rPr) == 0:
+            run._r.remove(rPr)
+
+    for attribute, value in paragraph_format.items():
+        current = getattr(paragraph.paragraph_format, attribute)
+        if current is not None and current != value:
+            setattr(paragraph.paragraph_format, attribute, None)
+
+def format_paragraphs(doc, options):
+    """Aplica fuente, interlineado, sangría y justificación a todos los párrafos"""
+    if options["style_defaults"]:
+        # Formato en los estilos y solo se corrigen las excepciones
+        defaults = paragraph_defaults(options)
+        set_style_defaults(doc, options, defaults)
+        for paragraph in doc.paragraphs:
+            clear_overrides(paragraph, options, defaults)
+        return
+
     for paragraph in doc.paragraphs:
         for run in paragraph.runs:
-            run.font.name = "Times New Roman"
-            run.font.size = Pt(12)
-        paragraph.paragraph_format.line_spacing = 2.0  # APA usa doble espaciado
-        paragraph.paragraph_format.first_line_indent = Inches(0.5)
+            run.font.name = options["font_name"]
+            run.font.size = Pt(options["font_size"])
+        paragraph.paragraph_format.line_spacing = options["line_spacing"]
+        paragraph.paragraph_format.first_line_indent = Inches(options["first_line_indent"])
         paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-    
-    # --- ENCABEZADO APA ---
+
+def text_width(page_width, left_margin, right_margin):
+    """Ancho del área de texto de una sección (Length), o RUNNING_HEAD_WIDTH si no se conoce la página"""
+    if page_width is None:
+        return Inches(RUNNING_HEAD_WIDTH)
+    return Emu(page_width - (left_margin or 0) - (right_margin or 0))
+
+def is_running_head_table(tbl):
+    """
+    Indica si una tabla de un encabezado es el encabezado APA de un formato
+    anterior: marcada con RUNNING_HEAD_CAPTION o, en documentos formateados
+    antes de la marca, una fila de dos celdas con el campo PAGE a la derecha
+    """
+    caption = tbl.tblPr.find(qn("w:tblCaption"))
+    if caption is not None:
+        return caption.get(qn("w:val")) == RUNNING_HEAD_CAPTION
+    rows = tbl.tr_lst
+    if len(rows) != 1 or len(rows[0].tc_lst) != 2:
+        return False
+    return [instr.text for instr in rows[0].tc_lst[1].xpath(".//w:instrText")] == [" PAGE "]
+
+def build_running_head(header, options, width=None):
+    """
+    Escribe el encabezado APA en un encabezado: título a la izquierda y número
+    de página a la derecha, en una tabla sin bordes. El encabezado APA de un
+    formato anterior se reemplaza, así que volver a formatear no lo duplica
+
+    Args:
+        header: Encabezado de python-docx (o cualquier contenedor de bloques sobre un w:hdr)
+        options (dict): Opciones de formato
+        width (Length): Ancho de la tabla (por defecto, RUNNING_HEAD_WIDTH)
+    """
+    # Quitar el encabezado APA anterior
+    for table in header.tables:
+        if is_running_head_table(table._tbl):
+            table._tbl.getparent().remove(table._tbl)
+
+    # Limpiar encabezado previo
+    for p in header.paragraphs:
+        p.clear()
+
+    # Crear tabla invisible para alinear título (izq.) y página (der.)
+    table = header.add_table(rows=1, cols=2, width=width or Inches(RUNNING_HEAD_WIDTH))
+    caption = OxmlElement('w:tblCaption')
+    caption.set(qn('w:val'), RUNNING_HEAD_CAPTION)
+    table._tbl.tblPr.append(caption)
+
+    # Título en la celda izquierda
+    left_cell = table.rows[0].cells[0]
+    left_paragraph = left_cell.paragraphs[0]
+    left_paragraph.text = options["running_head"] or ""
+    left_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    for run in left_paragraph.runs:
+        run.font.name = options["font_name"]
+        run.font.size = Pt(options["font_size"])
+
+    # Número de página en la celda derecha
+    right_cell = table.rows[0].cells[1]
+    right_paragraph = right_cell.paragraphs[0]
+    right_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    run = right_paragraph.add_run()
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText = OxmlElement('w:instrText')
+    instrText.text = " PAGE "
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'end')
+
+    run._element.append(fldChar1)
+    run._element.append(instrText)
+    run._element.append(fldChar2)
+
+    # Hacer la tabla invisible (sin bordes)
+    for row in table.rows:
+        for cell in row.cells:
+            tcPr = cell._element.get_or_add_tcPr()
+            tcBorders = OxmlElement('w:tcBorders')
+            for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
+                border = OxmlElement(f'w:{border_name}')
+                border.set(qn('w:val'), 'none')
+                tcBorders.append(border)
+            tcPr.append(tcBorders)
+
+def add_running_head(doc, options):
+    """
+    Agrega el encabezado APA construyéndolo una sola vez: cada sección hereda
+    el encabezado de la anterior si su área de texto tiene el mismo ancho, y
+    si no recibe uno propio. Los encabezados que dejan de usarse se eliminan
+    """
+    width = None
+    built = set()
+    dropped = set()
     for section in doc.sections:
+        sectPr = section._sectPr
+        reference = sectPr.get_headerReference(WD_HEADER_FOOTER.PRIMARY)
+        section_width = text_width(section.page_width, section.left_margin, section.right_margin)
+        if section_width == width:
+            # Heredar el encabezado de la sección anterior
+            if reference is not None:
+                dropped.add(sectPr.remove_headerReference(WD_HEADER_FOOTER.PRIMARY))
+            continue
+
+        if reference is not None and reference.rId in built:
+            # La parte ya tiene el encabezado de otra sección con otro ancho
+            sectPr.remove_headerReference(WD_HEADER_FOOTER.PRIMARY)
         header = section.header
         header.is_linked_to_previous = False
-        
-        # Limpiar encabezado previo
-        for p in header.paragraphs:
-            p.clear()
-        
-        # Crear tabla invisible para alinear título (izq.) y página (der.)
-        table = header.add_table(rows=1, cols=2, width=Inches(6.5))
-        
-        # Título en la celda izquierda
-        left_cell = table.rows[0].cells[0]
-        left_paragraph = left_cell.paragraphs[0]
-        left_paragraph.text = "IMPLEMENTACIÓN DE BIG DATA EN LA COOPERATIVA JEP"
-        left_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        for run in left_paragraph.runs:
-            run.font.name = "Times New Roman"
-            run.font.size = Pt(12)
-        
-        # Número de página en la celda derecha
-        right_cell = table.rows[0].cells[1]
-        right_paragraph = right_cell.paragraphs[0]
-        right_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        run = right_paragraph.add_run()
-        fldChar1 = OxmlElement('w:fldChar')
-        fldChar1.set(qn('w:fldCharType'), 'begin')
-        instrText = OxmlElement('w:instrText')
-        instrText.text = " PAGE "
-        fldChar2 = OxmlElement('w:fldChar')
-        fldChar2.set(qn('w:fldCharType'), 'end')
-        
-        run._element.append(fldChar1)
-        run._element.append(instrText)
-        run._element.append(fldChar2)
-        
-        # Hacer la tabla invisible (sin bordes)
-        for row in table.rows:
-            for cell in row.cells:
-                tcPr = cell._element.get_or_add_tcPr()
-                tcBorders = OxmlElement('w:tcBorders')
-                for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-                    border = OxmlElement(f'w:{border_name}')
-                    border.set(qn('w:val'), 'none')
-                    tcBorders.append(border)
-                tcPr.append(tcBorders)
-    
+        build_running_head(header, options, section_width)
+        built.add(sectPr.get_headerReference(WD_HEADER_FOOTER.PRIMARY).rId)
+        width = section_width
+
+    # Quitar las relaciones con encabezados que ya no usa ninguna sección
+    # (python-docx las quita aunque otra sección todavía las use)
+    in_use = {
+        reference.rId
+        for section in doc.sections
+        for reference in section._sectPr.headerReference_lst
+    }
+    for rId in dropped - in_use:
+        doc.part.drop_rel(rId)
+
+def format_apa(input_file, output_file, options=None):
+    """
+    Aplica el formato APA a un documento DOCX sin interfaz gráfica
+
+    Args:
+        input_file (str | file-like): Ruta o archivo abierto del documento original
+        output_file (str | file-like): Ruta o archivo abierto donde guardar el resultado
+        options (dict): Opciones que reemplazan a DEFAULT_OPTIONS
+
+    Returns:
+        output_file
+    """
+    options = get_options(options)
+
+    if options["engine"] == "stream":
+        # Motor en streaming: no construye el árbol de python-docx
+        from mod_APA_docx_stream import format_apa_stream
+        return format_apa_stream(input_file, output_file, options)
+
+    # Cargar el documento
+    doc = Document(input_file)
+    options["running_head"] = running_head_text(options, document_title(doc), input_file)
+
+    # --- CONFIGURACIÓN GENERAL APA ---
+    apply_margins(doc, options)
+
+    # --- FORMATO DE PÁRRAFOS ---
+    format_paragraphs(doc, options)
+
+    # --- ENCABEZADO APA ---
+    add_running_head(doc, options)
+
     # Guardar el documento
-    doc.save(output_path)
-    print(f"\n✅ Documento formateado con éxito!")
-    print(f"📁 Archivo original: {input_path}")
-    print(f"💾 Archivo guardado: {output_path}")
-    print(f"📍 Ubicación: {os.path.abspath(output_path)}")
-
-except Exception as e:
-    print(f"\n❌ Error al procesar el documento: {e}")
-    import traceback
-    traceback.print_exc()
\ No newline at end of file
+    doc.save(output_file)
+    return output_file
+
+def select_docx_files():
+    """Abre un diálogo para seleccionar uno o varios archivos DOCX"""
+    # tkinter solo se importa cuando se usa el diálogo
+    from tkinter import Tk, filedialog
+
+    # Ocultar la ventana principal de tkinter
+    root = Tk()
+    root.withdraw()
+
+    input_paths = filedialog.askopenfilenames(
+        title="Seleccionar archivo DOCX",
+        filetypes=[("Documentos Word", "*.docx"), ("Todos los archivos", "*.*")]
+    )
+
+    root.destroy()
+    return list(input_paths)
+
+def parse_args():
+    """Lee los argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Aplica formato APA a documentos DOCX")
+    parser.add_argument("files", nargs="*",
+                        help="Documentos DOCX a formatear (abre un diálogo si se omiten)")
+    parser.add_argument("--running-head", default=DEFAULT_OPTIONS["running_head"],
+                        help="Texto del encabezado (por defecto, el título del documento "
+                             "o el nombre del archivo)")
+    parser.add_argument("--style-defaults", action="store_true",
+                        help="Definir el formato en los estilos en lugar de en cada run")
+    parser.add_argument("--engine", choices=["python-docx", "stream"],
+                        default=DEFAULT_OPTIONS["engine"],
+                        help="Motor de formato (stream: documentos muy grandes, menos memoria)")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR",
+                        help="Reutilizar los resultados de documentos ya formateados con las "
+                             f"mismas opciones (caché en DIR, por defecto {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help="Tamaño máximo de la caché en MB (por defecto 1024)")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    options = {
+        "running_head": args.running_head,
+        "style_defaults": args.style_defaults,
+        "engine": args.engine,
+    }
+
+    input_paths = args.files
+    if not input_paths:
+        # Abrir diálogo para seleccionar archivo
+        print("📂 Selecciona el archivo DOCX a formatear...")
+        input_paths = select_docx_files()
+
+    # Verificar si se seleccionó un archivo
+    if not input_paths:
+        print("❌ No se seleccionó ningún archivo. Operación cancelada.")
+        return
+
+    cache = open_cache(args.cache, args.cache_max_mb) if args.cache else None
+    for input_path in input_paths:
+        # Generar nombre de salida automáticamente
+        output_path = apa_output_path(input_path)
+        try:
+            print(f"📄 Procesando: {os.path.basename(input_path)}")
+            if cache is None:
+                format_apa(input_path, output_path, options)
+            elif format_with_cache(format_apa, input_path, output_path, get_options(options),
+                                   cache, "basic"):
+                print("💾 Documento sin cambios: resultado tomado de la caché")
+            print(f"\n✅ Documento formateado con éxito!")
+            print(f"📁 Archivo original: {input_path}")
+            print(f"💾 Archivo guardado: {output_path}")
+            print(f"📍 Ubicación: {os.path.abspath(output_path)}")
+
+        except Exception as e:
+            print(f"\n❌ Error al procesar el documento: {e}")
+            import traceback
+            traceback.print_exc()
+
+    if cache is not None:
+        print(format_cache_stats(cache.stats()))
+
+if __name__ == "__main__":
+    main()
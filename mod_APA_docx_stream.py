@@ -0,0 +1,428 @@
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+from lxml import etree
+from docx.blkcntnr import BlockItemContainer
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.parts.hdrftr import HeaderPart
+from docx.shared import Pt, Inches, Emu, Twips
+from mod_APA_docx_converter import get_options, build_running_head, running_head_text, text_width
+
+# Orden de los hijos de w:rPr, w:pPr y w:sectPr según el esquema (el mismo
+# que usa python-docx): un elemento nuevo se inserta antes de sus sucesores
+RPR_ORDER = (
+    "w:rStyle", "w:rFonts", "w:b", "w:bCs", "w:i", "w:iCs", "w:caps", "w:smallCaps",
+    "w:strike", "w:dstrike", "w:outline", "w:shadow", "w:emboss", "w:imprint",
+    "w:noProof", "w:snapToGrid", "w:vanish", "w:webHidden", "w:color", "w:spacing",
+    "w:w", "w:kern", "w:position", "w:sz", "w:szCs", "w:highlight", "w:u", "w:effect",
+    "w:bdr", "w:shd", "w:fitText", "w:vertAlign", "w:rtl", "w:cs", "w:em", "w:lang",
+    "w:eastAsianLayout", "w:specVanish", "w:oMath",
+)
+PPR_ORDER = (
+    "w:pStyle", "w:keepNext", "w:keepLines", "w:pageBreakBefore", "w:framePr",
+    "w:widowControl", "w:numPr", "w:suppressLineNumbers", "w:pBdr", "w:shd", "w:tabs",
+    "w:suppressAutoHyphens", "w:kinsoku", "w:wordWrap", "w:overflowPunct",
+    "w:topLinePunct", "w:autoSpaceDE", "w:autoSpaceDN", "w:bidi", "w:adjustRightInd",
+    "w:snapToGrid", "w:spacing", "w:ind", "w:contextualSpacing", "w:mirrorIndents",
+    "w:suppressOverlap", "w:jc", "w:textDirection", "w:textAlignment",
+    "w:textboxTightWrap", "w:outlineLvl", "w:divId", "w:cnfStyle", "w:rPr", "w:sectPr",
+    "w:pPrChange",
+)
+SECTPR_ORDER = (
+    "w:headerReference", "w:footnotePr", "w:endnotePr", "w:type", "w:pgSz", "w:pgMar",
+    "w:paperSrc", "w:pgBorders", "w:lnNumType", "w:pgNumType", "w:cols", "w:formProt",
+    "w:vAlign", "w:noEndnote", "w:titlePg", "w:textDirection", "w:bidi", "w:rtlGutter",
+    "w:docGrid", "w:printerSettings", "w:sectPrChange",
+)
+
+# Partes del paquete OPC
+CONTENT_TYPES_PATH = "[Content_Types].xml"
+PACKAGE_RELS_PATH = "_rels/.rels"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+PR_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+RT_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+RT_CORE_PROPERTIES = "http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties"
+DC_TITLE = "{http://purl.org/dc/elements/1.1/}title"
+RT_HEADER = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/header"
+CT_HEADER = "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"
+
+# Declaraciones de espacio de nombres en la etiqueta de apertura de un elemento
+XMLNS_RE = re.compile(rb' xmlns(?::([\w.-]+))?="([^"]*)"')
+
+def successor_tags(order):
+    """Devuelve, para cada etiqueta de un orden del esquema, el conjunto de etiquetas que van después"""
+    tags = [qn(name) for name in order]
+    return {tag: set(tags[index + 1:]) for index, tag in enumerate(tags)}
+
+RPR_SUCCESSORS = successor_tags(RPR_ORDER)
+PPR_SUCCESSORS = successor_tags(PPR_ORDER)
+SECTPR_SUCCESSORS = successor_tags(SECTPR_ORDER)
+
+W_P, W_R, W_PPR, W_RPR, W_SECTPR = qn("w:p"), qn("w:r"), qn("w:pPr"), qn("w:rPr"), qn("w:sectPr")
+W_BODY = qn("w:body")
+W_HEADER_REFERENCE, W_PGSZ, W_PGMAR = qn("w:headerReference"), qn("w:pgSz"), qn("w:pgMar")
+W_VAL, W_TYPE, R_ID = qn("w:val"), qn("w:type"), qn("r:id")
+
+def get_or_add_first(parent, tag):
+    """Devuelve el hijo tag (w:pPr, w:rPr), creándolo como primer hijo si falta"""
+    child = parent.find(tag)
+    if child is None:
+        child = etree.SubElement(parent, tag)
+        parent.insert(0, child)
+    return child
+
+def get_or_add(parent, tag, successors):
+    """Devuelve el hijo tag de un elemento, creándolo en la posición que fija el esquema"""
+    child = parent.find(tag)
+    if child is not None:
+        return child
+    return add_child(parent, tag, successors)
+
+def add_child(parent, tag, successors):
+    """Agrega un hijo tag antes del primero de sus sucesores en el esquema"""
+    child = etree.SubElement(parent, tag)
+    following = successors[tag]
+    for sibling in parent:
+        if sibling.tag in following:
+            sibling.addprevious(child)
+            break
+    return child
+
+def xml_formats(options):
+    """
+    Precalcula los valores XML del formato APA (los mismos que escribe python-docx)
+
+    Returns:
+        dict: Atributos de w:rFonts, w:sz, w:spacing, w:ind, w:jc y w:pgMar
+    """
+    indent = Inches(options["first_line_indent"]).twips
+    margin = str(Inches(options["margin"]).twips)
+    return {
+        "rFonts": {qn("w:ascii"): options["font_name"], qn("w:hAnsi"): options["font_name"]},
+        "sz": str(int(Pt(options["font_size"]).pt * 2)),
+        "spacing": {
+            qn("w:line"): str(Emu(options["line_spacing"] * Twips(240)).twips),
+            qn("w:lineRule"): "auto",
+        },
+        # Una sangría negativa es sangría francesa
+        "ind": (qn("w:firstLine"), str(indent)) if indent >= 0 else (qn("w:hanging"), str(-indent)),
+        "jc": "both",
+        "pgMar": {qn(f"w:{side}"): margin for side in ("top", "bottom", "left", "right")},
+    }
+
+def format_paragraph(p, formats):
+    """Aplica fuente, interlineado, sangría y justificación a un w:p del cuerpo"""
+    for r in p.iterchildren(W_R):
+        rPr = get_or_add_first(r, W_RPR)
+        rFonts = get_or_add(rPr, qn("w:rFonts"), RPR_SUCCESSORS)
+        for name, value in formats["rFonts"].items():
+            rFonts.set(name, value)
+        get_or_add(rPr, qn("w:sz"), RPR_SUCCESSORS).set(W_VAL, formats["sz"])
+
+    pPr = get_or_add_first(p, W_PPR)
+    spacing = get_or_add(pPr, qn("w:spacing"), PPR_SUCCESSORS)
+    for name, value in formats["spacing"].items():
+        spacing.set(name, value)
+    ind = get_or_add(pPr, qn("w:ind"), PPR_SUCCESSORS)
+    ind.attrib.pop(qn("w:firstLine"), None)
+    ind.attrib.pop(qn("w:hanging"), None)
+    ind.set(*formats["ind"])
+    get_or_add(pPr, qn("w:jc"), PPR_SUCCESSORS).set(W_VAL, formats["jc"])
+
+def format_section(sectPr, formats, headers):
+    """
+    Aplica los márgenes a una sección y le asigna el encabezado APA
+
+    Args:
+        sectPr: Elemento w:sectPr
+        formats (dict): Valores de xml_formats
+        headers (SectionHeaders): Encabezados de las secciones del documento
+    """
+    pgMar = get_or_add(sectPr, W_PGMAR, SECTPR_SUCCESSORS)
+    for name, value in formats["pgMar"].items():
+        pgMar.set(name, value)
+
+    # Ancho del área de texto, con las mismas conversiones que python-docx
+    pgSz = sectPr.find(W_PGSZ)
+    page_width = pgSz.get(qn("w:w")) if pgSz is not None else None
+    width = text_width(
+        Twips(int(page_width)) if page_width is not None else None,
+        Twips(int(pgMar.get(qn("w:left")))),
+        Twips(int(pgMar.get(qn("w:right")))),
+    )
+    headers.section(sectPr, width)
+
+def tag_bytes(element):
+    """Devuelve las etiquetas de apertura y cierre de un elemento (sin sus hijos)"""
+    shell = etree.Element(element.tag, element.attrib, nsmap=element.nsmap)
+    shell.text = ""
+    data = etree.tostring(shell)
+    end = data.index(b">") + 1
+    return data[:end], data[end:]
+
+def namespace_declarations(nsmap):
+    """Devuelve las declaraciones (prefijo, uri) en bytes de un nsmap de lxml"""
+    return {(prefix.encode() if prefix else None, uri.encode()) for prefix, uri in nsmap.items()}
+
+def strip_declarations(data, declared):
+    """
+    Quita de la etiqueta de apertura de un elemento serializado las
+    declaraciones de espacio de nombres que ya están en el elemento raíz
+    (lxml las repite en cada elemento que se serializa por separado)
+
+    Args:
+        data (bytes): Elemento serializado
+        declared (set): Declaraciones del elemento raíz (de namespace_declarations)
+    """
+    end = data.index(b">")
+
+    def keep(match):
+        return b"" if (match.group(1), match.group(2)) in declared else match.group(0)
+
+    return XMLNS_RE.sub(keep, data[:end]) + data[end:]
+
+def stream_document(stream, out, formats, headers):
+    """
+    Reescribe word/document.xml elemento a elemento con iterparse: cada hijo
+    del cuerpo se formatea, se escribe y se libera, así la memoria no crece
+    con el tamaño del documento
+
+    Args:
+        stream: Archivo abierto con el XML original
+        out: Archivo binario donde se escribe el XML formateado
+        formats (dict): Valores de xml_formats
+        headers (SectionHeaders): Encabezados de las secciones del documento
+    """
+    declared = None
+    closing = []
+    # Número de elementos abiertos: raíz 1, cuerpo 2, hijos del cuerpo 3
+    depth = 0
+    for event, element in etree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                declared = namespace_declarations(element.nsmap)
+                start, end = tag_bytes(element)
+                closing.append(end)
+                out.write(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n")
+                out.write(start)
+            elif depth == 2 and element.tag == W_BODY:
+                start, end = tag_bytes(element)
+                closing.append(end)
+                out.write(strip_declarations(start, declared))
+            continue
+
+        depth -= 1
+        if depth == 0 or (depth == 1 and element.tag == W_BODY):
+            # Fin del cuerpo o del documento
+            out.write(closing.pop())
+            continue
+        if depth == 1:
+            # Hijo del documento antes del cuerpo (w:background)
+            pass
+        elif depth == 2 and element.getparent().tag == W_BODY:
+            # Hijo del cuerpo: párrafo, tabla o propiedades de la última sección
+            if element.tag == W_P:
+                format_paragraph(element, formats)
+                sectPr = element.find(W_PPR).find(W_SECTPR)
+                if sectPr is not None:
+                    format_section(sectPr, formats, headers)
+            elif element.tag == W_SECTPR:
+                format_section(element, formats, headers)
+        else:
+            # Los elementos internos se escriben con su hijo del cuerpo
+            continue
+
+        out.write(strip_declarations(etree.tostring(element, with_tail=False), declared))
+        # Liberar lo ya escrito
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+class SectionHeaders:
+    """
+    Encabezados de las secciones de un documento en streaming, con las mismas
+    reglas que add_running_head: cada sección hereda el encabezado de la
+    anterior si su área de texto tiene el mismo ancho y si no recibe uno
+    propio. Los encabezados nuevos reciben parte y rId como en python-docx
+    """
+
+    def __init__(self, part_names, rIds):
+        self.part_names = set(part_names)
+        self.rIds = set(rIds)
+        # rId -> nombre de la parte nueva (sin "/" inicial)
+        self.new_parts = {}
+        # (rId, ancho) de cada encabezado a construir, en orden
+        self.builds = []
+        # rIds cuya referencia se quitó y rIds que alguna sección sigue usando
+        self.dropped = set()
+        self.in_use = set()
+        self.width = None
+
+    def add(self):
+        """Reserva un encabezado nuevo y devuelve su rId"""
+        number = 1
+        while f"word/header{number}.xml" in self.part_names:
+            number += 1
+        part_name = f"word/header{number}.xml"
+        self.part_names.add(part_name)
+
+        number = 1
+        while f"rId{number}" in self.rIds:
+            number += 1
+        rId = f"rId{number}"
+        self.rIds.add(rId)
+        self.new_parts[rId] = part_name
+        return rId
+
+    def section(self, sectPr, width):
+        """Enlaza una sección a la anterior o le asigna su propio encabezado"""
+        reference = None
+        for candidate in sectPr.iterchildren(W_HEADER_REFERENCE):
+            if candidate.get(W_TYPE) == "default":
+                reference = candidate
+                break
+
+        if width == self.width:
+            # Heredar el encabezado de la sección anterior
+            if reference is not None:
+                self.dropped.add(reference.get(R_ID))
+                sectPr.remove(reference)
+        else:
+            if reference is not None and reference.get(R_ID) in {rId for rId, _ in self.builds}:
+                # La parte ya tiene el encabezado de otra sección con otro ancho
+                sectPr.remove(reference)
+                reference = None
+            if reference is None:
+                reference = add_child(sectPr, W_HEADER_REFERENCE, SECTPR_SUCCESSORS)
+                reference.set(W_TYPE, "default")
+                reference.set(R_ID, self.add())
+            self.builds.append((reference.get(R_ID), width))
+            self.width = width
+
+        self.in_use.update(candidate.get(R_ID) for candidate in sectPr.iterchildren(W_HEADER_REFERENCE))
+
+def document_part_name(source):
+    """Devuelve el nombre de la parte principal del documento (word/document.xml)"""
+    rels = etree.fromstring(source.read(PACKAGE_RELS_PATH))
+    for rel in rels.iter(f"{{{PR_NS}}}Relationship"):
+        if rel.get("Type") == RT_OFFICE_DOCUMENT:
+            return rel.get("Target").lstrip("/")
+    raise ValueError("El paquete no tiene documento principal")
+
+def core_title(source):
+    """Devuelve el título de las propiedades del documento (docProps/core.xml), o None"""
+    rels = etree.fromstring(source.read(PACKAGE_RELS_PATH))
+    for rel in rels.iter(f"{{{PR_NS}}}Relationship"):
+        if rel.get("Type") == RT_CORE_PROPERTIES:
+            title = etree.fromstring(source.read(rel.get("Target").lstrip("/"))).find(DC_TITLE)
+            return title.text if title is not None else None
+    return None
+
+def rels_part_name(part_name):
+    """Devuelve la parte de relaciones de una parte (word/_rels/document.xml.rels)"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+def serialize_part(element):
+    """Serializa una parte XML como lo hace python-docx al guardar"""
+    return etree.tostring(element, encoding="UTF-8", standalone=True)
+
+def format_apa_stream(input_file, output_file, options=None):
+    """
+    Aplica el formato APA reescribiendo el XML del DOCX en streaming, sin
+    construir el árbol de python-docx: el resultado es el mismo que el de
+    format_apa con menos memoria y tiempo en documentos muy grandes.
+    Las partes que no cambian se copian byte a byte.
+
+    Args:
+        input_file (str | file-like): Ruta o archivo abierto del documento original
+        output_file (str | file-like): Ruta o archivo abierto donde guardar el resultado
+        options (dict): Opciones que reemplazan a DEFAULT_OPTIONS
+
+    Returns:
+        output_file
+    """
+    options = get_options(options)
+    if options["style_defaults"]:
+        raise ValueError("El motor stream no admite style_defaults; usa el motor python-docx")
+    formats = xml_formats(options)
+
+    with zipfile.ZipFile(input_file) as source, tempfile.TemporaryFile() as document_xml:
+        options["running_head"] = running_head_text(options, core_title(source), input_file)
+        document_name = document_part_name(source)
+        document_rels_name = rels_part_name(document_name)
+        names = source.namelist()
+        if document_rels_name in names:
+            rels = etree.fromstring(source.read(document_rels_name))
+        else:
+            rels = etree.Element(f"{{{PR_NS}}}Relationships", nsmap={None: PR_NS})
+        relationships = {rel.get("Id"): rel for rel in rels.iter(f"{{{PR_NS}}}Relationship")}
+
+        # --- FORMATO DEL CUERPO Y DE LAS SECCIONES ---
+        headers = SectionHeaders(names, relationships)
+        with source.open(document_name) as stream:
+            stream_document(stream, document_xml, formats, headers)
+
+        # --- ENCABEZADO APA ---
+        document_dir = posixpath.dirname(document_name)
+
+        def header_part_name(rId):
+            if rId in headers.new_parts:
+                return headers.new_parts[rId]
+            return posixpath.normpath(posixpath.join(document_dir, relationships[rId].get("Target")))
+
+        header_parts = {}
+        for rId, width in headers.builds:
+            part_name = header_part_name(rId)
+            if part_name not in header_parts:
+                if rId in headers.new_parts:
+                    header_parts[part_name] = parse_xml(HeaderPart._default_header_xml())
+                else:
+                    header_parts[part_name] = parse_xml(source.read(part_name))
+            build_running_head(BlockItemContainer(header_parts[part_name], None), options, width)
+        changed = {name: serialize_part(element) for name, element in header_parts.items()}
+
+        # Encabezados que ya no usa ninguna sección: se quitan la relación y la parte
+        removed = set()
+        for rId in headers.dropped - headers.in_use:
+            part_name = header_part_name(rId)
+            removed.update([part_name, rels_part_name(part_name)])
+            rels.remove(relationships.pop(rId))
+
+        if headers.new_parts or removed:
+            for rId, part_name in headers.new_parts.items():
+                etree.SubElement(rels, f"{{{PR_NS}}}Relationship", Id=rId, Type=RT_HEADER,
+                                 Target=posixpath.relpath(part_name, document_dir))
+            changed[document_rels_name] = serialize_part(rels)
+
+            content_types = etree.fromstring(source.read(CONTENT_TYPES_PATH))
+            for override in content_types.findall(f"{{{CT_NS}}}Override"):
+                if override.get("PartName").lstrip("/") in removed:
+                    content_types.remove(override)
+            for part_name in headers.new_parts.values():
+                etree.SubElement(content_types, f"{{{CT_NS}}}Override",
+                                 PartName=f"/{part_name}", ContentType=CT_HEADER)
+            changed[CONTENT_TYPES_PATH] = serialize_part(content_types)
+
+        # --- GUARDAR ---
+        with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                if info.filename == document_name:
+                    document_xml.seek(0)
+                    with target.open(document_name, "w", force_zip64=True) as out:
+                        shutil.copyfileobj(document_xml, out)
+                elif info.filename in removed:
+                    continue
+                elif info.filename in changed:
+                    target.writestr(info.filename, changed.pop(info.filename))
+                else:
+                    target.writestr(info, source.read(info))
+            # Encabezados nuevos y relaciones que no existían
+            for name, data in changed.items():
+                target.writestr(name, data)
+
+    return output_file
@@ -0,0 +1,162 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+# Extensions converted when a directory is given, unless the converter
+# reads other formats too
+CSV_EXTENSIONS = (".csv",)
+
+def is_batch_source(source):
+    """Check if a command line path points to several files (directory or glob pattern)
+
+    Args:
+    source(str): Path given on the command line
+    """
+    return os.path.isdir(source) or glob.has_magic(source)
+
+def find_csv_files(source, extensions=CSV_EXTENSIONS):
+    """Return the CSV files in a directory or matching a glob pattern, sorted by name
+
+    Args:
+    source(str): Directory or glob pattern (for example "drops/**/*.csv")
+    extensions(tuple): Extensions of the files taken from a directory
+    """
+    if os.path.isdir(source):
+        patterns = [os.path.join(source, f"*{ext}") for ext in extensions]
+    else:
+        patterns = [source]
+    return sorted(
+        path for pattern in patterns for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path)
+    )
+
+def xlsx_path_for(csv_path):
+    """Return the excel path a converter writes for a CSV file (same folder and name)"""
+    file_dir = os.path.dirname(csv_path)
+    file_name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(file_dir, f"{file_name}.xlsx")
+
+def is_up_to_date(csv_path):
+    """Check if the excel output of a CSV file exists and is newer than the CSV"""
+    output_path = xlsx_path_for(csv_path)
+    return (
+        os.path.exists(output_path)
+        and os.path.getmtime(output_path) >= os.path.getmtime(csv_path)
+    )
+
+def convert_one(converter, csv_path, **converter_kwargs):
+    """Run a converter on one file and measure it (executed in a worker process)
+
+    Args:
+    converter: convert_csv_to_xlsx function of one of the converter modules
+    csv_path(str): Path to the CSV file
+
+    Returns:
+    dict: input, output, rows, input_bytes, output_bytes, seconds and error,
+    plus memory_before and memory_after for typed conversions
+    """
+    stats = {}
+    start = time.perf_counter()
+    output_path = converter(csv_path, verbose=False, stats=stats, **converter_kwargs)
+    seconds = time.perf_counter() - start
+
+    result = {
+        "input": csv_path,
+        "output": output_path,
+        "rows": stats.get("rows", 0),
+        "input_bytes": os.path.getsize(csv_path),
+        "output_bytes": os.path.getsize(output_path) if output_path else 0,
+        "seconds": seconds,
+        "error": None if output_path else "conversion failed",
+    }
+    if "memory_after" in stats:
+        result["memory_before"] = stats["memory_before"]
+        result["memory_after"] = stats["memory_after"]
+    return result
+
+def batch_convert(source, converter, max_workers=None, force=False, extensions=CSV_EXTENSIONS,
+                  **converter_kwargs):
+    """Convert every CSV in a directory or glob pattern using a pool of worker processes
+    Files whose excel output is newer than the CSV are skipped unless force is True
+
+    Args:
+    source(str): Directory or glob pattern
+    converter: convert_csv_to_xlsx function of one of the converter modules
+    max_workers(int): Number of worker processes (default: number of CPUs)
+    force(bool): Convert files even if their output is up to date
+    extensions(tuple): Extensions of the files the converter reads, taken from a directory
+
+    Returns:
+    tuple: (results, skipped files, elapsed seconds)
+    """
+    csv_files = find_csv_files(source, extensions)
+    if force:
+        pending, skipped = csv_files, []
+    else:
+        pending = [path for path in csv_files if not is_up_to_date(path)]
+        skipped = [path for path in csv_files if is_up_to_date(path)]
+
+    results = []
+    start = time.perf_counter()
+    if pending:
+        worker = partial(convert_one, converter, **converter_kwargs)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(worker, path): path for path in pending}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append({
+                        "input": futures[future], "output": None, "rows": 0,
+                        "input_bytes": 0, "output_bytes": 0, "seconds": 0.0,
+                        "error": str(e),
+                    })
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: result["input"])
+    return results, skipped, elapsed
+
+def format_bytes(size):
+    """Return a human readable size (B, KB, MB, GB)"""
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def print_batch_summary(results, skipped, elapsed):
+    """Print per-file timing, rows and bytes plus the aggregate throughput"""
+    print(f"\n{'File':<40} {'Rows':>10} {'Input':>10} {'Output':>10} {'Time':>8}")
+    for result in results:
+        name = os.path.basename(result["input"])
+        if result["error"]:
+            print(f"{name:<40} FAILED: {result['error']}")
+        else:
+            print(f"{name:<40} {result['rows']:>10} "
+                  f"{format_bytes(result['input_bytes']):>10} "
+                  f"{format_bytes(result['output_bytes']):>10} "
+                  f"{result['seconds']:>7.2f}s")
+    for path in skipped:
+        print(f"{os.path.basename(path):<40} skipped (up to date)")
+
+    converted = [result for result in results if not result["error"]]
+    total_rows = sum(result["rows"] for result in converted)
+    total_bytes = sum(result["input_bytes"] for result in converted)
+    print(f"\nConverted: {len(converted)}  Failed: {len(results) - len(converted)}  "
+          f"Skipped: {len(skipped)}  Wall time: {elapsed:.2f}s")
+    if elapsed > 0 and converted:
+        print(f"Throughput: {len(converted) / elapsed:.2f} files/s, "
+              f"{total_rows / elapsed:.0f} rows/s, "
+              f"{format_bytes(total_bytes / elapsed)}/s")
+
+    typed = [result for result in converted if "memory_after" in result]
+    if typed:
+        print(f"\n{'File':<40} {'Untyped (est.)':>15} {'Typed':>10}")
+        for result in typed:
+            print(f"{os.path.basename(result['input']):<40} "
+                  f"{format_bytes(result['memory_before']):>15} "
+                  f"{format_bytes(result['memory_after']):>10}")
+        print(f"Largest typed DataFrame: "
+              f"{format_bytes(max(result['memory_after'] for result in typed))}")
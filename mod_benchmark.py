@@ -0,0 +1,451 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from docx import Document
+from docx.shared import Pt
+from openpyxl import Workbook, load_workbook
+import mod_csv_file_converter as converter
+import mod_APA_docx_converter
+import mod_enhanced_APA_docx_converter
+from mod_metrics import Metrics
+
+# Peak RSS is only available where the resource module exists (not on Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULTS_VERSION = 1
+
+# Text lengths of the generated CSV text columns
+TEXT_LENGTHS = (8, 32, 128)
+
+# Characters of the generated text (spaces included so text can wrap)
+TEXT_ALPHABET = string.ascii_letters + string.digits + "    "
+
+# Slowdown (fraction) reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.2
+
+# Stages faster than this are never reported as regressions (timer noise)
+MIN_REGRESSION_SECONDS = 0.05
+
+def build_sheet(rows, cols):
+    """Build an in-memory worksheet with a header row and rows x cols string cells
+
+    Args:
+    rows(int): Number of data rows
+    cols(int): Number of columns
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.append([f"column {col}" for col in range(1, cols + 1)])
+    for row in range(rows):
+        ws.append([f"value {row}-{col}" for col in range(cols)])
+    return ws
+
+def format_per_cell(ws):
+    """Reference implementation: format_excel_file as it was before named styles,
+    assigning border and alignment cell by cell through ws.cell(row, col)
+
+    Args:
+    ws: Worksheet to format
+    """
+    max_row = ws.max_row
+    max_col = ws.max_column
+
+    for col in range(1, max_col + 1):
+        cell = ws.cell(row=1, column=col)
+        cell.fill = converter.BLACK_FILL
+        cell.font = converter.WHITE_FONT
+        cell.alignment = converter.HEADER_ALIGNMENT
+        cell.border = converter.THIN_BORDER
+        if cell.value:
+            cell.value = str(cell.value).upper()
+
+    for row in range(2, max_row + 1):
+        for col in range(1, max_col + 1):
+            cell = ws.cell(row=row, column=col)
+            cell.border = converter.THIN_BORDER
+            cell.alignment = converter.DATA_ALIGNMENT
+
+    converter.set_column_widths(ws, max_col)
+
+def bench_format(rows, cols):
+    """Compare cells/second of the per-cell and named style formatting paths
+
+    Args:
+    rows(int): Number of data rows
+    cols(int): Number of columns
+    """
+    cells = (rows + 1) * cols
+    print(f"Formatting benchmark: {rows} rows x {cols} columns = {cells} cells")
+
+    results = {}
+    for name, format_function in [("per-cell (before)", format_per_cell),
+                                  ("named styles (after)", converter.format_worksheet)]:
+        ws = build_sheet(rows, cols)
+        start = time.perf_counter()
+        format_function(ws)
+        seconds = time.perf_counter() - start
+        results[name] = cells / seconds
+        print(f"  {name:<22} {seconds:>8.2f}s {cells / seconds:>12,.0f} cells/s")
+
+    before, after = results.values()
+    print(f"  Speedup: {after / before:.1f}x")
+    return results
+
+def build_docx(path, paragraphs, runs, heading_every=20, override_every=4):
+    """Build a DOCX with paragraphs x runs of text and a large-font heading every few paragraphs
+
+    Args:
+    path(str): Path of the document to create
+    paragraphs(int): Number of paragraphs
+    runs(int): Runs per paragraph
+    heading_every(int): Insert a heading (font size > 15pt) every n paragraphs
+    override_every(int): Give every n-th run its own font and size (direct formatting)
+    """
+    doc = Document()
+    for index in range(paragraphs):
+        paragraph = doc.add_paragraph()
+        if index % heading_every == 0:
+            run = paragraph.add_run(f"Heading {index}")
+            run.font.size = Pt([24, 20, 18, 16][index // heading_every % 4])
+            continue
+        for run_index in range(runs):
+            run = paragraph.add_run(f"Sentence {run_index} of paragraph {index}. ")
+            if run_index % override_every == 0:
+                run.font.name = "Arial"
+                run.font.size = Pt(11)
+    doc.save(path)
+
+def bench_apa_styles(paragraphs, runs):
+    """Compare wall time and output size of per-run formatting and style-level defaults
+
+    Args:
+    paragraphs(int): Number of paragraphs
+    runs(int): Runs per paragraph
+    """
+    print(f"APA benchmark: {paragraphs} paragraphs x {runs} runs")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "input.docx")
+        build_docx(input_path, paragraphs, runs)
+        print(f"  Input size: {os.path.getsize(input_path):,} bytes")
+
+        for module in [mod_APA_docx_converter, mod_enhanced_APA_docx_converter]:
+            print(f"  {module.__name__}")
+            for name, style_defaults in [("per-run (before)", False),
+                                         ("style defaults (after)", True)]:
+                output_path = os.path.join(tmp_dir, "output.docx")
+                start = time.perf_counter()
+                module.format_apa(input_path, output_path, {"style_defaults": style_defaults})
+                seconds = time.perf_counter() - start
+                print(f"    {name:<24} {seconds:>8.2f}s {os.path.getsize(output_path):>12,} bytes")
+
+def generate_csv(path, rows, cols, text_lengths=TEXT_LENGTHS, seed=0):
+    """Write a deterministic synthetic CSV
+    Column types cycle through integers, decimals and one text column per
+    entry of text_lengths; text values vary by +-25% around their length
+
+    Args:
+    path(str): Path of the CSV to create
+    rows(int): Number of data rows
+    cols(int): Number of columns
+    text_lengths(tuple): Average length of the text of each text column kind
+    seed(int): Seed of the random generator (same seed, same file)
+    """
+    rng = random.Random(seed)
+    kinds = ["int", "float"] + list(text_lengths)
+    columns = [kinds[col % len(kinds)] for col in range(cols)]
+
+    def value(kind):
+        if kind == "int":
+            return rng.randint(0, 10 ** 6)
+        if kind == "float":
+            return round(rng.uniform(0, 10 ** 4), 2)
+        length = rng.randint(max(1, kind * 3 // 4), kind * 5 // 4)
+        return "".join(rng.choices(TEXT_ALPHABET, k=length)).strip() or "x"
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"{kind if isinstance(kind, str) else f'text{kind}'} {col}"
+                         for col, kind in enumerate(columns, 1)])
+        for _ in range(rows):
+            writer.writerow([value(kind) for kind in columns])
+
+@contextmanager
+def stage(timings, name):
+    """Time a block of code and add the seconds to timings[name]"""
+    start = time.perf_counter()
+    yield
+    timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+def case_csv_memory(csv_path, tmp_dir):
+    """Convert a CSV in memory: read with pandas, write, load, format and save the workbook"""
+    import pandas as pd
+
+    timings = {}
+    output_path = os.path.join(tmp_dir, "memory.xlsx")
+    with stage(timings, "read"):
+        df = pd.read_csv(csv_path)
+    with stage(timings, "write"):
+        df.to_excel(output_path, index=False)
+    with stage(timings, "load"):
+        wb = load_workbook(output_path)
+    with stage(timings, "format"):
+        converter.format_worksheet(wb.active)
+    with stage(timings, "save"):
+        wb.save(output_path)
+        wb.close()
+    return timings, {"rows": len(df), "cells": df.size}
+
+def case_csv_stream(csv_path, tmp_dir):
+    """Convert a CSV in streaming mode, timing the read, format, write and save spans"""
+    metrics = Metrics()
+    converter.stream_csv_to_xlsx(csv_path, os.path.join(tmp_dir, "stream.xlsx"), metrics=metrics)
+    return dict(metrics.spans), {"rows": metrics.rows, "cells": metrics.cells}
+
+def case_csv_parallel(csv_path, tmp_dir):
+    """Convert a CSV with the worksheet serialized in worker processes, timing the
+    scan, format, write (all ranges) and save spans"""
+    from mod_parallel_xlsx import parallel_csv_to_xlsx
+
+    metrics = Metrics()
+    parallel_csv_to_xlsx(csv_path, os.path.join(tmp_dir, "parallel.xlsx"), metrics=metrics)
+    return dict(metrics.spans), {"rows": metrics.rows, "cells": metrics.cells}
+
+def apa_stages(module, docx_path, tmp_dir):
+    """Format a DOCX with an APA module, timing open, format and save"""
+    timings = {}
+    options = module.get_options()
+    options["running_head"] = mod_APA_docx_converter.running_head_text(options, None, docx_path)
+    with stage(timings, "open"):
+        doc = Document(docx_path)
+    with stage(timings, "format"):
+        module.apply_margins(doc, options)
+        if module is mod_enhanced_APA_docx_converter:
+            module.format_paragraphs(doc, options, module.build_heading_index(doc, options))
+        else:
+            module.format_paragraphs(doc, options)
+        module.add_running_head(doc, options)
+    with stage(timings, "save"):
+        doc.save(os.path.join(tmp_dir, "output.docx"))
+    return timings, {"paragraphs": len(doc.paragraphs)}
+
+def case_apa_basic(docx_path, tmp_dir):
+    """Format a DOCX with mod_APA_docx_converter"""
+    return apa_stages(mod_APA_docx_converter, docx_path, tmp_dir)
+
+def case_apa_enhanced(docx_path, tmp_dir):
+    """Format a DOCX with mod_enhanced_APA_docx_converter"""
+    return apa_stages(mod_enhanced_APA_docx_converter, docx_path, tmp_dir)
+
+def case_apa_stream(docx_path, tmp_dir):
+    """Format a DOCX with the streaming XML engine of mod_APA_docx_stream"""
+    from mod_APA_docx_stream import format_apa_stream
+
+    timings = {}
+    with stage(timings, "stream"):
+        format_apa_stream(docx_path, os.path.join(tmp_dir, "output.docx"))
+    return timings, {}
+
+# Benchmark cases: name -> (kind of input, function)
+CASES = {
+    "csv-memory": ("csv", case_csv_memory),
+    "csv-stream": ("csv", case_csv_stream),
+    "csv-parallel": ("csv", case_csv_parallel),
+    "apa-basic": ("docx", case_apa_basic),
+    "apa-enhanced": ("docx", case_apa_enhanced),
+    "apa-stream": ("docx", case_apa_stream),
+}
+
+def run_case(name, input_path, tmp_dir):
+    """Run one benchmark case and measure it (executed in a fresh worker process)
+
+    Returns:
+    dict: stages (seconds), total, peak_rss_kb and the counts of the case
+    """
+    timings, counts = CASES[name][1](input_path, tmp_dir)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    if peak_rss is not None and sys.platform == "darwin":
+        # macOS reports bytes, Linux kilobytes
+        peak_rss //= 1024
+    return {"stages": timings, "total": sum(timings.values()), "peak_rss_kb": peak_rss, **counts}
+
+def best_run(runs):
+    """Combine repeated runs of a case, keeping the minimum of every measurement"""
+    result = dict(runs[0])
+    result["stages"] = {name: min(run["stages"][name] for run in runs) for name in runs[0]["stages"]}
+    result["total"] = min(run["total"] for run in runs)
+    if runs[0]["peak_rss_kb"] is not None:
+        result["peak_rss_kb"] = min(run["peak_rss_kb"] for run in runs)
+    return result
+
+def git_commit():
+    """Return the current commit of the repository, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(cases, params, repeat=3):
+    """Generate the inputs and run benchmark cases, each run in a fresh process
+
+    A fresh (spawned) process per run keeps the peak RSS of one case from
+    leaking into the next.
+
+    Args:
+    cases(list): Names of CASES to run
+    params(dict): rows, cols, text_lengths, seed, paragraphs, runs, headings
+    repeat(int): Runs per case; the best of each measurement is kept
+
+    Returns:
+    dict: JSON-serializable results
+    """
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "cases": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = {}
+        kinds = {CASES[name][0] for name in cases}
+        if "csv" in kinds:
+            inputs["csv"] = os.path.join(tmp_dir, "input.csv")
+            generate_csv(inputs["csv"], params["rows"], params["cols"],
+                         params["text_lengths"], params["seed"])
+        if "docx" in kinds:
+            inputs["docx"] = os.path.join(tmp_dir, "input.docx")
+            heading_every = max(1, params["paragraphs"] // params["headings"]) \
+                if params["headings"] else params["paragraphs"] + 1
+            build_docx(inputs["docx"], params["paragraphs"], params["runs"], heading_every)
+
+        for name in cases:
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_case, name, inputs[CASES[name][0]],
+                                                tmp_dir).result())
+            results["cases"][name] = best_run(runs)
+            print_case(name, results["cases"][name])
+    return results
+
+def print_case(name, result):
+    """Print the stage timings, throughput and peak RSS of one case"""
+    stages = "  ".join(f"{stage_name} {seconds:.2f}s" for stage_name, seconds in result["stages"].items())
+    line = f"  {name:<14} {result['total']:>8.2f}s  ({stages})"
+    if result.get("cells"):
+        line += f"  {result['cells'] / result['total']:,.0f} cells/s"
+    if result["peak_rss_kb"] is not None:
+        line += f"  peak RSS {result['peak_rss_kb'] / 1024:.0f} MB"
+    print(line)
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Compare two result sets and return the regressions
+
+    A stage, total or peak RSS is a regression when it grew by more than
+    threshold (0.2 = 20%); stages faster than MIN_REGRESSION_SECONDS in
+    both runs are ignored
+
+    Returns:
+    list: (case, measurement, baseline value, current value) tuples
+    """
+    if baseline.get("params") != current.get("params"):
+        print("Warning: the baseline was run with different parameters")
+
+    regressions = []
+    for name, result in current["cases"].items():
+        old = baseline["cases"].get(name)
+        if old is None:
+            continue
+        measurements = [(f"stage {stage_name}", old["stages"].get(stage_name), seconds)
+                        for stage_name, seconds in result["stages"].items()]
+        measurements.append(("total", old["total"], result["total"]))
+        for measurement, before, after in measurements:
+            if before is None or max(before, after) < MIN_REGRESSION_SECONDS:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append((name, measurement, before, after))
+        if old.get("peak_rss_kb") and result.get("peak_rss_kb"):
+            if result["peak_rss_kb"] > old["peak_rss_kb"] * (1 + threshold):
+                regressions.append((name, "peak RSS (KB)", old["peak_rss_kb"], result["peak_rss_kb"]))
+    return regressions
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Benchmark the converters")
+    parser.add_argument("suite", nargs="?", choices=["format", "apa", "convert", "docx", "all"],
+                        default="format",
+                        help="format: excel formatting, apa: DOCX run formatting, "
+                             "convert/docx/all: staged CSV and DOCX conversion suite")
+    parser.add_argument("--rows", type=int, default=100000, help="Data rows (default: 100000)")
+    parser.add_argument("--cols", type=int, default=10, help="Columns (default: 10)")
+    parser.add_argument("--paragraphs", type=int, default=5000,
+                        help="DOCX paragraphs (default: 5000)")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per paragraph (default: 10)")
+    parser.add_argument("--headings", type=int, default=250,
+                        help="Headings in the generated DOCX (default: 250)")
+    parser.add_argument("--text-lengths", default=",".join(map(str, TEXT_LENGTHS)),
+                        help="Average lengths of the CSV text columns (default: 8,32,128)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data generator")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per case, the best one is kept (default: 3)")
+    parser.add_argument("--json", help="Write the suite results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown reported as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.suite == "format":
+        bench_format(args.rows, args.cols)
+        return
+    if args.suite == "apa":
+        bench_apa_styles(args.paragraphs, args.runs)
+        return
+
+    cases = [name for name, (kind, _) in CASES.items()
+             if args.suite == "all" or kind == {"convert": "csv", "docx": "docx"}[args.suite]]
+    params = {
+        "rows": args.rows, "cols": args.cols, "seed": args.seed,
+        "text_lengths": [int(length) for length in args.text_lengths.split(",")],
+        "paragraphs": args.paragraphs, "runs": args.runs, "headings": args.headings,
+    }
+    print(f"Benchmark suite: {', '.join(cases)} (best of {args.repeat})")
+    results = run_suite(cases, params, args.repeat)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        print(f"\nCompared with {baseline.get('commit') or args.compare} "
+              f"(threshold {args.threshold:.0%}):")
+        for name, measurement, before, after in regressions:
+            print(f"  REGRESSION {name} {measurement}: {before:.2f} -> {after:.2f}")
+        if regressions:
+            sys.exit(1)
+        print("  No regressions")
+
+if __name__ == "__main__":
+    main()
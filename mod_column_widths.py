@@ -0,0 +1,104 @@
+import unicodedata
+
+# Limits of a fitted column width, in characters
+MIN_COLUMN_WIDTH = 8
+MAX_COLUMN_WIDTH = 60
+
+# Widths fit this fraction of the values of a column; longer values wrap
+# (data cells have wrap_text on) instead of widening the whole column
+WIDTH_PERCENTILE = 0.95
+
+# Extra characters of room for the cell margins
+WIDTH_PADDING = 2
+
+# Excel shows at most about 11 significant characters of a number in General format
+MAX_NUMBER_WIDTH = 11
+
+def display_width(text):
+    """Return the number of character cells a text takes on screen
+    East Asian wide and fullwidth characters take two cells, combining
+    marks none; for multi-line text the longest line counts
+
+    Args:
+    text(str): Text of a cell
+    """
+    if "\n" in text:
+        return max(display_width(line) for line in text.split("\n"))
+    if text.isascii():
+        return len(text)
+    width = 0
+    for char in text:
+        if unicodedata.combining(char):
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+    return width
+
+def value_width(value):
+    """Return the display width of a cell value (None, text, number, date...)"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return display_width(value)
+    if isinstance(value, float):
+        return min(len(str(value)), MAX_NUMBER_WIDTH)
+    return len(str(value))
+
+class ColumnWidthEstimator:
+    """Streaming estimate of the column widths that fit the content of a sheet
+
+    Every value updates a small histogram of display widths per column, so
+    the estimate costs one pass over the values as they are written and
+    constant memory, whatever the number of rows
+    """
+
+    def __init__(self, percentile=WIDTH_PERCENTILE, min_width=MIN_COLUMN_WIDTH,
+                 max_width=MAX_COLUMN_WIDTH):
+        self.percentile = percentile
+        self.min_width = min_width
+        self.max_width = max_width
+        # histograms[col][w] = number of values of width w (capped at max_width)
+        self.histograms = []
+
+    def update(self, values):
+        """Add the values of one row"""
+        histograms = self.histograms
+        cap = self.max_width
+        while len(histograms) < len(values):
+            histograms.append([0] * (cap + 1))
+        for histogram, value in zip(histograms, values):
+            # Plain ASCII text is by far the most common value
+            if value.__class__ is str and value.isascii() and "\n" not in value:
+                width = len(value)
+            else:
+                width = value_width(value)
+            histogram[width if width < cap else cap] += 1
+
+    def merge(self, other):
+        """Add the counts of another estimator (for example one filled in a worker process)"""
+        histograms = self.histograms
+        while len(histograms) < len(other.histograms):
+            histograms.append([0] * (self.max_width + 1))
+        for histogram, counts in zip(histograms, other.histograms):
+            for width, count in enumerate(counts):
+                histogram[width] += count
+
+    def column_width(self, col):
+        """Return the fitted width of a column (0-based index)"""
+        if col >= len(self.histograms):
+            return self.min_width
+        histogram = self.histograms[col]
+        target = sum(histogram) * self.percentile
+        seen = 0
+        for width, count in enumerate(histogram):
+            seen += count
+            if seen >= target:
+                break
+        return max(self.min_width, min(self.max_width, width + WIDTH_PADDING))
+
+    def widths(self, columns):
+        """Return the fitted widths of the first columns of the sheet
+
+        Args:
+        columns(int): Number of columns
+        """
+        return [self.column_width(col) for col in range(columns)]
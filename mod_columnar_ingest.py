@@ -0,0 +1,135 @@
+import os
+from mod_startup import timed_import
+
+# Extensions of the Arrow-family files the converters read (pyarrow needed)
+COLUMNAR_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".arrows": "arrow",
+}
+
+# Rows turned into Python values at a time; record batches written with
+# more rows are sliced (without copying) to keep memory bounded
+BATCH_ROWS = 10000
+
+def columnar_format(path):
+    """Return "parquet" or "arrow" for a Parquet/Arrow/Feather file, else None"""
+    return COLUMNAR_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def import_pyarrow():
+    """Import pyarrow, which is only needed for Parquet/Arrow/Feather inputs"""
+    try:
+        return timed_import("pyarrow")
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow/Feather files need pyarrow (pip install pyarrow)") from e
+
+def column_indices(names, columns):
+    """Return the positions of the selected columns (all of them if columns is None)
+
+    Args:
+    names(list): Column names of the file
+    columns(list): Names of the columns to read, in output order
+    """
+    if not columns:
+        return list(range(len(names)))
+    missing = [name for name in columns if name not in names]
+    if missing:
+        raise ValueError(f"Columns not found: {', '.join(missing)} (available: {', '.join(names)})")
+    return [names.index(name) for name in columns]
+
+def iter_slices(batches, batch_size):
+    """Yield the column arrays of record batches in slices of at most batch_size rows"""
+    for arrays in batches:
+        rows = len(arrays[0]) if arrays else 0
+        for offset in range(0, rows, batch_size):
+            yield [array.slice(offset, batch_size) for array in arrays]
+
+def iter_ipc_batches(reader, indices):
+    """Yield the selected column arrays of every record batch of an Arrow IPC reader"""
+    if hasattr(reader, "num_record_batches"):
+        # File format: batches are located from the footer, no scan needed
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        batches = reader
+    for batch in batches:
+        yield [batch.column(index) for index in indices]
+
+def open_columnar(path, columns=None, batch_size=BATCH_ROWS):
+    """Open a Parquet, Arrow IPC or Feather file for reading by record batch
+    Only the selected columns are decoded: Parquet reads just their column
+    chunks, Arrow files are memory-mapped so the buffers of the other
+    columns are never touched
+
+    Args:
+    path(str): Path to the file
+    columns(list): Names of the columns to read (default: all)
+    batch_size(int): Maximum rows per batch
+
+    Returns:
+    tuple: (column names, number of rows or None if unknown, iterator over
+    lists of column arrays)
+    """
+    pa = import_pyarrow()
+    if columnar_format(path) == "parquet":
+        pq = timed_import("pyarrow.parquet")
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        names = parquet_file.schema_arrow.names
+        selected = [names[index] for index in column_indices(names, columns)]
+        batches = (batch.columns for batch in
+                   parquet_file.iter_batches(batch_size=batch_size, columns=selected))
+        return selected, parquet_file.metadata.num_rows, batches
+
+    source = pa.memory_map(path, "r")
+    try:
+        reader = pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        try:
+            # Arrow streaming format
+            reader = pa.ipc.open_stream(source)
+        except pa.ArrowInvalid:
+            # Feather version 1 files have no record batches to stream
+            source.close()
+            feather = timed_import("pyarrow.feather")
+            table = feather.read_table(path, columns=columns, memory_map=True)
+            batches = ([batch.column(i) for i in range(batch.num_columns)]
+                       for batch in table.to_batches(batch_size))
+            return table.column_names, table.num_rows, batches
+    names = reader.schema.names
+    indices = column_indices(names, columns)
+    return ([names[index] for index in indices], None,
+            iter_slices(iter_ipc_batches(reader, indices), batch_size))
+
+def column_values(array):
+    """Return the values of an Arrow array as Python values openpyxl can write
+    Types are kept (numbers, dates, times, decimals, booleans); NaN becomes
+    an empty cell, time zones are dropped keeping the local time (Excel has
+    none), nested values are written as text and binary values decoded as
+    UTF-8
+    """
+    pa = timed_import("pyarrow")
+    kind = array.type
+    if pa.types.is_dictionary(kind):
+        kind = kind.value_type
+    values = array.to_pylist()
+    if pa.types.is_floating(kind):
+        return [None if value != value else value for value in values]
+    if pa.types.is_timestamp(kind) and kind.tz is not None:
+        return [value if value is None else value.replace(tzinfo=None) for value in values]
+    if pa.types.is_binary(kind) or pa.types.is_large_binary(kind) or pa.types.is_fixed_size_binary(kind):
+        return [value if value is None else value.decode("utf-8", "replace") for value in values]
+    if pa.types.is_nested(kind):
+        return [value if value is None else str(value) for value in values]
+    return values
+
+def iter_columnar_rows(batches):
+    """Yield the rows of column-array batches as tuples of Python values
+
+    Args:
+    batches: Iterable of lists of column arrays (from open_columnar)
+    """
+    for arrays in batches:
+        yield from zip(*[column_values(array) for array in arrays])
@@ -0,0 +1,129 @@
+import hashlib
+import io
+from mod_startup import timed_import
+
+# Data rows per chunk when a CSV is split by byte offsets
+ROWS_PER_CHUNK = 10000
+
+def iter_records(f):
+    """Yield (start offset, raw bytes) for each record of a binary CSV file
+    A record ends at a newline outside quotes, so quoted fields spanning
+    several lines stay in one record. Blank lines are not records (pandas
+    skips them too) and are returned with the following record
+
+    Args:
+    f: CSV file opened in binary mode
+    """
+    start = f.tell()
+    parts = []
+    in_quotes = False
+    for line in f:
+        parts.append(line)
+        # Doubled quotes ("") inside a quoted field do not change the parity
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if in_quotes:
+            continue
+        record = b''.join(parts)
+        if record.strip():
+            yield start, record
+            start += len(record)
+            parts = []
+    if parts:
+        record = b''.join(parts)
+        if record.strip():
+            yield start, record
+
+def scan_chunks(csv_path, rows_per_chunk=ROWS_PER_CHUNK):
+    """Split a CSV into chunks of data rows by byte offset, hashing each chunk
+
+    Args:
+    csv_path(str): Path to the CSV file
+    rows_per_chunk(int): Data rows per chunk
+
+    Returns:
+    tuple: (header bytes, list of chunk dicts with start, end, first_row, rows and hash)
+    """
+    chunks = []
+    with open(csv_path, 'rb') as f:
+        records = iter_records(f)
+        header = next(records, (0, b''))[1]
+
+        chunk = None
+        row = 0
+        for start, record in records:
+            if chunk is None:
+                chunk = {'start': start, 'first_row': row, 'rows': 0, 'hash': hashlib.sha1()}
+            chunk['hash'].update(record)
+            chunk['rows'] += 1
+            chunk['end'] = start + len(record)
+            row += 1
+            if chunk['rows'] == rows_per_chunk:
+                chunks.append(chunk)
+                chunk = None
+        if chunk is not None:
+            chunks.append(chunk)
+
+    for chunk in chunks:
+        chunk['hash'] = chunk['hash'].hexdigest()
+    return header, chunks
+
+class RangeFile(io.RawIOBase):
+    """Read-only binary file with a CSV header followed by a byte range of the CSV
+    Lets pandas read a slice of a large file in chunks without loading the
+    whole slice into memory
+    """
+
+    def __init__(self, csv_path, header, start, end):
+        super().__init__()
+        if not header.endswith(b'\n'):
+            header += b'\n'
+        self._header = header
+        self._file = open(csv_path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._header:
+            size = min(len(buffer), len(self._header))
+            buffer[:size] = self._header[:size]
+            self._header = self._header[size:]
+            return size
+        size = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._remaining)])
+        self._remaining -= size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def open_range(csv_path, header, start, end):
+    """Open the rows between two byte offsets of a CSV, preceded by its header, as a binary file
+
+    Args:
+    csv_path(str): Path to the CSV file
+    header(bytes): Header record of the CSV (from scan_chunks)
+    start(int): Offset of the first record
+    end(int): Offset after the last record
+    """
+    return io.BufferedReader(RangeFile(csv_path, header, start, end))
+
+def read_chunk(csv_path, header, start, end, **read_csv_kwargs):
+    """Parse the rows between two byte offsets of a CSV into a DataFrame
+
+    Args:
+    csv_path(str): Path to the CSV file
+    header(bytes): Header record of the CSV (from scan_chunks)
+    start(int): Offset of the first record
+    end(int): Offset after the last record
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    pd = timed_import('pandas')
+    if not header.endswith(b'\n'):
+        header += b'\n'
+    return pd.read_csv(io.BytesIO(header + data), **read_csv_kwargs)
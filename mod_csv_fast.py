@@ -0,0 +1,119 @@
+import csv
+import os
+import re
+
+# Files up to this size are read with the csv module instead of pandas;
+# importing pandas takes longer than parsing them
+FAST_PATH_MAX_BYTES = 1024 * 1024
+
+# Strings pandas reads as missing values by default
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+}
+
+TRUE_VALUES = {"True", "TRUE", "true"}
+FALSE_VALUES = {"False", "FALSE", "false"}
+
+INT_RE = re.compile(r"\s*[+-]?\d+\s*")
+FLOAT_RE = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*|\s*[+-]?inf(inity)?\s*", re.I)
+
+# Integers outside int64 get other dtypes in pandas; those files use pandas
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+def column_names(header):
+    """Return the column names pandas would give a header row
+    Empty names become "Unnamed: <index>" and repeated names get a
+    ".1", ".2"... suffix
+
+    Args:
+    header(list): Raw header fields
+    """
+    header = [name if name != "" else f"Unnamed: {index}" for index, name in enumerate(header)]
+    names = []
+    seen = set()
+    taken = set(header)
+    counts = {}
+    for name in header:
+        if name in seen:
+            # Skip suffixes used by other columns of the header
+            count = counts.get(name, 1)
+            while f"{name}.{count}" in taken:
+                count += 1
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            taken.add(name)
+        seen.add(name)
+        names.append(name)
+    return names
+
+def convert_column(values):
+    """Convert the raw strings of one column the way pandas infers its dtype
+    Integer, float and boolean columns get typed values, anything else stays
+    text; missing values become None
+
+    Args:
+    values(list): Raw fields of the column (None for missing fields)
+
+    Returns:
+    list: Converted values, or None if the column needs pandas
+    """
+    present = [value for value in values if value is not None and value not in NA_VALUES]
+    missing = len(present) < len(values)
+
+    def convert(parse):
+        return [None if value is None or value in NA_VALUES else parse(value) for value in values]
+
+    if not present:
+        return [None] * len(values)
+    if all(INT_RE.fullmatch(value) for value in present):
+        numbers = [int(value) for value in present]
+        if min(numbers) < INT64_MIN or max(numbers) > INT64_MAX:
+            return None
+        # A column of integers with missing values is a float column in pandas
+        return convert(float if missing else int)
+    if all(FLOAT_RE.fullmatch(value) for value in present):
+        return convert(float)
+    if all(value in TRUE_VALUES or value in FALSE_VALUES for value in present):
+        return convert(lambda value: value in TRUE_VALUES)
+    return convert(str)
+
+def read_small_csv(csv_path):
+    """Read a small CSV file with the csv module, without importing pandas
+
+    Args:
+    csv_path(str): Path to the CSV file
+
+    Returns:
+    tuple: (column names, list of row tuples), or None if the file is too
+    big or has a layout only pandas handles (the caller then uses pandas)
+    """
+    if os.path.getsize(csv_path) > FAST_PATH_MAX_BYTES:
+        return None
+
+    # utf-8-sig drops a byte order mark, as pandas does
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        # Blank and whitespace-only lines are skipped, like pandas does by default
+        records = [record for record in csv.reader(f)
+                   if record and not (len(record) == 1 and record[0].isspace())]
+
+    if not records:
+        return None
+    header = column_names(records[0])
+    width = len(header)
+
+    columns = [[] for _ in range(width)]
+    for record in records[1:]:
+        if len(record) > width:
+            # pandas uses the extra leading fields as an index
+            return None
+        # Short rows are padded with missing values
+        record += [None] * (width - len(record))
+        for column, value in zip(columns, record):
+            column.append(value)
+
+    converted = [convert_column(column) for column in columns]
+    if any(column is None for column in converted):
+        return None
+    return header, list(zip(*converted)) if converted else []
@@ -1,114 +1,542 @@
-import pandas as pd
+from mod_startup import timed_import, print_import_profile
 import os
-from tkinter import filedialog
-from tkinter import Tk
-from openpyxl import load_workbook
-from openpyxl.styles import Border, Side, Alignment, PatternFill, Font, Color
+import csv
+import argparse
+from copy import copy
+from itertools import chain, islice
+# openpyxl is needed by every conversion and by the style constants below;
+# pandas and tkinter are imported by the code paths that use them
+timed_import("openpyxl")
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Border, Side, Alignment, PatternFill, Font, Color, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ProcessPoolExecutor
+from mod_batch_converter import (CSV_EXTENSIONS, is_batch_source, batch_convert, print_batch_summary,
+                                 format_bytes)
+from mod_csv_fast import read_small_csv
+from mod_csv_ingest import get_schema, read_csv_kwargs, read_typed_csv, memory_report
+from mod_csv_chunks import scan_chunks, open_range
+from mod_columnar_ingest import (COLUMNAR_EXTENSIONS, BATCH_ROWS, columnar_format, open_columnar,
+                                 iter_columnar_rows)
+from mod_column_widths import ColumnWidthEstimator, MIN_COLUMN_WIDTH, MAX_COLUMN_WIDTH
+from mod_metrics import Metrics, PROGRESS_EVERY, build_metrics
+from mod_sheet_xml import INDEX_SHEET
+
+# Extensions converted when a directory is given: CSV plus the
+# Parquet/Arrow/Feather files read through pyarrow
+TABLE_EXTENSIONS = CSV_EXTENSIONS + tuple(COLUMNAR_EXTENSIONS)
+
+# Rows read from the CSV per chunk in streaming mode
+STREAM_CHUNK_SIZE = 10000
+
+# Excel row limit per sheet; the first row of every sheet is the header
+MAX_SHEET_ROWS = 1048576
+SHEET_DATA_ROWS = MAX_SHEET_ROWS - 1
+
+# Rows buffered by the write-only writer to fit the column widths to the
+# content: widths must be written before the first row of a sheet
+WIDTH_SAMPLE_ROWS = 10000
+
+# Named styles registered in every converted workbook
+HEADER_STYLE = "CSV Header"
+BODY_STYLE = "CSV Body"
+
+# Define black border style
+THIN_BORDER = Border(
+    left=Side(style='thin', color=Color(rgb='00000000')),
+    right=Side(style='thin', color=Color(rgb='00000000')),
+    top=Side(style='thin', color=Color(rgb='00000000')),
+    bottom=Side(style='thin', color=Color(rgb='00000000'))
+)
+
+# Define header cell alignment(horizontal center, vertical middle)
+HEADER_ALIGNMENT = Alignment(
+    horizontal='center',
+    vertical='center',
+    wrap_text=True
+)
+
+# Define alignment for data cells(left horizontal, middle vertical, wrap text)
+DATA_ALIGNMENT = Alignment(
+    horizontal='left',
+    vertical='center',
+    wrap_text=True
+)
+
+# Define data fill for header
+BLACK_FILL = PatternFill(
+    start_color=Color(rgb='00000000'), # FF = alpha, 000000 = black
+    end_color=Color(rgb='00000000'),
+    fill_type='solid'
+)
+
+# Define white font for header(bold)
+WHITE_FONT = Font(
+    color=Color(rgb='00FFFFFF'), # FF = alpha, FFFFFF = white
+    bold=True,
+    size=11
+)
+
+def column_width(col):
+    """Return the width for a column based on your requirements
+    Columns 2 and 3: 3x size (45 units)
+    Columns 1 and 4: 2x size (30 units)
+    Other columns: default (15 units)
 
-def format_excel_file(file_path):
-    """Format excel file with borders, alignment and adjusted column width
-    Special formatting for header row: black background, white text, centered, uppercase
-    
     Args:
-    file_path(str): Path to excel file
+    col(int): 1-based column index
     """
-    # Load the workbook
-    wb = load_workbook(file_path)
-    ws = wb.active
-
-    # Define black border style
-    thin_border = Border(
-        left=Side(style='thin', color=Color(rgb='00000000')),
-        right=Side(style='thin', color=Color(rgb='00000000')),
-        top=Side(style='thin', color=Color(rgb='00000000')),
-        bottom=Side(style='thin', color=Color(rgb='00000000'))
-    )
+    if col in [2, 3]: # For columns 2 and 3
+        return 45
+    elif col in [1, 4]: # For columns 1and 4
+        return 30
+    else:
+        return 15
 
-    # Define header cell alignment(horizontal center, vertical middle)
-    header_alignment = Alignment(
-        horizontal='center',
-        vertical='center',
-        wrap_text=True
-    )
-    
-    # Define alignment for data cells(left horizontal, middle vertical, wrap text)
-    alignment = Alignment(
-        horizontal='left',
-        vertical='center',
-        wrap_text=True
-    )
+def register_styles(wb):
+    """Register the header and body named styles in a workbook
+    Styles are registered once per workbook, so formatting a cell only
+    points it at an existing style instead of building a new one
 
-    # Define data fill for header
-    black_fill=PatternFill(
-        start_color=Color(rgb='00000000'), # FF = alpha, 000000 = black
-        end_color=Color(rgb='00000000'),
-        fill_type='solid'
-    )
+    Args:
+    wb: Workbook (normal or write-only)
+    """
+    if HEADER_STYLE not in wb.named_styles:
+        wb.add_named_style(NamedStyle(
+            name=HEADER_STYLE,
+            font=WHITE_FONT,
+            fill=BLACK_FILL,
+            border=THIN_BORDER,
+            alignment=HEADER_ALIGNMENT
+        ))
+    if BODY_STYLE not in wb.named_styles:
+        wb.add_named_style(NamedStyle(
+            name=BODY_STYLE,
+            font=copy(DEFAULT_FONT),
+            border=THIN_BORDER,
+            alignment=DATA_ALIGNMENT
+        ))
 
-    # Define white font for header(bold)
-    white_font = Font(
-        color=Color(rgb='00FFFFFF'), # FF = alpha, FFFFFF = white
-        bold=True,
-        size=11
-    )
+def apply_style(cells, style_name):
+    """Apply a registered named style to a range of cells
+    The style is resolved on the first cell only; the remaining cells share
+    its style ids, which avoids a style lookup per cell
 
-    # Get dimensions of data
-    max_row = ws.max_row
-    max_col = ws.max_column
+    Args:
+    cells: Iterable of cells
+    style_name(str): Name of a style added with register_styles
+    """
+    template = None
+    for cell in cells:
+        # Dates keep their number format, otherwise Excel shows serial numbers
+        number_format = cell.number_format if cell.data_type == "d" else None
+        if template is None:
+            cell.style = style_name
+            template = copy(cell._style)
+        else:
+            cell._style = copy(template)
+        if number_format is not None:
+            cell.number_format = number_format
 
-    # Apply formatting to header cells(row 1)
-    for col in range(1, max_col +1):
-        cell = ws.cell(row=1, column=col)
-        # Apply background
-        cell.fill = black_fill
-        # Apply white font
-        cell.font = white_font
-        # Apply center alignment
-        cell.alignment = header_alignment
-        # Apply borders
-        cell.border = thin_border
+def format_header(ws, max_col):
+    """Format the header row: black background, white bold text, centered, uppercase
+
+    Args:
+    ws: Worksheet to format
+    max_col(int): Number of columns
+    """
+    header = ws[1][:max_col]
+    apply_style(header, HEADER_STYLE)
+    for cell in header:
         # Convert text to uppercase
         if cell.value:
             cell.value = str(cell.value).upper()
 
-    # Apply formatting to all cells with data(row 2 onwards)
-    for row in range(2, max_row + 1):
-        for col in range(1, max_col + 1):
-            cell = ws.cell(row=row, column=col)
-            # Apply borders
-            cell.border = thin_border
-            # Apply alignment
-            cell.alignment = alignment
-
-    # Set column widths based on your requirements
-    # Columns 2 and 3: 3x size (45 units)
-    # Columns 1 and 4: 2x size (30 units)
-    # Other columns: default (15 units)
+def format_rows(ws, min_row, max_row, max_col, estimator=None):
+    """Format a range of data rows: black borders, left aligned, wrapped text
+
+    Args:
+    ws: Worksheet to format
+    min_row(int): First row to format
+    max_row(int): Last row to format
+    max_col(int): Number of columns
+    estimator: Optional ColumnWidthEstimator fed with the values of the rows
+    """
+    for row in ws.iter_rows(min_row=min_row, max_row=max_row, max_col=max_col):
+        apply_style(row, BODY_STYLE)
+        if estimator is not None:
+            estimator.update([cell.value for cell in row])
+
+def set_column_widths(ws, max_col, widths=None):
+    """Set column widths, fitted to the content or based on your requirements
+
+    Args:
+    ws: Worksheet to format
+    max_col(int): Number of columns
+    widths(list): Width of each column (default: fixed widths from column_width)
+    """
     for col in range(1, max_col + 1):
-        col_letter = ws.cell(row=1, column=col).column_letter
+        width = widths[col - 1] if widths else column_width(col)
+        ws.column_dimensions[get_column_letter(col)].width = width
 
-        if col in [2, 3]: # For columns 2 and 3
-            ws.column_dimensions[col_letter].width = 45
-        elif col in [1, 4]: # For columns 1and 4
-            ws.column_dimensions[col_letter].width = 30
-        else:
-            ws.column_dimensions[col_letter].width = 15
+def format_worksheet(ws, auto_width=True):
+    """Format a worksheet with borders, alignment and adjusted column width
+    Special formatting for header row: black background, white text, centered, uppercase
+
+    Args:
+    ws: Worksheet to format
+    auto_width(bool): Fit column widths to the content (measured while the
+        rows are formatted) instead of the fixed widths
+    """
+    register_styles(ws.parent)
+
+    # Get dimensions of data
+    max_row = ws.max_row
+    max_col = ws.max_column
+    estimator = ColumnWidthEstimator() if auto_width else None
+
+    format_header(ws, max_col)
+    if estimator is not None:
+        estimator.update([cell.value for cell in ws[1][:max_col]])
+    format_rows(ws, 2, max_row, max_col, estimator)
+    set_column_widths(ws, max_col, estimator.widths(max_col) if estimator else None)
+
+def format_excel_file(file_path, auto_width=True, metrics=None):
+    """Format excel file with borders, alignment and adjusted column width
+    Special formatting for header row: black background, white text, centered, uppercase
+    
+    Args:
+    file_path(str): Path to excel file
+    auto_width(bool): Fit column widths to the content instead of the fixed widths
+    metrics(Metrics): Receives the load, format and save spans
+    """
+    metrics = metrics or Metrics()
+
+    # Load the workbook
+    with metrics.span("load"):
+        wb = load_workbook(file_path)
+
+    with metrics.span("format"):
+        format_worksheet(wb.active, auto_width)
 
     # Save the formatted workbook
-    wb.save(file_path)
-    wb.close
+    with metrics.span("save"):
+        wb.save(file_path)
+        wb.close()
 
-def convert_csv_to_xlsx(csv_path):
+def styled_row(ws, values, style_name):
+    """Create a row of write-only cells sharing a named style
+
+    Args:
+    ws: Write-only worksheet the cells belong to
+    values: Cell values (None for empty cells)
+    style_name(str): Name of a style added with register_styles
+    """
+    cells = [WriteOnlyCell(ws, value=value) for value in values]
+    apply_style(cells, style_name)
+    return cells
+
+def iter_csv_rows(chunks):
+    """Yield the rows of DataFrame chunks as plain tuples, with missing values as None
+
+    Args:
+    chunks: Iterable of DataFrames (for example from pd.read_csv(..., chunksize=n))
+    """
+    for chunk in chunks:
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+def partition_ranges(row_counts):
+    """Return (first row, last row, rows) of consecutive partitions, numbering data rows from 1
+
+    Args:
+    row_counts(list): Data rows of each partition
+    """
+    ranges = []
+    first = 1
+    for rows in row_counts:
+        ranges.append((first, first + rows - 1, rows))
+        first += rows
+    return ranges
+
+def write_index_sheet(ws, label, names, row_counts):
+    """Fill a write-only sheet with the row range of every partition
+
+    Args:
+    ws: Write-only worksheet
+    label(str): Title of the first column ("Sheet" or "File")
+    names(list): Partition names
+    row_counts(list): Data rows of each partition
+    """
+    set_column_widths(ws, 4)
+    ws.append(styled_row(ws, [label.upper(), "FIRST ROW", "LAST ROW", "ROWS"], HEADER_STYLE))
+    for name, (first, last, rows) in zip(names, partition_ranges(row_counts)):
+        ws.append(styled_row(ws, [name, first, last, rows], BODY_STYLE))
+
+def fit_column_widths(header_row, rows, sample_rows=WIDTH_SAMPLE_ROWS):
+    """Fit column widths to the first rows of a row stream
+
+    Args:
+    header_row(list): Header values
+    rows: Iterable of row sequences
+    sample_rows(int): Rows buffered to estimate the widths
+
+    Returns:
+    tuple: (widths, iterator over all the rows, buffered ones included)
+    """
+    rows = iter(rows)
+    buffered = list(islice(rows, sample_rows))
+    estimator = ColumnWidthEstimator()
+    estimator.update(header_row)
+    for row in buffered:
+        estimator.update(row)
+    return estimator.widths(len(header_row)), chain(buffered, rows)
+
+def write_formatted_xlsx(header, rows, output_path, rows_per_sheet=SHEET_DATA_ROWS,
+                         auto_width=True, metrics=None):
+    """Write a formatted excel file in a single pass through a write-only workbook
+    Header and data styles are applied as the cells are created, so only
+    one row is held in memory at a time. Rows beyond the Excel limit go to
+    more sheets ("Part 1", "Part 2"...), each with the formatted header,
+    and an index sheet listing their row ranges is added first
+
+    Args:
+    header(list): Column names for the header row
+    rows: Iterable of row sequences
+    output_path(str): Path to the excel file to create
+    rows_per_sheet(int): Data rows per sheet
+    auto_width(bool): Fit column widths to the content of the first
+        WIDTH_SAMPLE_ROWS rows instead of the fixed widths
+    metrics(Metrics): Receives the format, write and save spans and the
+        rows written (styles are applied while writing, so the write span
+        includes the formatting of the cells)
+
+    Returns:
+    int: Number of data rows written
+    """
+    metrics = metrics or Metrics()
+    wb = Workbook(write_only=True)
+    register_styles(wb)
+    header_row = [str(value).upper() if value else value for value in header]
+
+    widths = None
+    if auto_width:
+        with metrics.span("format"):
+            widths, rows = fit_column_widths(header_row, rows)
+
+    def add_sheet():
+        ws = wb.create_sheet()
+        # Column widths must be set before any row is written
+        set_column_widths(ws, len(header), widths)
+        ws.append(styled_row(ws, header_row, HEADER_STYLE))
+        return ws
+
+    ws = add_sheet()
+    sheet_rows = [0]
+    pending = 0
+    with metrics.span("write"):
+        for row in rows:
+            if sheet_rows[-1] == rows_per_sheet:
+                ws = add_sheet()
+                sheet_rows.append(0)
+            ws.append(styled_row(ws, row, BODY_STYLE))
+            sheet_rows[-1] += 1
+            pending += 1
+            if pending == PROGRESS_EVERY:
+                metrics.add_rows(pending, len(header))
+                pending = 0
+    if pending:
+        metrics.add_rows(pending, len(header))
+
+    if len(sheet_rows) > 1:
+        parts = wb.worksheets[:]
+        for number, part in enumerate(parts, 1):
+            part.title = f"Part {number}"
+        write_index_sheet(wb.create_sheet(INDEX_SHEET, 0), "Sheet",
+                          [part.title for part in parts], sheet_rows)
+
+    with metrics.span("save"):
+        wb.save(output_path)
+        wb.close()
+    return sum(sheet_rows)
+
+def partition_path(output_path, number):
+    """Return the path of one workbook of a partitioned conversion (<name>_part<n>.xlsx)"""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_part{number}{ext}"
+
+def write_partition(csv_path, header, start, end, output_path, chunksize=STREAM_CHUNK_SIZE,
+                    auto_width=True):
+    """Convert the rows between two byte offsets of a CSV to a formatted excel file
+    (executed in a worker process)
+
+    Returns:
+    int: Number of data rows written
+    """
+    with open_range(csv_path, header, start, end) as f:
+        return stream_csv_to_xlsx(f, output_path, chunksize, auto_width=auto_width)
+
+def write_partitioned_workbooks(csv_path, output_path, rows_per_workbook=SHEET_DATA_ROWS,
+                                chunksize=STREAM_CHUNK_SIZE, max_workers=None, auto_width=True,
+                                metrics=None):
+    """Convert a CSV too long for one sheet into several formatted excel files
+    The CSV is split by byte offset into parts of rows_per_workbook rows,
+    written in parallel as <name>_part1.xlsx, <name>_part2.xlsx...; the
+    excel file at output_path only holds the index of the parts
+
+    Args:
+    csv_path(str): Path to the CSV file
+    output_path(str): Path of the index excel file
+    rows_per_workbook(int): Data rows per workbook
+    chunksize(int): Rows read from the CSV per chunk
+    max_workers(int): Worker processes (default: number of CPUs)
+    auto_width(bool): Fit column widths to the content instead of the fixed widths
+    metrics(Metrics): Receives the scan, write (all partitions) and save spans
+
+    Returns:
+    tuple: (number of data rows written, list of workbook paths)
+    """
+    metrics = metrics or Metrics()
+    with metrics.span("scan"):
+        header, chunks = scan_chunks(csv_path, rows_per_workbook)
+    if len(chunks) <= 1:
+        # Fits in one sheet
+        return stream_csv_to_xlsx(csv_path, output_path, chunksize,
+                                  auto_width=auto_width, metrics=metrics), [output_path]
+
+    paths = [partition_path(output_path, number) for number in range(1, len(chunks) + 1)]
+    with metrics.span("write"), ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(write_partition, csv_path, header, chunk["start"], chunk["end"],
+                            path, chunksize, auto_width)
+            for chunk, path in zip(chunks, paths)
+        ]
+        row_counts = [future.result() for future in futures]
+    columns = len(next(csv.reader([header.decode("utf-8-sig")])))
+    metrics.add_rows(sum(row_counts), columns)
+
+    with metrics.span("save"):
+        wb = Workbook(write_only=True)
+        register_styles(wb)
+        write_index_sheet(wb.create_sheet(INDEX_SHEET), "File",
+                          [os.path.basename(path) for path in paths], row_counts)
+        wb.save(output_path)
+        wb.close()
+    return sum(row_counts), paths
+
+def stream_csv_to_xlsx(csv_path, output_path, chunksize=STREAM_CHUNK_SIZE,
+                       rows_per_sheet=SHEET_DATA_ROWS, auto_width=True, metrics=None,
+                       **read_csv_kwargs):
+    """Convert a CSV file to a formatted excel file reading it in chunks
+    Peak memory depends on the chunk size, not on the number of rows
+
+    Args:
+    csv_path(str): Path to the CSV file, or a binary file object to read it from
+    output_path(str): Path to the excel file to create
+    chunksize(int): Rows read from the CSV per chunk
+    rows_per_sheet(int): Data rows per sheet before the rows go to a new sheet
+    auto_width(bool): Fit column widths to the content instead of the fixed widths
+    metrics(Metrics): Receives the read (CSV parsing), format, write and save spans
+    read_csv_kwargs: Extra pd.read_csv arguments (for example dtypes of a schema)
+
+    Returns:
+    int: Number of data rows written
+    """
+    metrics = metrics or Metrics()
+    pd = timed_import("pandas")
+    with pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs) as reader:
+        # Chunks are parsed while the writer consumes them
+        chunks = metrics.timed(reader, "read")
+        first_chunk = next(chunks)
+
+        def all_chunks():
+            yield first_chunk
+            yield from chunks
+
+        return write_formatted_xlsx(
+            list(first_chunk.columns), iter_csv_rows(all_chunks()), output_path,
+            rows_per_sheet, auto_width, metrics
+        )
+
+def stream_columnar_to_xlsx(path, output_path, columns=None, batch_size=BATCH_ROWS,
+                            rows_per_sheet=SHEET_DATA_ROWS, auto_width=True, metrics=None):
+    """Convert a Parquet, Arrow IPC or Feather file to a formatted excel file by record batch
+    Only the selected columns are decoded and the column types of the file
+    are kept (no inference from text); peak memory depends on the batch
+    size, not on the number of rows
+
+    Args:
+    path(str): Path to the Parquet/Arrow/Feather file
+    output_path(str): Path to the excel file to create
+    columns(list): Names of the columns to convert, in order (default: all)
+    batch_size(int): Rows decoded at a time
+    rows_per_sheet(int): Data rows per sheet before the rows go to a new sheet
+    auto_width(bool): Fit column widths to the content instead of the fixed widths
+    metrics(Metrics): Receives the read (decoding), format, write and save spans
+
+    Returns:
+    int: Number of data rows written
+    """
+    metrics = metrics or Metrics()
+    with metrics.span("read"):
+        header, total_rows, batches = open_columnar(path, columns, batch_size)
+    metrics.total_rows = total_rows
+    rows = iter_columnar_rows(metrics.timed(batches, "read"))
+    return write_formatted_xlsx(header, rows, output_path, rows_per_sheet, auto_width, metrics)
+
+def convert_csv_to_xlsx(csv_path, streaming=False, chunksize=STREAM_CHUNK_SIZE,
+                        verbose=True, stats=None, incremental=False, fast_path=True,
+                        typed=False, save_schema=False, split="sheets",
+                        rows_per_sheet=SHEET_DATA_ROWS, max_workers=None, auto_width=True,
+                        progress=False, metrics_jsonl=None, metrics=None, parallel=False,
+                        columns=None):
     """
     Convert CSV file to Excel with the same filename
     
     Args:
-        csv_path (str): Full path to the CSV file
+        csv_path (str): Full path to the CSV file, or to a Parquet/Arrow/Feather
+            file (read by record batch with its own column types; the CSV
+            reading options do not apply)
+        streaming (bool): Read the CSV in chunks and format while writing,
+            so the whole file is never held in memory
+        chunksize (int): Rows per chunk in streaming mode
+        verbose (bool): Print the conversion report
+        stats (dict): Optional dict that receives the number of rows written,
+            the stage times and the rows/cells per second
+        incremental (bool): Only rewrite the rows of chunks that changed since
+            the last conversion (tracked in a sidecar manifest); not
+            available with split="workbooks"
+        fast_path (bool): Read small files with the csv module instead of
+            pandas (falls back to pandas if the file needs it); ignored when
+            another mode (streaming, incremental, typed, parallel, split
+            workbooks) is asked for
+        typed (bool): Read the CSV with compact inferred dtypes (downcast
+            integers, categoricals, dates) and report its memory footprint
+        save_schema (bool): Save the inferred dtypes next to the CSV and
+            reuse them on the next conversions (implies typed)
+        split (str): Where rows beyond the Excel limit go: "sheets" (more
+            sheets of the same workbook) or "workbooks" (<name>_part<n>.xlsx
+            files written in parallel, with <name>.xlsx as their index)
+        rows_per_sheet (int): Data rows per sheet or partition workbook
+            (at least 1, capped at the Excel limit SHEET_DATA_ROWS)
+        max_workers (int): Worker processes for split="workbooks" and parallel
+        auto_width (bool): Fit column widths to the content instead of the
+            fixed widths (30 for columns 1 and 4, 45 for 2 and 3, 15 for the rest)
+        progress (bool | callable): Draw a progress bar on stderr, or call a
+            function with every metrics event (spans, progress, summary)
+        metrics_jsonl (str): Append the metrics events to this JSON lines file
+        metrics (Metrics): Use these metrics instead of building them from
+            progress and metrics_jsonl
+        parallel (bool): Serialize row ranges of the worksheet in max_workers
+            processes and stitch the workbook from the compressed fragments
+        columns (list): Columns of a Parquet/Arrow/Feather file to convert
+            (default: all)
     """
+    if metrics is None:
+        metrics = build_metrics(csv_path, progress, metrics_jsonl)
     try:
-        # Read CSV file
-        df = pd.read_csv(csv_path)
-
         # Get the filename without extension
         file_dir = os.path.dirname(csv_path)
         file_name = os.path.splitext(os.path.basename(csv_path))[0]
@@ -116,15 +544,120 @@ def convert_csv_to_xlsx(csv_path):
         # Create output path with xlsx extension
         output_path = os.path.join(file_dir, f"{file_name}.xlsx")
 
-        # Convert to excel
-        df.to_excel(output_path, index=False)
+        columnar = columnar_format(csv_path) is not None
+        if rows_per_sheet < 1:
+            raise ValueError(f"rows_per_sheet must be at least 1 (got {rows_per_sheet})")
+        rows_per_sheet = min(rows_per_sheet, SHEET_DATA_ROWS)
+        if incremental and split == "workbooks" and not columnar:
+            # The manifest tracks the rows of a single workbook
+            raise ValueError('incremental conversion cannot split into workbooks, use split="sheets"')
+        typed = (typed or save_schema) and not columnar
+        schema = get_schema(csv_path, save=save_schema) if typed and not incremental else None
+        memory = None
+        parts = None
+
+        # Small files skip pandas entirely, unless a mode that needs the
+        # pandas reader or its own writer was asked for (typed reads need
+        # pandas dtypes)
+        small_csv = None
+        if fast_path and not (incremental or typed or columnar or parallel or streaming
+                              or split == "workbooks"):
+            with metrics.span("read"):
+                small_csv = read_small_csv(csv_path)
+
+        if small_csv is not None:
+            header, rows = small_csv
+            metrics.total_rows = len(rows)
+            row_count = write_formatted_xlsx(header, rows, output_path, rows_per_sheet, auto_width,
+                                             metrics)
+        elif columnar:
+            # Columnar files are always read by record batch
+            row_count = stream_columnar_to_xlsx(csv_path, output_path, columns,
+                                                rows_per_sheet=rows_per_sheet,
+                                                auto_width=auto_width, metrics=metrics)
+        elif incremental:
+            # Imported here: mod_incremental_converter builds on this module
+            from mod_incremental_converter import incremental_csv_to_xlsx
+            with metrics.span("incremental"):
+                result = incremental_csv_to_xlsx(csv_path, output_path, chunksize,
+                                                 rows_per_sheet, auto_width)
+            row_count = result["rows"]
+            metrics.add_rows(result["rows_written"], result["columns"])
+            if verbose:
+                print(f"\nIncremental conversion: {result['mode']} "
+                      f"({result['rows_written']} of {row_count} rows written)")
+        elif split == "workbooks":
+            # One workbook per partition, written in parallel
+            row_count, parts = write_partitioned_workbooks(
+                csv_path, output_path, rows_per_sheet, chunksize, max_workers, auto_width, metrics
+            )
+        elif parallel:
+            # Imported here: mod_parallel_xlsx builds on this module
+            from mod_parallel_xlsx import parallel_csv_to_xlsx
+            row_count = parallel_csv_to_xlsx(csv_path, output_path, max_workers,
+                                             rows_per_sheet=rows_per_sheet, auto_width=auto_width,
+                                             metrics=metrics)
+        elif streaming:
+            # Convert and format in a single pass
+            try:
+                row_count = stream_csv_to_xlsx(csv_path, output_path, chunksize, rows_per_sheet,
+                                               auto_width, metrics,
+                                               **(read_csv_kwargs(schema) if schema else {}))
+            except (ValueError, OverflowError):
+                if schema is None:
+                    raise
+                # The schema does not fit the whole file: convert it untyped
+                row_count = stream_csv_to_xlsx(csv_path, output_path, chunksize, rows_per_sheet,
+                                               auto_width, metrics)
+        else:
+            # Read CSV file
+            with metrics.span("read"):
+                if schema is not None:
+                    df, applied = read_typed_csv(csv_path, schema)
+                    if applied:
+                        memory = memory_report(df, schema)
+                else:
+                    pd = timed_import("pandas")
+                    df = pd.read_csv(csv_path)
+            row_count = len(df)
+            metrics.total_rows = row_count
+
+            if row_count > rows_per_sheet:
+                # Too many rows for one sheet: split them over several sheets
+                write_formatted_xlsx(list(df.columns), iter_csv_rows([df]), output_path,
+                                     rows_per_sheet, auto_width, metrics)
+            else:
+                # Convert to excel a batch of rows at a time, so the
+                # progress advances while the sheet is written
+                pd = timed_import("pandas")
+                with metrics.span("write"), pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+                    for start, stop in metrics.batches(row_count, df.shape[1]):
+                        df.iloc[start:stop].to_excel(writer, index=False, header=start == 0,
+                                                     startrow=start + 1 if start else 0)
+
+                # Apply formatting
+                format_excel_file(output_path, auto_width, metrics)
 
-        # Apply formatting
-        format_excel_file(output_path)
+        summary = metrics.finish()
+        if stats is not None:
+            stats.update(summary, rows=row_count)
+            if memory is not None:
+                stats.update(memory)
+
+        if not verbose:
+            return output_path
 
         print("\nFile successfully converted and formatted")
         print(f"Input file = {csv_path}")
         print(f"Output file = {output_path}")
+        print(f"Stages: {metrics.format_summary()}")
+        if parts and len(parts) > 1:
+            print(f"Partitions = {len(parts)} workbooks ({os.path.basename(parts[0])} ...)")
+        elif row_count > rows_per_sheet:
+            print(f"Partitions = {-(-row_count // rows_per_sheet)} sheets (see the {INDEX_SHEET} sheet)")
+        if memory is not None:
+            print(f"Memory: {format_bytes(memory['memory_before'])} untyped (estimated) -> "
+                  f"{format_bytes(memory['memory_after'])} typed")
 
         print(f"\nFormatting applied:")
         print(f"  Header Row:")
@@ -137,19 +670,26 @@ def convert_csv_to_xlsx(csv_path):
         print(f"    • Left-aligned, vertically centered text")
         print(f"    • Text wrapping enabled")
         print(f"  Column Widths:")
-        print(f"    • Columns 1 & 4: 30 units wide")
-        print(f"    • Columns 2 & 3: 45 units wide")
+        if auto_width:
+            print(f"    • Fitted to the content ({MIN_COLUMN_WIDTH} to {MAX_COLUMN_WIDTH} units wide)")
+        else:
+            print(f"    • Columns 1 & 4: 30 units wide")
+            print(f"    • Columns 2 & 3: 45 units wide")
 
         return output_path
     
     except Exception as e:
+        metrics.emit("error", error=f"{type(e).__name__}: {e}")
         print(f"Error: {e}")
         import traceback
-        traceback.print_exec()
+        traceback.print_exc()
         return None
     
 def select_csv_file():
     """Open file dialog to select a CSV file"""
+    filedialog = timed_import("tkinter.filedialog")
+    from tkinter import Tk
+
     root = Tk()
     root.withdraw() # Hide the main window
     root.attributes('-topmost', True) # Bring dialog to front
@@ -159,6 +699,7 @@ def select_csv_file():
         title="Select CSV file to convert", 
         filetypes=[
             ("CSV files", "*.csv"), 
+            ("Parquet/Arrow files", "*.parquet *.pq *.arrow *.arrows *.feather *.ipc"),
             ("All files", "*.*")
         ],
         initialdir=os.path.expanduser("~") # Start in users home directory
@@ -168,12 +709,76 @@ def select_csv_file():
 
     return file_path
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Convert CSV files to formatted excel files")
+    parser.add_argument("path", nargs="?",
+                        help="CSV or Parquet/Arrow/Feather file, directory or glob pattern "
+                             "(opens a dialog if omitted)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the CSV in chunks to keep memory flat")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rewrite rows that changed since the last conversion")
+    parser.add_argument("--typed", action="store_true",
+                        help="Read the CSV with compact inferred dtypes and report memory use")
+    parser.add_argument("--save-schema", action="store_true",
+                        help="Save the inferred dtypes next to the CSV for later runs (implies --typed)")
+    parser.add_argument("--fixed-widths", action="store_true",
+                        help="Use the fixed column widths instead of fitting them to the content")
+    parser.add_argument("--split", choices=["sheets", "workbooks"], default="sheets",
+                        help="Where rows beyond the Excel row limit go (default: sheets)")
+    parser.add_argument("--rows-per-sheet", type=int, default=SHEET_DATA_ROWS,
+                        help=f"Data rows per sheet or partition workbook "
+                             f"(1 to {SHEET_DATA_ROWS:,}, the Excel limit)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Serialize the rows of a single file in --workers processes")
+    parser.add_argument("--columns",
+                        help="Comma-separated columns to convert from Parquet/Arrow/Feather files")
+    parser.add_argument("--progress", action="store_true",
+                        help="Show a progress bar with the rows written and rows/s")
+    parser.add_argument("--metrics-jsonl",
+                        help="Append stage timings, progress and throughput as JSON lines to this file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for batch conversion (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="Convert files in batch mode even if their output is up to date")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report the import time of pandas, openpyxl and tkinter")
+    args = parser.parse_args()
+    if args.rows_per_sheet < 1:
+        parser.error("--rows-per-sheet must be at least 1")
+    # A sheet holds at most SHEET_DATA_ROWS rows below its header
+    args.rows_per_sheet = min(args.rows_per_sheet, SHEET_DATA_ROWS)
+    return args
+
 def main():
     """Main execution function"""
-    print("Please select a CSV file to convert to excel.")
+    args = parse_args()
+    columns = [name.strip() for name in args.columns.split(",")] if args.columns else None
 
-    # Get filepath from dialog
-    csv_path = select_csv_file()
+    # Directory or glob pattern: convert every matching CSV in parallel
+    if args.path and is_batch_source(args.path):
+        results, skipped, elapsed = batch_convert(
+            args.path, convert_csv_to_xlsx, max_workers=args.workers,
+            force=args.force, extensions=TABLE_EXTENSIONS,
+            streaming=args.stream, incremental=args.incremental,
+            typed=args.typed, save_schema=args.save_schema,
+            split=args.split, rows_per_sheet=args.rows_per_sheet,
+            auto_width=not args.fixed_widths, metrics_jsonl=args.metrics_jsonl,
+            columns=columns
+        )
+        print_batch_summary(results, skipped, elapsed)
+        if args.profile_startup:
+            print_import_profile()
+        return
+
+    if args.path:
+        csv_path = args.path
+    else:
+        print("Please select a CSV file to convert to excel.")
+
+        # Get filepath from dialog
+        csv_path = select_csv_file()
 
     # Get the filename without extension
     file_dir = os.path.dirname(csv_path)
@@ -182,9 +787,17 @@ def main():
     if csv_path:
         print(f"\nSelected file: {file_name}",
               f"\nFrom directory: {file_dir}")
-        convert_csv_to_xlsx(csv_path)
+        convert_csv_to_xlsx(csv_path, streaming=args.stream, incremental=args.incremental,
+                            typed=args.typed, save_schema=args.save_schema,
+                            split=args.split, rows_per_sheet=args.rows_per_sheet,
+                            max_workers=args.workers, auto_width=not args.fixed_widths,
+                            progress=args.progress, metrics_jsonl=args.metrics_jsonl,
+                            parallel=args.parallel, columns=columns)
     else:
         print("No file selected. Exiting!")
 
+    if args.profile_startup:
+        print_import_profile()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import json
+import re
+from mod_startup import timed_import
+
+# Rows read to infer the schema of a CSV
+SAMPLE_ROWS = 10000
+
+# Text columns whose distinct values are at most this fraction of their
+# values are read as categoricals (one small code per cell instead of a
+# Python string per cell)
+CATEGORY_MAX_RATIO = 0.5
+
+SCHEMA_VERSION = 1
+
+# ISO dates, optionally with a time ("2024-01-31", "2024-01-31 08:15:00")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?")
+
+def schema_path_for(csv_path):
+    """Return the sidecar schema path of a CSV file (<file>.csv.schema.json)"""
+    return csv_path + ".schema.json"
+
+def memory_usage(df):
+    """Return the memory used by a DataFrame in bytes, counting the Python objects it holds"""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+def infer_column_type(series):
+    """Infer the compact type of one sampled column
+
+    Returns:
+    str: "integer" (downcast after reading), "datetime", "category", or
+    None to keep the type pandas infers
+    """
+    pd = timed_import("pandas")
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return "integer"
+    if not pd.api.types.is_string_dtype(series.dtype):
+        return None
+
+    values = series.dropna()
+    if values.empty:
+        return None
+    if all(DATE_RE.fullmatch(value) for value in values):
+        return "datetime"
+    if values.nunique() <= len(values) * CATEGORY_MAX_RATIO:
+        return "category"
+    return None
+
+def infer_schema(csv_path, sample_rows=SAMPLE_ROWS):
+    """Infer a compact schema from the first rows of a CSV
+
+    Args:
+    csv_path(str): Path to the CSV file
+    sample_rows(int): Rows read for the inference
+
+    Returns:
+    dict: version, columns (column name -> type from infer_column_type) and
+    the memory of the sample read untyped and typed
+    """
+    pd = timed_import("pandas")
+    sample = pd.read_csv(csv_path, nrows=sample_rows)
+    columns = {str(name): infer_column_type(sample[name]) for name in sample.columns}
+    schema = {"version": SCHEMA_VERSION, "columns": columns}
+
+    typed_sample = apply_schema(sample.copy(), schema)
+    schema["sample_memory"] = {
+        "untyped": memory_usage(sample),
+        "typed": memory_usage(typed_sample),
+    }
+    return schema
+
+def load_schema(csv_path):
+    """Load the saved schema of a CSV, or None if missing or unusable"""
+    try:
+        with open(schema_path_for(csv_path), encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if schema.get("version") != SCHEMA_VERSION:
+        return None
+    return schema
+
+def save_schema(csv_path, schema):
+    """Save a schema next to its CSV so later conversions skip the inference"""
+    with open(schema_path_for(csv_path), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+
+def get_schema(csv_path, sample_rows=SAMPLE_ROWS, save=False):
+    """Return the saved schema of a CSV if it still fits its header, else infer one
+
+    Args:
+    csv_path(str): Path to the CSV file
+    sample_rows(int): Rows read when the schema has to be inferred
+    save(bool): Save an inferred schema for the next conversions
+    """
+    pd = timed_import("pandas")
+    schema = load_schema(csv_path)
+    if schema is not None:
+        header = [str(name) for name in pd.read_csv(csv_path, nrows=0).columns]
+        if header == list(schema["columns"]):
+            return schema
+
+    schema = infer_schema(csv_path, sample_rows)
+    if save:
+        save_schema(csv_path, schema)
+    return schema
+
+def read_csv_kwargs(schema):
+    """Return the pd.read_csv arguments that read a CSV with a schema"""
+    columns = schema["columns"]
+    kwargs = {}
+    categories = {name: "category" for name, kind in columns.items() if kind == "category"}
+    if categories:
+        kwargs["dtype"] = categories
+    dates = [name for name, kind in columns.items() if kind == "datetime"]
+    if dates:
+        # Values that are not ISO dates leave the column as text
+        kwargs["parse_dates"] = dates
+        kwargs["date_format"] = "ISO8601"
+    return kwargs
+
+def apply_schema(df, schema):
+    """Give the columns of a DataFrame the types of a schema
+    Columns read with read_csv_kwargs already are categoricals and dates;
+    integers are downcast after parsing, from the actual values, so a value
+    outside the range seen in the sample can never overflow
+
+    Args:
+    df: DataFrame (modified in place and returned)
+    schema(dict): Schema from get_schema
+    """
+    pd = timed_import("pandas")
+    for name, kind in schema["columns"].items():
+        if kind == "category" and name in df and df[name].dtype != "category":
+            df[name] = df[name].astype("category")
+        elif kind == "datetime" and name in df and not pd.api.types.is_datetime64_any_dtype(df[name].dtype):
+            try:
+                df[name] = pd.to_datetime(df[name], format="ISO8601")
+            except ValueError:
+                pass
+        elif kind == "integer" and name in df and pd.api.types.is_integer_dtype(df[name].dtype):
+            df[name] = pd.to_numeric(df[name], downcast="integer")
+    return df
+
+def read_typed_csv(csv_path, schema, **read_csv_options):
+    """Read a CSV with a schema, falling back to a plain read if the schema does not fit
+
+    Args:
+    csv_path(str): Path to the CSV file
+    schema(dict): Schema from get_schema
+
+    Returns:
+    tuple: (DataFrame, True if the schema was applied)
+    """
+    pd = timed_import("pandas")
+    try:
+        df = pd.read_csv(csv_path, **read_csv_kwargs(schema), **read_csv_options)
+    except (ValueError, OverflowError):
+        return pd.read_csv(csv_path, **read_csv_options), False
+    return apply_schema(df, schema), True
+
+def memory_report(df, schema):
+    """Return the memory of a typed DataFrame and an estimate of the same data read untyped
+    The untyped figure scales the typed one by the ratio measured on the
+    sample when the schema was inferred
+
+    Returns:
+    dict: memory_before (estimated, untyped) and memory_after (measured, typed) in bytes
+    """
+    after = memory_usage(df)
+    sample = schema.get("sample_memory") or {}
+    ratio = sample["untyped"] / sample["typed"] if sample.get("typed") else 1.0
+    return {"memory_before": int(after * ratio), "memory_after": after}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# Default size limit for a cache directory (1 GB)
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+INDEX_FILE = 'index.json'
+
+
+def cache_key(*parts):
+    """Return a stable hex key for any JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """Size-bounded on-disk blob store with least-recently-used eviction
+
+    Each entry is a file in cache_dir plus a metadata dict. index.json keeps
+    sizes, last access times and metadata together with hit/miss counters,
+    so statistics survive across runs of the scripts that use the cache.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, INDEX_FILE)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'entries': {}, 'stats': {'hits': 0, 'misses': 0,
+                                             'bytes_saved': 0, 'evictions': 0}}
+
+    def _save_index(self):
+        # Write to a temporary file and rename, so the index is never half written
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def path_for(self, key):
+        """Return the file that stores the data of a key"""
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key, count=True):
+        """Return (path, metadata) of a cached entry, or None
+
+        count=False looks the entry up without touching the hit/miss counters
+        (for example before a revalidation whose outcome is not known yet).
+        """
+        entry = self._index['entries'].get(key)
+        if entry is None or not os.path.exists(self.path_for(key)):
+            if entry is not None:
+                # The file was removed (by hand or by another process)
+                self.discard(key)
+            if count:
+                self.record_miss()
+            return None
+        entry['last_used'] = time.time()
+        if count:
+            self.record_hit(entry['size'])
+        else:
+            self._save_index()
+        return self.path_for(key), entry['meta']
+
+    def record_hit(self, size):
+        """Count a hit that avoided producing size bytes"""
+        self._index['stats']['hits'] += 1
+        self._index['stats']['bytes_saved'] += size
+        self._save_index()
+
+    def record_miss(self):
+        """Count a miss"""
+        self._index['stats']['misses'] += 1
+        self._save_index()
+
+    def put(self, key, data=None, meta=None, src_path=None):
+        """Store bytes (data) or a copy of a file (src_path) under key and evict old entries
+
+        Returns the path of the cached file.
+        """
+        path = self.path_for(key)
+        tmp_path = path + '.tmp'
+        if src_path is not None:
+            shutil.copyfile(src_path, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+
+        self._index['entries'][key] = {
+            'size': os.path.getsize(path),
+            'last_used': time.time(),
+            'meta': meta or {},
+        }
+        self.evict(keep=key)
+        self._save_index()
+        return path
+
+    def discard(self, key):
+        """Remove an entry and its file, if present"""
+        if self._index['entries'].pop(key, None) is not None:
+            self._save_index()
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes
+
+        The entry named by keep (usually the one just stored) is never removed.
+        """
+        entries = self._index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entries.pop(key)['size']
+            self._index['stats']['evictions'] += 1
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Return hits, misses, hit_rate, bytes_saved, evictions, entries and bytes"""
+        stats = dict(self._index['stats'])
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(self._index['entries'])
+        stats['bytes'] = sum(entry['size'] for entry in self._index['entries'].values())
+        return stats
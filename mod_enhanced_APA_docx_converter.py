@@ -1,200 +1,386 @@
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
 import os
-from tkinter import Tk, filedialog
+import time
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mod_APA_docx_converter import (
+    DEFAULT_OPTIONS as BASE_OPTIONS, apa_output_path, apply_margins,
+    add_running_head, select_docx_files, paragraph_defaults,
+    set_style_defaults, clear_overrides, running_head_text, document_title
+)
+from mod_APA_cache import DEFAULT_CACHE_DIR, open_cache, format_with_cache, format_cache_stats
 
-# Ocultar la ventana principal de tkinter
-root = Tk()
-root.withdraw()
+# Opciones por defecto: texto normal con espacio 1.5 y encabezados con 2.0
+DEFAULT_OPTIONS = {
+    **BASE_OPTIONS,
+    "line_spacing": 1.5,  # Texto normal con espacio 1.5, APA es 2.0
+    "heading_line_spacing": 2.0,
+    # Un párrafo es encabezado si algún run supera este tamaño (pt)...
+    "heading_min_size": 15,
+    # ...y su nivel es el del primer tamaño mínimo alcanzado (si no, nivel 5)
+    "heading_sizes": [[24, 1], [20, 2], [18, 3], [16, 4]],
+    # Índice precalculado con build_heading_index (None: se construye al formatear)
+    "heading_index": None,
+    # Ruta donde exportar el índice como JSON, o True para guardarlo junto al
+    # documento original como <nombre>_headings.json (solo con rutas)
+    "export_index": None,
+}
 
-# Abrir diálogo para seleccionar archivo
-print("📂 Selecciona el archivo DOCX a formatear...")
-input_path = filedialog.askopenfilename(
-    title="Seleccionar archivo DOCX",
-    filetypes=[("Documentos Word", "*.docx"), ("Todos los archivos", "*.*")]
-)
+def get_options(options=None):
+    """Combina las opciones recibidas con las opciones por defecto"""
+    return {**DEFAULT_OPTIONS, **(options or {})}
 
-# Verificar si se seleccionó un archivo
-if not input_path:
-    print("❌ No se seleccionó ningún archivo. Operación cancelada.")
-    exit()
+# --- IDENTIFICAR Y FORMATEAR ENCABEZADOS APA 7 ---
+# APA 7 tiene 5 niveles de encabezados, todos en 12pt pero con diferente formato
+HEADING_FORMATS = {
+    # Nivel 1: Centrado, Negrita, Título Capitalizado
+    1: {"alignment": WD_ALIGN_PARAGRAPH.CENTER, "indent": 0, "italic": False, "period": False},
+    # Nivel 2: Izquierda, Negrita, Título Capitalizado
+    2: {"alignment": WD_ALIGN_PARAGRAPH.LEFT, "indent": 0, "italic": False, "period": False},
+    # Nivel 3: Izquierda, Negrita, Cursiva, Título Capitalizado
+    3: {"alignment": WD_ALIGN_PARAGRAPH.LEFT, "indent": 0, "italic": True, "period": False},
+    # Nivel 4: Sangrado, Negrita, Título Capitalizado, Termina con punto
+    4: {"alignment": WD_ALIGN_PARAGRAPH.LEFT, "indent": 0.5, "italic": False, "period": True},
+    # Nivel 5: Sangrado, Negrita, Cursiva, Título Capitalizado, Termina con punto
+    5: {"alignment": WD_ALIGN_PARAGRAPH.LEFT, "indent": 0.5, "italic": True, "period": True},
+}
 
-# Generar nombre de salida automáticamente
-file_dir = os.path.dirname(input_path)
-file_name = os.path.basename(input_path)
-file_name_without_ext = os.path.splitext(file_name)[0]
-output_path = os.path.join(file_dir, f"{file_name_without_ext}_APA.docx")
+def heading_level(max_font_size, style_name, options):
+    """
+    Determina el nivel APA de un párrafo, o None si es texto normal
+    Los estilos integrados de Word (Heading 1-5) tienen prioridad; si no,
+    el nivel sale de la tabla de tamaños (más grande = nivel más importante)
+    """
+    if style_name and style_name.lower().startswith("heading "):
+        level = style_name.split()[-1]
+        if level.isdigit() and int(level) in HEADING_FORMATS:
+            return int(level)
 
-try:
-    print(f"📄 Procesando: {file_name}")
-    
-    # Cargar el documento
-    doc = Document(input_path)
-    
-    # --- CONFIGURACIÓN GENERAL APA ---
-    for section in doc.sections:
-        section.top_margin = Inches(1)
-        section.bottom_margin = Inches(1)
-        section.left_margin = Inches(1)
-        section.right_margin = Inches(1)
-    
-    # --- IDENTIFICAR Y FORMATEAR ENCABEZADOS APA 7 ---
-    # APA 7 tiene 5 niveles de encabezados, todos en 12pt pero con diferente formato
-    
-    def apply_heading_format(paragraph, level):
-        """Aplica formato APA 7 según el nivel de encabezado"""
-        # Aplicar formato según nivel
-        if level == 1:  # Nivel 1: Centrado, Negrita, Título Capitalizado
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            paragraph.paragraph_format.first_line_indent = Inches(0)
-            for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-                run.bold = True
-                run.italic = False
-                
-        elif level == 2:  # Nivel 2: Izquierda, Negrita, Título Capitalizado
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            paragraph.paragraph_format.first_line_indent = Inches(0)
-            for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-                run.bold = True
-                run.italic = False
-                
-        elif level == 3:  # Nivel 3: Izquierda, Negrita, Cursiva, Título Capitalizado
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            paragraph.paragraph_format.first_line_indent = Inches(0)
-            for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-                run.bold = True
-                run.italic = True
-                
-        elif level == 4:  # Nivel 4: Sangrado, Negrita, Título Capitalizado, Termina con punto
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            paragraph.paragraph_format.first_line_indent = Inches(0.5)
-            for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-                run.bold = True
-                run.italic = False
-            if not paragraph.text.strip().endswith('.'):
-                paragraph.add_run('.')
-                
-        elif level == 5:  # Nivel 5: Sangrado, Negrita, Cursiva, Título Capitalizado, Termina con punto
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            paragraph.paragraph_format.first_line_indent = Inches(0.5)
-            for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-                run.bold = True
-                run.italic = True
-            if not paragraph.text.strip().endswith('.'):
-                paragraph.add_run('.')
-        
-        paragraph.paragraph_format.line_spacing = 2.0
-        paragraph.paragraph_format.space_before = Pt(0)
-        paragraph.paragraph_format.space_after = Pt(0)
-    
-    # Formatear párrafos detectando títulos por tamaño de fuente
-    for paragraph in doc.paragraphs:
-        # Verificar si algún run tiene tamaño mayor a 15pt
-        is_title = False
-        max_font_size = 0
-        
-        for run in paragraph.runs:
-            if run.font.size and run.font.size.pt > 15:
-                is_title = True
-                max_font_size = max(max_font_size, run.font.size.pt)
-        
-        if is_title:
-            # Determinar nivel según tamaño de fuente
-            # Tamaños más grandes = niveles más altos (1 es el más importante)
-            if max_font_size >= 24:
-                level = 1
-            elif max_font_size >= 20:
-                level = 2
-            elif max_font_size >= 18:
-                level = 3
-            elif max_font_size >= 16:
-                level = 4
-            else:
-                level = 5
-            
-            apply_heading_format(paragraph, level)
+    if max_font_size is None or max_font_size <= options["heading_min_size"]:
+        return None
+    for min_size, level in options["heading_sizes"]:
+        if max_font_size >= min_size:
+            return level
+    return 5
+
+def build_heading_index(doc, options=None):
+    """
+    Recorre el documento una vez y construye el índice de encabezados:
+    posición del párrafo, tamaño de fuente máximo, estilo y nivel APA
+
+    Returns:
+        dict: {"paragraphs": total de párrafos, "headings": [entradas del índice]}
+    """
+    options = get_options(options)
+    # Nombres de estilo por id (los ids cambian con el idioma de Word, los nombres no)
+    style_names = {style.style_id: style.name for style in doc.styles}
+
+    headings = []
+    paragraphs = doc.element.body.p_lst
+    for position, p in enumerate(paragraphs):
+        sizes = [
+            r.rPr.sz_val.pt for r in p.r_lst
+            if r.rPr is not None and r.rPr.sz_val is not None
+        ]
+        max_font_size = max(sizes) if sizes else None
+        style_name = style_names.get(p.style) if p.style else None
+
+        level = heading_level(max_font_size, style_name, options)
+        if level is not None:
+            headings.append({
+                "index": position,
+                "level": level,
+                "max_size": max_font_size,
+                "style": style_name,
+            })
+
+    return {"paragraphs": len(paragraphs), "headings": headings}
+
+def export_heading_index(heading_index, path):
+    """Guarda el índice de encabezados como JSON (para cachearlo o compararlo entre versiones)"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(heading_index, f, ensure_ascii=False, indent=2)
+
+def heading_index_path(input_path):
+    """Genera el nombre del índice de encabezados: <nombre>_headings.json junto al original"""
+    file_dir = os.path.dirname(input_path)
+    file_name_without_ext = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(file_dir, f"{file_name_without_ext}_headings.json")
+
+def load_heading_index(path):
+    """Carga un índice de encabezados guardado con export_heading_index"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def apply_heading_format(paragraph, level, options):
+    """Aplica formato APA 7 según el nivel de encabezado"""
+    heading_format = HEADING_FORMATS[level]
+    paragraph.alignment = heading_format["alignment"]
+    paragraph.paragraph_format.first_line_indent = Inches(heading_format["indent"])
+    for run in paragraph.runs:
+        run.font.name = options["font_name"]
+        run.font.size = Pt(options["font_size"])
+        run.bold = True
+        run.italic = heading_format["italic"]
+    if heading_format["period"] and not paragraph.text.strip().endswith('.'):
+        paragraph.add_run('.')
+
+    paragraph.paragraph_format.line_spacing = options["heading_line_spacing"]
+    paragraph.paragraph_format.space_before = Pt(0)
+    paragraph.paragraph_format.space_after = Pt(0)
+
+def body_defaults(options):
+    """Formato de párrafo del texto normal que se guarda en los estilos del documento"""
+    return {
+        **paragraph_defaults(options),
+        "space_before": Pt(0),
+        "space_after": Pt(0),
+    }
+
+def format_paragraphs(doc, options, heading_index):
+    """Formatea los párrafos usando el índice de encabezados"""
+    if options["style_defaults"]:
+        # El texto normal toma el formato de los estilos
+        defaults = body_defaults(options)
+        set_style_defaults(doc, options, defaults)
+
+    levels = {entry["index"]: entry["level"] for entry in heading_index["headings"]}
+    for position, paragraph in enumerate(doc.paragraphs):
+        level = levels.get(position)
+        if level is not None:
+            apply_heading_format(paragraph, level, options)
+        elif options["style_defaults"]:
+            # Solo se corrige el formato directo que contradice el estilo
+            clear_overrides(paragraph, options, defaults)
         else:
             # Formato de texto normal
             for run in paragraph.runs:
-                run.font.name = "Times New Roman"
-                run.font.size = Pt(12)
-            paragraph.paragraph_format.line_spacing = 1.5  # Texto normal con espacio 1.5, APA es 2.0
-            paragraph.paragraph_format.first_line_indent = Inches(0.5)
+                run.font.name = options["font_name"]
+                run.font.size = Pt(options["font_size"])
+            paragraph.paragraph_format.line_spacing = options["line_spacing"]
+            paragraph.paragraph_format.first_line_indent = Inches(options["first_line_indent"])
             paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
             paragraph.paragraph_format.space_before = Pt(0)
             paragraph.paragraph_format.space_after = Pt(0)
-    
+
+def format_apa(input_file, output_file, options=None):
+    """
+    Aplica el formato APA 7 con niveles de encabezado a un documento DOCX sin interfaz gráfica
+
+    Args:
+        input_file (str | file-like): Ruta o archivo abierto del documento original
+        output_file (str | file-like): Ruta o archivo abierto donde guardar el resultado
+        options (dict): Opciones que reemplazan a DEFAULT_OPTIONS
+
+    Returns:
+        output_file
+    """
+    options = get_options(options)
+
+    # Cargar el documento
+    doc = Document(input_file)
+    options["running_head"] = running_head_text(options, document_title(doc), input_file)
+
+    # --- CONFIGURACIÓN GENERAL APA ---
+    apply_margins(doc, options)
+
+    # --- FORMATO DE PÁRRAFOS Y ENCABEZADOS APA 7 ---
+    heading_index = options["heading_index"] or build_heading_index(doc, options)
+    if options["export_index"]:
+        index_path = options["export_index"]
+        if index_path is True:
+            index_path = heading_index_path(input_file)
+        export_heading_index(heading_index, index_path)
+    format_paragraphs(doc, options, heading_index)
+
     # --- ENCABEZADO APA ---
-    for section in doc.sections:
-        header = section.header
-        header.is_linked_to_previous = False
-        
-        # Limpiar encabezado previo
-        for p in header.paragraphs:
-            p.clear()
-        
-        # Crear tabla invisible para alinear título (izq.) y página (der.)
-        table = header.add_table(rows=1, cols=2, width=Inches(6.5))
-        
-        # Título en la celda izquierda
-        left_cell = table.rows[0].cells[0]
-        left_paragraph = left_cell.paragraphs[0]
-        left_paragraph.text = "IMPLEMENTACIÓN DE BIG DATA EN LA COOPERATIVA JEP"
-        left_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        for run in left_paragraph.runs:
-            run.font.name = "Times New Roman"
-            run.font.size = Pt(12)
-        
-        # Número de página en la celda derecha
-        right_cell = table.rows[0].cells[1]
-        right_paragraph = right_cell.paragraphs[0]
-        right_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        run = right_paragraph.add_run()
-        fldChar1 = OxmlElement('w:fldChar')
-        fldChar1.set(qn('w:fldCharType'), 'begin')
-        instrText = OxmlElement('w:instrText')
-        instrText.text = " PAGE "
-        fldChar2 = OxmlElement('w:fldChar')
-        fldChar2.set(qn('w:fldCharType'), 'end')
-        
-        run._element.append(fldChar1)
-        run._element.append(instrText)
-        run._element.append(fldChar2)
-        
-        # Hacer la tabla invisible (sin bordes)
-        for row in table.rows:
-            for cell in row.cells:
-                tcPr = cell._element.get_or_add_tcPr()
-                tcBorders = OxmlElement('w:tcBorders')
-                for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
-                    border = OxmlElement(f'w:{border_name}')
-                    border.set(qn('w:val'), 'none')
-                    tcBorders.append(border)
-                tcPr.append(tcBorders)
-    
+    add_running_head(doc, options)
+
     # Guardar el documento
-    doc.save(output_path)
-    print(f"\n✅ Documento formateado con éxito!")
-    print(f"📁 Archivo original: {input_path}")
-    print(f"💾 Archivo guardado: {output_path}")
-    print(f"📍 Ubicación: {os.path.abspath(file_dir)}")
-    print()
-
-except Exception as e:
-    print(f"\n❌ Error al procesar el documento: {e}")
-    import traceback
-    traceback.print_exc()
\ No newline at end of file
+    doc.save(output_file)
+    return output_file
+
+def find_docx_files(root_dir):
+    """Busca recursivamente los DOCX de una carpeta, omitiendo resultados _APA y archivos temporales de Word"""
+    docx_files = []
+    for dir_path, _, file_names in os.walk(root_dir):
+        for file_name in file_names:
+            if (file_name.lower().endswith(".docx")
+                    and not file_name.startswith("~$")
+                    and not file_name.endswith("_APA.docx")):
+                docx_files.append(os.path.join(dir_path, file_name))
+    return sorted(docx_files)
+
+def format_one(input_path, options=None):
+    """
+    Formatea un documento y mide su latencia (se ejecuta en un proceso del pool)
+
+    Returns:
+        dict: input, output, seconds y error (traceback completo si falló)
+    """
+    output_path = apa_output_path(input_path)
+    start = time.perf_counter()
+    try:
+        format_apa(input_path, output_path, options)
+        error = None
+    except Exception:
+        output_path = None
+        error = traceback.format_exc()
+    return {
+        "input": input_path,
+        "output": output_path,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+def format_directory(root_dir, options=None, max_workers=None, cache=None):
+    """
+    Formatea todos los DOCX de un árbol de carpetas en paralelo
+    Los resultados _APA.docx se guardan junto a cada original y los errores
+    se recopilan sin detener el lote
+
+    Args:
+        root_dir (str): Carpeta raíz
+        options (dict): Opciones que reemplazan a DEFAULT_OPTIONS
+        max_workers (int): Número de procesos (por defecto, número de CPUs)
+        cache (APACache): Caché de resultados; la consulta este proceso y
+            solo los documentos que no están en ella pasan al pool
+
+    Returns:
+        tuple: (resultados, segundos totales)
+    """
+    docx_files = find_docx_files(root_dir)
+    results = []
+    start = time.perf_counter()
+
+    pending = docx_files
+    keys = {}
+    full_options = get_options(options)
+    if cache is not None and not full_options["export_index"]:
+        pending = []
+        for path in docx_files:
+            lookup_start = time.perf_counter()
+            key = cache.key_for(path, full_options, "enhanced")
+            if cache.fetch(key, apa_output_path(path)):
+                result = {"input": path, "output": apa_output_path(path),
+                          "seconds": time.perf_counter() - lookup_start, "error": None,
+                          "cached": True}
+                print(f"💾 {result['seconds']:6.2f}s  {path}")
+                results.append(result)
+            else:
+                keys[path] = key
+                pending.append(path)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(format_one, path, options) for path in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                status = "❌" if result["error"] else "✅"
+                print(f"{status} {result['seconds']:6.2f}s  {result['input']}")
+                if not result["error"] and result["input"] in keys:
+                    cache.store(keys[result["input"]], result["output"], result["input"])
+                results.append(result)
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: result["input"])
+    return results, elapsed
+
+def print_batch_summary(results, elapsed):
+    """Muestra el resumen del lote: errores con traceback y documentos por segundo"""
+    failed = [result for result in results if result["error"]]
+    for result in failed:
+        print(f"\n❌ Error en {result['input']}:")
+        print(result["error"])
+
+    done = len(results) - len(failed)
+    cached = sum(1 for result in results if result.get("cached"))
+    print(f"\n📊 Documentos: {len(results)}  ✅ Formateados: {done}  ❌ Errores: {len(failed)}"
+          + (f"  💾 De la caché: {cached}" if cached else ""))
+    if results:
+        latencies = sorted(result["seconds"] for result in results)
+        print(f"⏱️  Latencia media: {sum(latencies) / len(latencies):.2f}s  "
+              f"máxima: {latencies[-1]:.2f}s")
+    if elapsed > 0:
+        print(f"🚀 Tiempo total: {elapsed:.2f}s ({done / elapsed:.2f} documentos/s)")
+
+def parse_args():
+    """Lee los argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Aplica formato APA 7 con niveles de encabezado a documentos DOCX"
+    )
+    parser.add_argument("files", nargs="*",
+                        help="Documentos DOCX o carpetas a formatear (abre un diálogo si se omiten)")
+    parser.add_argument("--running-head", default=DEFAULT_OPTIONS["running_head"],
+                        help="Texto del encabezado (por defecto, el título del documento "
+                             "o el nombre del archivo)")
+    parser.add_argument("--style-defaults", action="store_true",
+                        help="Definir el formato en los estilos en lugar de en cada run")
+    parser.add_argument("--export-index", action="store_true",
+                        help="Guardar el índice de encabezados como <nombre>_headings.json")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos para formatear carpetas (por defecto, número de CPUs)")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR",
+                        help="Reutilizar los resultados de documentos ya formateados con las "
+                             f"mismas opciones (caché en DIR, por defecto {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help="Tamaño máximo de la caché en MB (por defecto 1024)")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    options = {
+        "running_head": args.running_head,
+        "style_defaults": args.style_defaults,
+        "export_index": args.export_index or None,
+    }
+
+    input_paths = args.files
+    if not input_paths:
+        # Abrir diálogo para seleccionar archivo
+        print("📂 Selecciona el archivo DOCX a formatear...")
+        input_paths = select_docx_files()
+
+    # Verificar si se seleccionó un archivo
+    if not input_paths:
+        print("❌ No se seleccionó ningún archivo. Operación cancelada.")
+        return
+
+    cache = open_cache(args.cache, args.cache_max_mb) if args.cache else None
+
+    # Carpetas: formatear todo el árbol en paralelo
+    for root_dir in [path for path in input_paths if os.path.isdir(path)]:
+        print(f"📂 Formateando carpeta: {root_dir}")
+        results, elapsed = format_directory(root_dir, options, args.workers, cache)
+        print_batch_summary(results, elapsed)
+
+    for input_path in [path for path in input_paths if not os.path.isdir(path)]:
+        # Generar nombre de salida automáticamente
+        output_path = apa_output_path(input_path)
+        try:
+            print(f"📄 Procesando: {os.path.basename(input_path)}")
+            if cache is None:
+                format_apa(input_path, output_path, options)
+            elif format_with_cache(format_apa, input_path, output_path, get_options(options),
+                                   cache, "enhanced"):
+                print("💾 Documento sin cambios: resultado tomado de la caché")
+            print(f"\n✅ Documento formateado con éxito!")
+            print(f"📁 Archivo original: {input_path}")
+            print(f"💾 Archivo guardado: {output_path}")
+            print(f"📍 Ubicación: {os.path.abspath(os.path.dirname(output_path))}")
+            print()
+
+        except Exception as e:
+            print(f"\n❌ Error al procesar el documento: {e}")
+            traceback.print_exc()
+
+    if cache is not None:
+        print(format_cache_stats(cache.stats()))
+
+if __name__ == "__main__":
+    main()
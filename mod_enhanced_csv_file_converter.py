@@ -1,20 +1,82 @@
-import pandas as pd
+from mod_startup import timed_import, print_import_profile
 import os
-from tkinter import filedialog
-from tkinter import Tk
-import sys
+import argparse
+from mod_batch_converter import is_batch_source, batch_convert, print_batch_summary, format_bytes
+from mod_csv_fast import read_small_csv
+from mod_csv_ingest import get_schema, read_typed_csv, memory_report
+from mod_metrics import build_metrics
 
-def convert_csv_to_xlsx(csv_path):
+# Sheet name pandas gives the DataFrame it writes
+SHEET_NAME = "Sheet1"
+
+def style_header(cells):
+    """Give header cells the style pandas 2 writes its header with (bold,
+    thin borders, centered at the top). pandas 3 writes the header plain,
+    so both paths style it: a file gets the same header whichever path
+    or pandas version wrote it
+
+    Args:
+    cells: openpyxl cells of the header row
+    """
+    styles = timed_import("openpyxl.styles")
+    side = styles.Side(style="thin")
+    font = styles.Font(bold=True)
+    border = styles.Border(left=side, right=side, top=side, bottom=side)
+    alignment = styles.Alignment(horizontal="center", vertical="top")
+    for cell in cells:
+        cell.font = font
+        cell.border = border
+        cell.alignment = alignment
+
+def write_xlsx(header, rows, output_path, metrics):
+    """Write rows to an excel file through a write-only workbook, laid out
+    as pandas writes a DataFrame (styled header, plain rows)
+
+    Args:
+    header(list): Column names for the header row
+    rows(list): Row sequences
+    output_path(str): Path to the excel file to create
+    metrics(Metrics): Counts the rows as they are written
+    """
+    openpyxl = timed_import("openpyxl")
+    cell_module = timed_import("openpyxl.cell")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    header_cells = [cell_module.WriteOnlyCell(ws, value=name) for name in header]
+    style_header(header_cells)
+    ws.append(header_cells)
+    for start, stop in metrics.batches(len(rows), len(header)):
+        for row in rows[start:stop]:
+            ws.append(row)
+    wb.save(output_path)
+    wb.close()
+
+def convert_csv_to_xlsx(csv_path, verbose=True, stats=None, fast_path=True,
+                        typed=False, save_schema=False, progress=False, metrics_jsonl=None,
+                        metrics=None):
     """
     Convert CSV file to Excel with the same filename
     
     Args:
         csv_path (str): Full path to the CSV file
+        verbose (bool): Print the conversion report
+        stats (dict): Optional dict that receives the number of rows written,
+            the stage times and the rows/cells per second
+        fast_path (bool): Read small files with the csv module instead of
+            pandas (falls back to pandas if the file needs it)
+        typed (bool): Read the CSV with compact inferred dtypes (downcast
+            integers, categoricals, dates) and report its memory footprint
+        save_schema (bool): Save the inferred dtypes next to the CSV and
+            reuse them on the next conversions (implies typed)
+        progress (bool | callable): Draw a progress bar on stderr, or call a
+            function with every metrics event (spans, progress, summary)
+        metrics_jsonl (str): Append the metrics events to this JSON lines file
+        metrics (Metrics): Use these metrics instead of building them from
+            progress and metrics_jsonl
     """
+    if metrics is None:
+        metrics = build_metrics(csv_path, progress, metrics_jsonl)
     try:
-        # Read CSV file
-        df = pd.read_csv(csv_path)
-
         # Get the filename without extension
         file_dir = os.path.dirname(csv_path)
         file_name = os.path.splitext(os.path.basename(csv_path))[0]
@@ -22,20 +84,71 @@ def convert_csv_to_xlsx(csv_path):
         # Create output path with xlsx extension
         output_path = os.path.join(file_dir, f"{file_name}.xlsx")
 
-        # Convert to excel
-        df.to_excel(output_path, index=False)
+        typed = typed or save_schema
+        schema = get_schema(csv_path, save=save_schema) if typed else None
+        memory = None
+
+        # Small files skip pandas entirely (typed reads need pandas dtypes)
+        small_csv = None
+        if fast_path and not typed:
+            with metrics.span("read"):
+                small_csv = read_small_csv(csv_path)
+
+        if small_csv is not None:
+            header, rows = small_csv
+            with metrics.span("write"):
+                write_xlsx(header, rows, output_path, metrics)
+            row_count = len(rows)
+        else:
+            # Read CSV file
+            with metrics.span("read"):
+                if schema is not None:
+                    df, applied = read_typed_csv(csv_path, schema)
+                    if applied:
+                        memory = memory_report(df, schema)
+                else:
+                    pd = timed_import("pandas")
+                    df = pd.read_csv(csv_path)
+            row_count = len(df)
+
+            # Convert to excel a batch of rows at a time, so the progress
+            # advances while the sheet is written
+            pd = timed_import("pandas")
+            with metrics.span("write"), pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+                for start, stop in metrics.batches(row_count, df.shape[1]):
+                    df.iloc[start:stop].to_excel(writer, sheet_name=SHEET_NAME, index=False,
+                                                 header=start == 0,
+                                                 startrow=start + 1 if start else 0)
+                style_header(writer.sheets[SHEET_NAME][1])
+
+        summary = metrics.finish()
+        if stats is not None:
+            stats.update(summary, rows=row_count)
+            if memory is not None:
+                stats.update(memory)
+
+        if not verbose:
+            return output_path
 
         print("\nFile successfully converted")
         print(f"Input file = {csv_path}")
-        print(f"Output file = {output_path}\n")
+        print(f"Output file = {output_path}")
+        print(f"Stages: {metrics.format_summary()}\n")
+        if memory is not None:
+            print(f"Memory: {format_bytes(memory['memory_before'])} untyped (estimated) -> "
+                  f"{format_bytes(memory['memory_after'])} typed\n")
         return output_path
     
     except Exception as e:
-        print(f"Erro: e")
+        metrics.emit("error", error=f"{type(e).__name__}: {e}")
+        print(f"Error: {e}")
         return None
     
 def select_csv_file():
     """Open file dialog to select a CSV file"""
+    filedialog = timed_import("tkinter.filedialog")
+    from tkinter import Tk
+
     root = Tk()
     root.withdraw() # Hide the main window
     root.attributes('-topmost', True) # Bring dialog to front
@@ -54,11 +167,45 @@ def select_csv_file():
 
     return file_path
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Convert CSV files to excel files")
+    parser.add_argument("path", nargs="?",
+                        help="CSV file, directory or glob pattern (opens a dialog if omitted)")
+    parser.add_argument("--typed", action="store_true",
+                        help="Read the CSV with compact inferred dtypes and report memory use")
+    parser.add_argument("--save-schema", action="store_true",
+                        help="Save the inferred dtypes next to the CSV for later runs (implies --typed)")
+    parser.add_argument("--progress", action="store_true",
+                        help="Show a progress bar with the rows written and rows/s")
+    parser.add_argument("--metrics-jsonl",
+                        help="Append stage timings, progress and throughput as JSON lines to this file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for batch conversion (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="Convert files in batch mode even if their output is up to date")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report the import time of pandas, openpyxl and tkinter")
+    return parser.parse_args()
+
 def main():
     """Main execution function"""
+    args = parse_args()
+
+    # Directory or glob pattern: convert every matching CSV in parallel
+    if args.path and is_batch_source(args.path):
+        results, skipped, elapsed = batch_convert(
+            args.path, convert_csv_to_xlsx, max_workers=args.workers, force=args.force,
+            typed=args.typed, save_schema=args.save_schema, metrics_jsonl=args.metrics_jsonl
+        )
+        print_batch_summary(results, skipped, elapsed)
+        if args.profile_startup:
+            print_import_profile()
+        return
+
     # Check if file path was provided in command line argument
-    if len(sys.argv) > 1:
-        csv_path = sys.argv[1]
+    if args.path:
+        csv_path = args.path
         # Get the filename without extension
         file_dir = os.path.dirname(csv_path)
         file_name = os.path.splitext(os.path.basename(csv_path))[0]
@@ -72,9 +219,13 @@ def main():
 
     if csv_path:
         print(f"\nConverting selected file: {csv_path}")
-        convert_csv_to_xlsx(csv_path)
+        convert_csv_to_xlsx(csv_path, typed=args.typed, save_schema=args.save_schema,
+                            progress=args.progress, metrics_jsonl=args.metrics_jsonl)
     else:
         print("No file selected. Exiting!")
 
+    if args.profile_startup:
+        print_import_profile()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import argparse
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen, Request
+from mod_urllib_request import CHUNK_SIZE, filename_for
+from mod_csv_file_converter import STREAM_CHUNK_SIZE, stream_csv_to_xlsx
+
+# Network chunks buffered between the download thread and the XLSX writer.
+# When the buffer is full the download waits, so memory stays bounded
+# (MAX_BUFFERED_CHUNKS * CHUNK_SIZE) even if the disk is slower than the network.
+MAX_BUFFERED_CHUNKS = 16
+
+# Seconds between checks for a closed stream while waiting on a full buffer
+PUT_TIMEOUT = 0.5
+
+
+class ResponseStream(io.RawIOBase):
+    """Read-only file object fed by a background thread that downloads a response
+
+    The thread reads the response in chunks into a bounded queue, so the
+    network transfer overlaps with whatever consumes the stream.
+    """
+
+    def __init__(self, response, max_buffered_chunks=MAX_BUFFERED_CHUNKS, chunk_size=CHUNK_SIZE):
+        super().__init__()
+        self.bytes_read = 0
+        self._response = response
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=max_buffered_chunks)
+        self._pending = b''
+        self._done = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._download, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # Block while the buffer is full, unless the reader went away
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _download(self):
+        try:
+            while True:
+                chunk = self._response.read(self._chunk_size)
+                if not chunk:
+                    break
+                if not self._put(chunk):
+                    return
+            self._put(None)
+        except Exception as error:
+            # Re-raised in the reading thread
+            self._put(error)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._done:
+            item = self._queue.get()
+            if item is None:
+                self._done = True
+            elif isinstance(item, Exception):
+                self._done = True
+                raise item
+            else:
+                self._pending = item
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self.bytes_read += size
+        return size
+
+    def close(self):
+        self._stop.set()
+        # A download waiting on the full buffer sees the stop within
+        # PUT_TIMEOUT; one blocked on the network ends when the response
+        # is closed, the thread is a daemon either way
+        if self._thread is not threading.current_thread():
+            self._thread.join(PUT_TIMEOUT * 2)
+        super().close()
+
+
+def convert_url_to_xlsx(url, output_path=None, headers=None, chunksize=STREAM_CHUNK_SIZE,
+                        max_buffered_chunks=MAX_BUFFERED_CHUNKS, timeout=10):
+    """Download a CSV and write it as a formatted excel file without an intermediate file
+
+    The response body is parsed while it downloads and rows go straight to
+    the streaming XLSX writer; only a bounded number of network chunks and
+    one CSV chunk are held in memory.
+
+    Args:
+    url(str): URL of the CSV file
+    output_path(str): Excel file to create (default: name of the URL file with .xlsx)
+    headers(dict): Request headers
+    chunksize(int): CSV rows parsed per chunk
+    max_buffered_chunks(int): Network chunks buffered ahead of the writer
+
+    Returns:
+    dict: url, output, rows, bytes and elapsed seconds
+    """
+    if output_path is None:
+        output_path = os.path.splitext(filename_for(url))[0] + '.xlsx'
+
+    start = time.perf_counter()
+    with urlopen(Request(url, headers=headers or {}), timeout=timeout) as response:
+        stream = ResponseStream(response, max_buffered_chunks)
+        try:
+            with io.BufferedReader(stream, buffer_size=CHUNK_SIZE) as body:
+                rows = stream_csv_to_xlsx(body, output_path, chunksize)
+        finally:
+            stream.close()
+
+    return {
+        'url': url,
+        'output': output_path,
+        'rows': rows,
+        'bytes': stream.bytes_read,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Download a CSV and convert it to a formatted excel file")
+    parser.add_argument("url", help="URL of the CSV file")
+    parser.add_argument("-o", "--output", help="Excel file to create")
+    args = parser.parse_args()
+
+    try:
+        result = convert_url_to_xlsx(args.url, args.output)
+    except HTTPError as error:
+        print(f"Error: {error.status} {error.reason} ({args.url})")
+        sys.exit(1)
+    except URLError as error:
+        # DNS failure, refused connection...
+        print(f"Error: {error.reason} ({args.url})")
+        sys.exit(1)
+    except (OSError, ValueError) as error:
+        # Connection lost during the download, output not writable or not a CSV
+        print(f"Error: {error}")
+        sys.exit(1)
+    print(f"\nFile successfully downloaded and converted")
+    print(f"URL = {result['url']}")
+    print(f"Output file = {result['output']}")
+    print(f"Rows: {result['rows']}  Bytes: {result['bytes']}  Time: {result['elapsed']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
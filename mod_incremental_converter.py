@@ -0,0 +1,149 @@
+import csv
+import hashlib
+import json
+import os
+from mod_csv_chunks import ROWS_PER_CHUNK, scan_chunks, read_chunk
+from mod_csv_file_converter import SHEET_DATA_ROWS, iter_csv_rows, stream_csv_to_xlsx
+from mod_sheet_xml import body_style_id, column_letters, merge_sheet_rows, row_xml
+
+MANIFEST_VERSION = 1
+
+def manifest_path_for(output_path):
+    """Return the sidecar manifest path of an excel file (<file>.xlsx.manifest.json)"""
+    return output_path + ".manifest.json"
+
+def load_manifest(output_path):
+    """Load the manifest of a previous conversion, or None if missing or unusable"""
+    try:
+        with open(manifest_path_for(output_path), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(output_path, header, chunks, rows_per_chunk, rows_per_sheet, auto_width):
+    """Write the manifest: header hash, layout options plus offsets, row ranges and hash of every chunk"""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "rows_per_chunk": rows_per_chunk,
+        "rows_per_sheet": rows_per_sheet,
+        "auto_width": auto_width,
+        "header_hash": hashlib.sha1(header).hexdigest(),
+        "xlsx_mtime": os.path.getmtime(output_path),
+        "chunks": chunks,
+    }
+    with open(manifest_path_for(output_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+def plan_update(manifest, header, chunks, rows_per_chunk, rows_per_sheet, auto_width, output_path):
+    """Compare a new chunk scan with the manifest of the previous conversion
+
+    Returns:
+    list: Chunks to rewrite (changed or appended), or None if the workbook
+    must be rebuilt (no usable manifest, header, row layout or sheet
+    options changed)
+    """
+    if (manifest is None
+            or not os.path.exists(output_path)
+            or manifest["rows_per_chunk"] != rows_per_chunk
+            or manifest.get("rows_per_sheet") != rows_per_sheet
+            or manifest.get("auto_width") != auto_width
+            or manifest["header_hash"] != hashlib.sha1(header).hexdigest()
+            # The workbook was changed after the last conversion
+            or os.path.getmtime(output_path) != manifest["xlsx_mtime"]):
+        return None
+
+    old_chunks = manifest["chunks"]
+    if len(chunks) < len(old_chunks):
+        return None
+
+    changed = []
+    for index, chunk in enumerate(chunks):
+        if index >= len(old_chunks):
+            # Appended chunk
+            changed.append(chunk)
+            continue
+        old_chunk = old_chunks[index]
+        if chunk["hash"] == old_chunk["hash"]:
+            continue
+        # Only the last chunk may grow; any other row count change shifts
+        # every following row, so the workbook is rebuilt
+        is_last = index == len(old_chunks) - 1
+        if chunk["rows"] != old_chunk["rows"] and not (is_last and chunk["rows"] > old_chunk["rows"]):
+            return None
+        changed.append(chunk)
+    return changed
+
+def iter_chunk_rows(csv_path, header, chunks, style_id):
+    """Parse changed chunks and yield (row number, row XML) for each of their rows"""
+    for chunk in chunks:
+        df = read_chunk(csv_path, header, chunk["start"], chunk["end"])
+        letters = column_letters(df.shape[1])
+        # Row 1 is the header, data starts on row 2
+        for row_idx, values in enumerate(iter_csv_rows([df]), chunk["first_row"] + 2):
+            yield row_idx, row_xml(row_idx, values, style_id, letters)
+
+def write_chunks(csv_path, output_path, header, chunks):
+    """Write the rows of some chunks into an existing workbook, already formatted
+
+    The worksheet XML is copied row by row and only the rows of the changed
+    chunks are serialized again, so neither the workbook nor the unchanged
+    rows are ever loaded into openpyxl.
+
+    Returns:
+    bool: False if the workbook layout is not the one written by the
+    streaming converter (the caller then rebuilds it)
+    """
+    style_id = body_style_id(output_path)
+    if style_id is None:
+        return False
+    try:
+        merge_sheet_rows(output_path, iter_chunk_rows(csv_path, header, chunks, style_id))
+    except TypeError:
+        # A value type the raw serializer does not handle (for example dates)
+        return False
+    return True
+
+def incremental_csv_to_xlsx(csv_path, output_path, rows_per_chunk=ROWS_PER_CHUNK,
+                            rows_per_sheet=SHEET_DATA_ROWS, auto_width=True):
+    """Convert a CSV to a formatted excel file, rewriting only the chunks that changed
+    A sidecar manifest records a hash, byte offsets and row range for every
+    chunk of rows. On the next run, unchanged chunks are skipped and only
+    edited or appended rows are parsed and serialized (with the body style);
+    the rest of the worksheet is copied as raw XML. If the header, the row
+    layout or the sheet options changed, the workbook is rebuilt with the
+    streaming writer
+
+    Args:
+    csv_path(str): Path to the CSV file
+    output_path(str): Path to the excel file
+    rows_per_chunk(int): Data rows per chunk
+    rows_per_sheet(int): Data rows per sheet when the workbook is rebuilt
+    auto_width(bool): Fit column widths to the content when the workbook is
+        rebuilt (patched rows keep the widths of the last rebuild)
+
+    Returns:
+    dict: mode ("full", "incremental" or "unchanged"), rows (total data rows),
+    rows_written and columns
+    """
+    header, chunks = scan_chunks(csv_path, rows_per_chunk)
+    total_rows = sum(chunk["rows"] for chunk in chunks)
+    columns = len(next(csv.reader([header.decode("utf-8", "replace")]), []))
+
+    changed = plan_update(load_manifest(output_path), header, chunks, rows_per_chunk,
+                          rows_per_sheet, auto_width, output_path)
+    if changed and total_rows > rows_per_sheet:
+        # Rows are split over several sheets; only single-sheet workbooks are patched
+        changed = None
+    if changed == []:
+        mode, rows_written = "unchanged", 0
+    elif changed and write_chunks(csv_path, output_path, header, changed):
+        mode, rows_written = "incremental", sum(chunk["rows"] for chunk in changed)
+    else:
+        stream_csv_to_xlsx(csv_path, output_path, rows_per_chunk, rows_per_sheet, auto_width)
+        mode, rows_written = "full", total_rows
+
+    save_manifest(output_path, header, chunks, rows_per_chunk, rows_per_sheet, auto_width)
+    return {"mode": mode, "rows": total_rows, "rows_written": rows_written, "columns": columns}
@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Rows between two progress events of a long write loop
+PROGRESS_EVERY = 10000
+
+class Metrics:
+    """Timing spans and row/cell counters of one conversion
+
+    Spans are exclusive: when spans nest (for example reading a chunk of
+    the CSV inside the write loop that consumes it), the time of the inner
+    span is not counted in the outer one, so the stage times add up to the
+    total. Every span, progress update and the final summary is sent as an
+    event dict to the listeners (JsonLinesWriter, ProgressBar or any
+    callable).
+    """
+
+    def __init__(self, source=None, listeners=None):
+        self.source = source
+        self.listeners = list(listeners or [])
+        self.spans = {}
+        self.rows = 0
+        self.cells = 0
+        self.total_rows = None
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def emit(self, event, **fields):
+        """Send an event to every listener"""
+        if not self.listeners:
+            return
+        record = {"event": event, "source": self.source,
+                  "elapsed": round(time.perf_counter() - self._start, 6), **fields}
+        for listener in self.listeners:
+            listener(record)
+
+    @contextmanager
+    def span(self, name):
+        """Time a stage (read, write, format, save...)"""
+        start = time.perf_counter()
+        # Time spent in nested spans, subtracted from this one
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed - nested
+            self.emit("span", name=name, seconds=round(elapsed - nested, 6))
+
+    def timed(self, iterable, name):
+        """Yield the items of an iterable, timing each step under a span
+        Used for lazy readers (pandas chunk readers) whose work happens
+        while they are iterated
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.span(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def batches(self, total_rows, columns, batch_rows=PROGRESS_EVERY):
+        """Yield (start, stop) row ranges of a write loop, counting the rows of each
+        range once it is written so the progress advances with the loop
+        (one empty range for zero rows, so the header is still written)
+
+        Args:
+        total_rows(int): Rows to write
+        columns(int): Columns of every row
+        batch_rows(int): Rows per range
+        """
+        self.total_rows = total_rows
+        for start in range(0, max(total_rows, 1), batch_rows):
+            stop = min(start + batch_rows, total_rows)
+            yield start, stop
+            self.add_rows(stop - start, columns)
+
+    def add_rows(self, rows, columns):
+        """Count rows written and report the progress"""
+        self.rows += rows
+        self.cells += rows * columns
+        self.emit("progress", rows=self.rows, total_rows=self.total_rows,
+                  rows_per_sec=round(self.rate(self.rows), 1))
+
+    def rate(self, count):
+        """Return count per second since the conversion started"""
+        elapsed = time.perf_counter() - self._start
+        return count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """Return stages, total seconds, rows, cells, rows_per_sec and cells_per_sec"""
+        total = time.perf_counter() - self._start
+        return {
+            "stages": {name: round(seconds, 6) for name, seconds in self.spans.items()},
+            "total": round(total, 6),
+            "rows": self.rows,
+            "cells": self.cells,
+            "rows_per_sec": round(self.rows / total, 1) if total > 0 else 0.0,
+            "cells_per_sec": round(self.cells / total, 1) if total > 0 else 0.0,
+        }
+
+    def finish(self):
+        """Emit the summary event and return the summary"""
+        summary = self.summary()
+        self.emit("summary", **summary)
+        return summary
+
+    def format_summary(self):
+        """Return a one-line report of the stage times and throughput"""
+        summary = self.summary()
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in summary["stages"].items())
+        return (f"{stages} | {summary['rows_per_sec']:,.0f} rows/s, "
+                f"{summary['cells_per_sec']:,.0f} cells/s")
+
+class JsonLinesWriter:
+    """Listener that appends every event as one JSON line to a file
+    Each line is written with a single call on a file opened in append
+    mode, so several worker processes can share the same file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+class ProgressBar:
+    """Listener that draws a one-line progress bar on stderr from progress events"""
+
+    def __init__(self, width=30, stream=None):
+        self.width = width
+        self.stream = stream or sys.stderr
+
+    def __call__(self, record):
+        if record["event"] == "progress":
+            rows = record["rows"]
+            total = record.get("total_rows")
+            line = f"{rows:>12,} rows  {record['rows_per_sec']:>10,.0f} rows/s"
+            if total:
+                done = min(rows / total, 1.0)
+                filled = int(done * self.width)
+                line = f"[{'#' * filled}{'-' * (self.width - filled)}] {done:>4.0%} " + line
+            self.stream.write("\r" + line)
+            self.stream.flush()
+        elif record["event"] == "summary":
+            self.stream.write("\n")
+            self.stream.flush()
+
+def build_metrics(source, progress=False, metrics_jsonl=None):
+    """Create the Metrics of a conversion with the requested listeners
+
+    Args:
+    source(str): Input file name, included in every event
+    progress(bool | callable): Draw a progress bar on stderr (True) or call a function with every event
+    metrics_jsonl(str): Append every event to this JSON lines file
+    """
+    listeners = []
+    if progress is True:
+        listeners.append(ProgressBar())
+    elif callable(progress):
+        listeners.append(progress)
+    if metrics_jsonl:
+        listeners.append(JsonLinesWriter(os.path.abspath(metrics_jsonl)))
+    return Metrics(source, listeners)
@@ -0,0 +1,410 @@
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from mod_startup import timed_import
+from mod_csv_chunks import scan_chunks, read_chunk
+from mod_csv_ingest import SAMPLE_ROWS
+from mod_column_widths import ColumnWidthEstimator
+from mod_csv_file_converter import (SHEET_DATA_ROWS, STREAM_CHUNK_SIZE, HEADER_STYLE, BODY_STYLE,
+                                    Workbook, register_styles, set_column_widths, styled_row,
+                                    iter_csv_rows, stream_csv_to_xlsx)
+from mod_metrics import Metrics
+from mod_sheet_xml import SHEET_PATH, body_style_id, column_letters, iter_sheet_parts, row_xml
+
+# Data rows serialized by one worker task; several tasks per worker keep
+# the workers busy until the end when ranges take different times
+RANGE_ROWS = 20000
+
+# Rows serialized and compressed at a time inside a task
+BLOCK_ROWS = 1000
+
+# Zip record signatures and the largest size or offset of a plain (not
+# zip64) header field
+LOCAL_HEADER_SIGNATURE = 0x04034B50
+CENTRAL_HEADER_SIGNATURE = 0x02014B50
+ZIP64_END_SIGNATURE = 0x06064B50
+ZIP64_LOCATOR_SIGNATURE = 0x07064B50
+END_SIGNATURE = 0x06054B50
+ZIP64_LIMIT = 0xFFFFFFFF
+
+# General purpose flag: member names are UTF-8
+UTF8_FLAG = 0x800
+
+# Generator polynomial of the CRC-32 used by zip files (reversed)
+CRC32_POLY = 0xEDB88320
+
+def gf2_times(matrix, vector):
+    """Multiply a 32x32 GF(2) matrix (list of 32 column ints) by a 32-bit vector"""
+    total = 0
+    row = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[row]
+        vector >>= 1
+        row += 1
+    return total
+
+def gf2_square(matrix):
+    """Return the square of a 32x32 GF(2) matrix"""
+    return [gf2_times(matrix, column) for column in matrix]
+
+def crc32_combine(crc1, crc2, len2):
+    """Return the CRC-32 of two concatenated byte strings from their CRCs
+    (port of zlib's crc32_combine, missing from the zlib module)
+
+    Args:
+    crc1(int): CRC-32 of the first string
+    crc2(int): CRC-32 of the second string
+    len2(int): Length of the second string in bytes
+    """
+    if len2 == 0:
+        return crc1
+    # Operator that appends one zero bit to the message
+    odd = [CRC32_POLY] + [1 << bit for bit in range(31)]
+    even = gf2_square(odd)  # two zero bits
+    odd = gf2_square(even)  # four zero bits
+    # Apply len2 zero bytes to crc1, one bit of len2 at a time
+    while True:
+        even = gf2_square(odd)
+        if len2 & 1:
+            crc1 = gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = gf2_square(even)
+        if len2 & 1:
+            crc1 = gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+def compress_piece(data, path, final=False):
+    """Compress bytes to a raw deflate piece of a worksheet
+
+    Pieces end on a byte boundary without a final block (sync flush), so
+    they can be concatenated into one deflate stream; only the last piece
+    (final=True) closes the stream
+
+    Returns:
+    dict: path, crc and size (uncompressed bytes) of the piece
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    with open(path, "wb") as out:
+        out.write(compressor.compress(data))
+        out.write(compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH))
+    return {"path": path, "crc": zlib.crc32(data), "size": len(data)}
+
+def range_dtypes(sample):
+    """Return the pd.read_csv dtypes that give every range the column types of a sample
+    Each range would otherwise infer its own types, so a column of codes
+    could be numbers in one range and text in another. Integer and boolean
+    columns get the nullable types, which also hold the missing values of
+    later rows
+
+    Args:
+    sample: DataFrame of the first rows of the CSV
+    """
+    pd = timed_import("pandas")
+    dtypes = {}
+    for name, dtype in sample.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            dtypes[name] = "boolean"
+        elif pd.api.types.is_integer_dtype(dtype):
+            dtypes[name] = "Int64"
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[name] = "float64"
+        else:
+            dtypes[name] = str
+    return dtypes
+
+def write_fragment(csv_path, header, chunk, style_id, path, measure_widths=True, dtypes=None):
+    """Serialize the rows of one byte range of a CSV to a compressed <sheetData> fragment
+    (executed in a worker process)
+
+    Args:
+    csv_path(str): Path to the CSV file
+    header(bytes): Header record of the CSV (from scan_chunks)
+    chunk(dict): Range from scan_chunks (start, end, first_row)
+    style_id(int): Body style id of the workbook template
+    path(str): File that receives the raw deflate fragment
+    measure_widths(bool): Measure the display width of the values
+    dtypes(dict): Column types shared by all the ranges (from range_dtypes)
+
+    Returns:
+    dict: path, crc, size, rows and estimator (ColumnWidthEstimator or None)
+
+    Raises:
+    ValueError, TypeError: A value of the range does not fit its column
+        type (TypeError for a decimal in an integer column)
+    """
+    df = read_chunk(csv_path, header, chunk["start"], chunk["end"], dtype=dtypes)
+    letters = column_letters(df.shape[1])
+    estimator = ColumnWidthEstimator() if measure_widths else None
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = size = 0
+
+    rows = iter_csv_rows([df])
+    # Row 1 is the header, data starts on row 2
+    row_idx = chunk["first_row"] + 2
+    with open(path, "wb") as out:
+        while True:
+            block = list(islice(rows, BLOCK_ROWS))
+            if not block:
+                break
+            if estimator is not None:
+                for values in block:
+                    estimator.update(values)
+            data = "".join(
+                row_xml(idx, values, style_id, letters) for idx, values in enumerate(block, row_idx)
+            ).encode("utf-8")
+            row_idx += len(block)
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            out.write(compressor.compress(data))
+        out.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+    return {"path": path, "crc": crc, "size": size, "rows": len(df), "estimator": estimator}
+
+def write_template(path, header_row, widths=None):
+    """Write a formatted one-sheet workbook with the header and one empty body row
+    Its styles, header row and worksheet XML around the rows are reused
+    by the stitched workbook
+
+    Args:
+    path(str): Path to the excel file to create
+    header_row(list): Header values (already upper case)
+    widths(list): Column widths (default: the fixed widths)
+    """
+    wb = Workbook(write_only=True)
+    register_styles(wb)
+    ws = wb.create_sheet()
+    set_column_widths(ws, len(header_row), widths)
+    ws.append(styled_row(ws, header_row, HEADER_STYLE))
+    ws.append(styled_row(ws, [None] * len(header_row), BODY_STYLE))
+    wb.save(path)
+    wb.close()
+
+def template_parts(path):
+    """Return the worksheet XML of a template split into (head with the header row, tail)"""
+    with zipfile.ZipFile(path) as archive, archive.open(SHEET_PATH) as stream:
+        parts = list(iter_sheet_parts(stream))
+    # head, header row, empty body row, tail
+    head = parts[0][2] + parts[1][2]
+    return head, parts[-1][2]
+
+def dos_date_time(date_time):
+    """Return the (time, date) fields of a zip header for a (year, month, day, hour, min, sec) tuple"""
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+class DeflatedZipWriter:
+    """Minimal zip writer for members compressed beforehand as raw deflate
+
+    zipfile can only add data it compresses itself, so the worksheet
+    fragments would be inflated and deflated again; this writer owns the
+    file instead and writes the local headers, the compressed bytes and the
+    central directory itself, with zip64 fields when a member or the
+    archive passes 4 GB.
+    """
+
+    def __init__(self, path):
+        self.fp = open(path, "wb")
+        self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.fp.close()
+
+    def add_pieces(self, name, pieces, date_time=None):
+        """Add a member from raw deflate pieces compressed elsewhere
+        The CRC of the member is combined from the CRCs of the pieces
+
+        Args:
+        name(str): Member name
+        pieces(list): Dicts with path, crc and size (uncompressed bytes), in order
+        date_time(tuple): Modification time (default: now)
+        """
+        crc = 0
+        for piece in pieces:
+            crc = crc32_combine(crc, piece["crc"], piece["size"])
+        entry = self.write_header(name, date_time, crc,
+                                  sum(os.path.getsize(piece["path"]) for piece in pieces),
+                                  sum(piece["size"] for piece in pieces))
+        for piece in pieces:
+            with open(piece["path"], "rb") as f:
+                shutil.copyfileobj(f, self.fp)
+        self.entries.append(entry)
+
+    def add_bytes(self, name, data, date_time=None):
+        """Add a member from uncompressed bytes, deflating them"""
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+        entry = self.write_header(name, date_time, zlib.crc32(data), len(compressed), len(data))
+        self.fp.write(compressed)
+        self.entries.append(entry)
+
+    def write_header(self, name, date_time, crc, compress_size, file_size):
+        """Write the local header of a member and return its central directory entry"""
+        entry = {
+            "name": name.encode("utf-8"),
+            "date_time": dos_date_time(date_time or time.localtime(time.time())[:6]),
+            "crc": crc,
+            "compress_size": compress_size,
+            "file_size": file_size,
+            "offset": self.fp.tell(),
+        }
+        zip64 = max(compress_size, file_size) >= ZIP64_LIMIT
+        if zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, file_size, compress_size)
+            sizes = (ZIP64_LIMIT, ZIP64_LIMIT)
+        else:
+            extra = b""
+            sizes = (compress_size, file_size)
+        self.fp.write(struct.pack(
+            "<IHHHHHIIIHH", LOCAL_HEADER_SIGNATURE, 45 if zip64 else 20, UTF8_FLAG,
+            zipfile.ZIP_DEFLATED, *entry["date_time"], crc, *sizes,
+            len(entry["name"]), len(extra)
+        ))
+        self.fp.write(entry["name"])
+        self.fp.write(extra)
+        return entry
+
+    def close(self):
+        """Write the central directory and close the file"""
+        directory_offset = self.fp.tell()
+        for entry in self.entries:
+            # Values that do not fit 32 bits move to the zip64 extra field, in this order
+            large = [entry[field] for field in ("file_size", "compress_size", "offset")
+                     if entry[field] >= ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(large)}Q", 0x0001, 8 * len(large), *large) if large else b""
+            self.fp.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", CENTRAL_HEADER_SIGNATURE, (3 << 8) | 45,
+                45 if large else 20, UTF8_FLAG, zipfile.ZIP_DEFLATED, *entry["date_time"],
+                entry["crc"], min(entry["compress_size"], ZIP64_LIMIT),
+                min(entry["file_size"], ZIP64_LIMIT), len(entry["name"]), len(extra), 0, 0, 0,
+                0o600 << 16, min(entry["offset"], ZIP64_LIMIT)
+            ))
+            self.fp.write(entry["name"])
+            self.fp.write(extra)
+        directory_end = self.fp.tell()
+        directory_size = directory_end - directory_offset
+        count = len(self.entries)
+        if directory_offset >= ZIP64_LIMIT or count >= 0xFFFF:
+            self.fp.write(struct.pack("<IQHHIIQQQQ", ZIP64_END_SIGNATURE, 44, 45, 45, 0, 0,
+                                      count, count, directory_size, directory_offset))
+            self.fp.write(struct.pack("<IIQI", ZIP64_LOCATOR_SIGNATURE, 0, directory_end, 1))
+        self.fp.write(struct.pack("<IHHHHIIH", END_SIGNATURE, 0, 0, min(count, 0xFFFF),
+                                  min(count, 0xFFFF), min(directory_size, ZIP64_LIMIT),
+                                  min(directory_offset, ZIP64_LIMIT), 0))
+        self.fp.close()
+
+def stitch_workbook(template_path, output_path, pieces):
+    """Write the workbook: every member of the template, with the worksheet made of the pieces"""
+    with zipfile.ZipFile(template_path) as source, DeflatedZipWriter(output_path) as target:
+        for info in source.infolist():
+            if info.filename == SHEET_PATH:
+                target.add_pieces(SHEET_PATH, pieces)
+            else:
+                target.add_bytes(info.filename, source.read(info), info.date_time)
+
+def parallel_csv_to_xlsx(csv_path, output_path, max_workers=None, rows_per_range=RANGE_ROWS,
+                         rows_per_sheet=SHEET_DATA_ROWS, auto_width=True, metrics=None):
+    """Convert a CSV to a formatted excel file, serializing the worksheet in worker processes
+
+    The CSV is split by byte offset into ranges of rows. Each worker parses
+    a range and writes its rows as <sheetData> XML with the body style id
+    of the workbook baked in, compressed as a raw deflate fragment. The
+    worksheet is then stitched from the header of a formatted template
+    workbook, the fragments in row order and the end of the template, and
+    zipped with the other members of the template without compressing the
+    rows again. Column widths are fitted to all the rows, as the in-memory
+    conversion does.
+
+    Column types are inferred once from the first rows and given to every
+    range. Rows beyond one sheet, or later rows that do not fit those
+    types, are written by the streaming writer instead.
+
+    Args:
+    csv_path(str): Path to the CSV file
+    output_path(str): Path to the excel file to create
+    max_workers(int): Worker processes (default: number of CPUs)
+    rows_per_range(int): Data rows serialized by one worker task
+    rows_per_sheet(int): Data rows per sheet
+    auto_width(bool): Fit column widths to the content instead of the fixed widths
+    metrics(Metrics): Receives the scan, format, write (all ranges) and save spans
+
+    Returns:
+    int: Number of data rows written
+    """
+    metrics = metrics or Metrics()
+    pd = timed_import("pandas")
+    with metrics.span("scan"):
+        # Types are inferred once, from the first rows, for all the ranges
+        sample = pd.read_csv(csv_path, nrows=SAMPLE_ROWS)
+        columns = list(sample.columns)
+        dtypes = range_dtypes(sample)
+        header, chunks = scan_chunks(csv_path, rows_per_range)
+    total_rows = sum(chunk["rows"] for chunk in chunks)
+    if total_rows > rows_per_sheet:
+        # Several sheets: the fragments only fill one
+        return stream_csv_to_xlsx(csv_path, output_path, STREAM_CHUNK_SIZE, rows_per_sheet,
+                                  auto_width, metrics)
+    metrics.total_rows = total_rows
+    header_row = [str(value).upper() if value else value for value in columns]
+
+    tmp_dir = tempfile.mkdtemp(prefix=".parts_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        template_path = os.path.join(tmp_dir, "template.xlsx")
+        with metrics.span("format"):
+            write_template(template_path, header_row)
+            style_id = body_style_id(template_path)
+
+        fragments = []
+        with metrics.span("write"), ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(write_fragment, csv_path, header, chunk, style_id,
+                                os.path.join(tmp_dir, f"rows{number}.deflate"), auto_width, dtypes)
+                for number, chunk in enumerate(chunks)
+            ]
+            try:
+                for future in futures:
+                    fragments.append(future.result())
+                    metrics.add_rows(fragments[-1]["rows"], len(columns))
+            except (ValueError, TypeError):
+                # Later rows do not fit the types of the first ones (text in
+                # a numeric column, a decimal in an integer column...): the
+                # fragments are discarded
+                for future in futures:
+                    future.cancel()
+                fragments = None
+        if fragments is None:
+            metrics.rows = metrics.cells = 0
+            return stream_csv_to_xlsx(csv_path, output_path, STREAM_CHUNK_SIZE, rows_per_sheet,
+                                      auto_width, metrics)
+
+        with metrics.span("save"):
+            if auto_width:
+                estimator = ColumnWidthEstimator()
+                estimator.update(header_row)
+                for fragment in fragments:
+                    estimator.merge(fragment["estimator"])
+                write_template(template_path, header_row, estimator.widths(len(columns)))
+            head, tail = template_parts(template_path)
+            pieces = [compress_piece(head, os.path.join(tmp_dir, "head.deflate"))]
+            pieces.extend(fragments)
+            pieces.append(compress_piece(tail, os.path.join(tmp_dir, "tail.deflate"), final=True))
+            stitch_workbook(template_path, output_path, pieces)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return total_rows
@@ -0,0 +1,192 @@
+import os
+import re
+import zipfile
+from numbers import Number
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE, ERROR_CODES
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.exceptions import IllegalCharacterError
+
+# Worksheet written by the converters (single-sheet workbooks)
+SHEET_PATH = "xl/worksheets/sheet1.xml"
+
+# First sheet of a partitioned workbook, listing the row range of every part
+INDEX_SHEET = "Index"
+
+# Bytes read from the worksheet XML at a time while rewriting it
+BLOCK_SIZE = 1024 * 1024
+
+# Excel limit for text in a cell
+MAX_TEXT_LENGTH = 32767
+
+# Characters escaped in cell text (same output as openpyxl/lxml)
+XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+
+ROW_NUMBER_RE = re.compile(rb'<row r="(\d+)"')
+STYLE_ID_RE = re.compile(rb'<c [^>]*\bs="(\d+)"')
+
+def column_letters(count):
+    """Return the column letters A, B, C... for a number of columns"""
+    return [get_column_letter(col) for col in range(1, count + 1)]
+
+def cell_xml(ref, value, style_id):
+    """Serialize one styled cell the way openpyxl's write-only worksheet does
+    Supports None, bool, numbers and text; other types raise TypeError so
+    callers can fall back to openpyxl
+
+    Args:
+    ref(str): Cell reference (for example "B7")
+    value: Cell value
+    style_id(int): Index of the cell style (cellXfs) in styles.xml
+    """
+    if value is None:
+        return f'<c r="{ref}" s="{style_id}" t="n"></c>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}" s="{style_id}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, Number):
+        if value != value or value in (float("inf"), float("-inf")):
+            text = ""
+        else:
+            text = "%.16g" % value
+        return f'<c r="{ref}" s="{style_id}" t="n"><v>{text}</v></c>'
+    if not isinstance(value, str):
+        raise TypeError(f"Cannot serialize {type(value).__name__} values")
+
+    value = value[:MAX_TEXT_LENGTH]
+    if ILLEGAL_CHARACTERS_RE.search(value):
+        raise IllegalCharacterError(f"{value} cannot be used in worksheets.")
+    if value == "":
+        return f'<c r="{ref}" s="{style_id}" t="inlineStr"></c>'
+    text = value.translate(XML_ESCAPES)
+    if len(value) > 1 and value.startswith("="):
+        return f'<c r="{ref}" s="{style_id}"><f>{text[1:]}</f><v></v></c>'
+    if value in ERROR_CODES:
+        return f'<c r="{ref}" s="{style_id}" t="e"><v>{text}</v></c>'
+    space = ' xml:space="preserve"' if value != value.strip() else ""
+    return f'<c r="{ref}" s="{style_id}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+def row_xml(row_idx, values, style_id, letters):
+    """Serialize one row of styled cells
+
+    Args:
+    row_idx(int): 1-based row number
+    values: Cell values
+    style_id(int): Index of the cell style in styles.xml
+    letters(list): Column letters (from column_letters)
+    """
+    cells = "".join(
+        cell_xml(f"{letter}{row_idx}", value, style_id)
+        for letter, value in zip(letters, values)
+    )
+    return f'<row r="{row_idx}">{cells}</row>'
+
+def iter_sheet_parts(stream, block_size=BLOCK_SIZE):
+    """Split worksheet XML into its head, its rows and its tail without parsing it
+
+    Yields:
+    tuple: ("head", None, bytes), then ("row", row number, bytes) for each
+    row, then ("tail", None, bytes) with everything from </sheetData> on
+    """
+    buffer = b""
+    pos = 0
+    eof = False
+
+    def find(token, start):
+        # Search the buffer, reading more blocks until the token shows up
+        nonlocal buffer, pos, eof
+        while True:
+            index = buffer.find(token, start)
+            if index >= 0 or eof:
+                return index
+            # Drop what was already consumed before growing the buffer
+            start -= pos
+            buffer = buffer[pos:]
+            pos = 0
+            block = stream.read(block_size)
+            if not block:
+                eof = True
+            buffer += block
+
+    start = find(b"<sheetData", 0)
+    end = find(b">", start) + 1
+    yield "head", None, buffer[:end]
+    pos = end
+
+    while True:
+        index = find(b"<", pos)
+        if index < 0:
+            break
+        pos = index
+        if buffer.startswith(b"<row", pos):
+            tag_end = find(b">", pos)
+            if buffer[tag_end - 1:tag_end] == b"/":
+                end = tag_end + 1
+            else:
+                end = find(b"</row>", pos) + len(b"</row>")
+            row = buffer[pos:end]
+            yield "row", int(ROW_NUMBER_RE.match(row).group(1)), row
+            pos = end
+        else:
+            break
+
+    tail = [buffer[pos:]]
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        tail.append(block)
+    yield "tail", None, b"".join(tail)
+
+def body_style_id(xlsx_path):
+    """Return the style id of the first data cell (row 2) of a converted workbook, or None"""
+    with zipfile.ZipFile(xlsx_path) as archive, archive.open(SHEET_PATH) as stream:
+        for kind, row_idx, data in iter_sheet_parts(stream):
+            if kind == "row" and row_idx >= 2:
+                match = STYLE_ID_RE.search(data)
+                return int(match.group(1)) if match else None
+    return None
+
+def merge_sheet_rows(xlsx_path, new_rows):
+    """Rewrite the worksheet of a workbook, replacing or adding rows
+
+    Existing rows are copied byte for byte unless new_rows has a row with
+    the same number; new rows after the last existing one are appended.
+    Other members of the workbook are copied unchanged.
+
+    Args:
+    xlsx_path(str): Workbook to update in place
+    new_rows: Iterable of (row number, row XML) sorted by row number
+    """
+    new_rows = iter(new_rows)
+    pending = next(new_rows, None)
+    tmp_path = xlsx_path + ".tmp"
+
+    try:
+        with zipfile.ZipFile(xlsx_path) as source, \
+                zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                if info.filename != SHEET_PATH:
+                    target.writestr(info, source.read(info))
+                    continue
+
+                with source.open(info) as stream, \
+                        target.open(SHEET_PATH, "w", force_zip64=True) as out:
+                    for kind, row_idx, data in iter_sheet_parts(stream):
+                        if kind == "row":
+                            while pending is not None and pending[0] < row_idx:
+                                out.write(pending[1].encode("utf-8"))
+                                pending = next(new_rows, None)
+                            if pending is not None and pending[0] == row_idx:
+                                out.write(pending[1].encode("utf-8"))
+                                pending = next(new_rows, None)
+                                continue
+                        elif kind == "tail":
+                            while pending is not None:
+                                out.write(pending[1].encode("utf-8"))
+                                pending = next(new_rows, None)
+                        out.write(data)
+    except Exception:
+        # Leave the original workbook untouched
+        os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, xlsx_path)
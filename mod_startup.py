@@ -0,0 +1,35 @@
+import importlib
+import sys
+import time
+
+# Reference point for the startup profile: this module is imported first
+# by the converter scripts
+STARTED = time.perf_counter()
+
+# Seconds spent importing each heavy module, in import order
+IMPORT_TIMES = {}
+
+def timed_import(name):
+    """Import a module by name and record how long the import took
+    Modules that are already loaded are returned without being timed again
+
+    Args:
+    name(str): Module name (for example "pandas")
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+def print_import_profile():
+    """Print the import time of every module loaded through timed_import"""
+    print("\nStartup profile:")
+    if not IMPORT_TIMES:
+        print("  No heavy modules imported")
+    for name, seconds in IMPORT_TIMES.items():
+        print(f"  {name:<12} {seconds * 1000:8.1f} ms")
+    print(f"  {'imports':<12} {sum(IMPORT_TIMES.values()) * 1000:8.1f} ms")
+    print(f"  {'total':<12} {(time.perf_counter() - STARTED) * 1000:8.1f} ms")
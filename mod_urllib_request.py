@@ -1,17 +1,82 @@
 #!/usr/bin/env python3 
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import (HTTPConnection, HTTPSConnection, HTTPException, IncompleteRead,
+                         RemoteDisconnected)
 from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
 from urllib.request import urlopen, Request
+from mod_disk_cache import DiskCache, cache_key
 
-def make_request(url, headers=None, data=None):
+# Request headers that must not be part of the cache key
+CONDITIONAL_HEADERS = ('if-none-match', 'if-modified-since')
 
-    request = Request(url, headers=headers, data=data)
+
+class HTTPCache(DiskCache):
+    """On-disk cache of GET responses, revalidated with ETag / Last-Modified
+
+    Entries are keyed by URL and request headers. Only responses that carry
+    a validator are stored; a 304 Not Modified is then served from disk and
+    counted as a hit (bytes_saved tracks the bandwidth it avoided).
+    """
+
+    def key_for(self, url, headers=None):
+        """Return the cache key of a request"""
+        headers = {
+            name.lower(): value for name, value in (headers or {}).items()
+            if name.lower() not in CONDITIONAL_HEADERS
+        }
+        return cache_key(url, headers)
+
+    def conditional_headers(self, meta):
+        """Return If-None-Match / If-Modified-Since headers for a cached entry"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, key, body, response_headers):
+        """Store a response body if it has a validator; returns True if stored"""
+        meta = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+        }
+        if not (meta['etag'] or meta['last_modified']):
+            return False
+        self.put(key, body, meta)
+        return True
+
+
+def make_request(url, headers=None, data=None, cache=None):
+    """Request a URL, print the response and return the body (None on error)
+
+    With an HTTPCache, GET requests are sent as conditional requests when a
+    cached copy exists and a 304 response is served from the cache.
+    """
+    request_headers = dict(headers or {})
+    cached = None
+    if cache is not None and data is None:
+        key = cache.key_for(url, request_headers)
+        # get() only returns entries whose file exists
+        cached = cache.get(key, count=False)
+        if cached is not None:
+            request_headers.update(cache.conditional_headers(cached[1]))
+
+    request = Request(url, headers=request_headers, data=data)
     try:
         with urlopen(request, timeout=10) as response:
-            data = response.read()
+            body = response.read()
+            if cache is not None and data is None:
+                cache.record_miss()
+                cache.store(key, body, response.headers)
             print(f'Page reading status: {response.status}')
             print('Page body:')
-            print(data.decode('utf-8'))
+            print(body.decode('utf-8'))
             print()
             if response.headers == '' or response.headers is None:
                 print('No headers to show.')
@@ -20,10 +85,223 @@ def make_request(url, headers=None, data=None):
                 print('Page headers:')
                 print(response.headers)
 
-            #return data, response
+            return body
     except HTTPError as error:
+        if error.status == 304 and cached is not None:
+            try:
+                with open(cached[0], 'rb') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                # Evicted since the lookup: drop the entry and ask for the
+                # full response, without the conditional headers
+                cache.discard(key)
+                return make_request(url, headers, data, cache)
+            cache.record_hit(len(body))
+            print(f'Page reading status: {error.status} (served from cache)')
+            print('Page body:')
+            print(body.decode('utf-8'))
+            print()
+            return body
         print(error.status, error.reason)
     except URLError as error:
         print(error.reason)
     except TimeoutError:
         print("Request timed out")
+
+
+# Bytes read from the response per chunk when streaming to disk
+CHUNK_SIZE = 64 * 1024
+
+# Redirects followed before giving up
+MAX_REDIRECTS = 5
+
+# Errors raised when a kept-alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def filename_for(url):
+    """Return the file name used to save a URL (last path segment)"""
+    name = os.path.basename(urlsplit(url).path)
+    return name or 'index.html'
+
+
+def unique_filenames(urls):
+    """Return one file name per URL, adding _2, _3... when names collide
+
+    URLs that only differ in their directory or query string share the last
+    path segment; without the suffix their downloads would overwrite each other.
+    """
+    names = []
+    taken = set()
+    for url in urls:
+        name = filename_for(url)
+        base, ext = os.path.splitext(name)
+        number = 1
+        # Compare case-insensitively: the names may land on a case-insensitive file system
+        while name.lower() in taken:
+            number += 1
+            name = f'{base}_{number}{ext}'
+        taken.add(name.lower())
+        names.append(name)
+    return names
+
+
+class KeepAliveFetcher:
+    """Download URLs concurrently over a shared pool of kept-alive connections
+
+    A connection goes back to the pool once its response is read and the
+    next request to the same host reuses it (HTTP keep-alive), from any
+    thread and across fetch_many calls; close() (or leaving the with block)
+    closes the pooled connections. Bodies are streamed to disk in chunks
+    instead of read into memory.
+    """
+
+    def __init__(self, max_workers=8, timeout=10, chunk_size=CHUNK_SIZE):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        # Idle connections by (scheme, host)
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+    def _open(self, key):
+        """Open a new connection to a (scheme, host)"""
+        scheme, netloc = key
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def _checkout(self, key):
+        """Take an idle connection to a (scheme, host) from the pool, or open one"""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return self._open(key)
+
+    def _checkin(self, key, connection):
+        """Return a connection whose response was fully read to the pool"""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            # More idle connections than threads would never be used
+            if len(idle) < self.max_workers:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _request(self, url, headers):
+        """Send a GET request on a pooled connection, retrying once on a stale one
+
+        Returns (key, connection, response); the connection must go back to
+        the pool with _checkin once the response is read, or be closed.
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        key = (parts.scheme, parts.netloc)
+        for attempt in range(2):
+            connection = self._checkout(key) if attempt == 0 else self._open(key)
+            try:
+                connection.request('GET', path, headers=headers or {})
+                return key, connection, connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if attempt:
+                    raise
+            except (OSError, HTTPException):
+                connection.close()
+                raise
+
+    def fetch(self, url, dest_path, headers=None):
+        """Download one URL to dest_path, streaming the body in chunks
+
+        Returns a dict with url, path, status, headers, bytes, elapsed and error.
+        """
+        result = {'url': url, 'path': None, 'status': None, 'headers': {},
+                  'bytes': 0, 'elapsed': 0.0, 'error': None}
+        start = time.perf_counter()
+        # Written to a temporary file so a failed download never looks complete
+        part_path = dest_path + '.part'
+        # Connection of the response being read, closed if the download fails
+        connection = None
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                key, connection, response = self._request(url, headers)
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    response.read()
+                    self._checkin(key, connection)
+                    connection = None
+                    url = urljoin(url, location)
+                    continue
+                redirected = False
+                break
+            else:
+                # The last response was still a redirect (its body is already read)
+                redirected = True
+
+            result['status'] = response.status
+            result['headers'] = dict(response.getheaders())
+            if redirected:
+                result['error'] = f'too many redirects (more than {MAX_REDIRECTS})'
+            elif response.status >= 400:
+                response.read()
+                result['error'] = response.reason
+            else:
+                with open(part_path, 'wb') as f:
+                    while True:
+                        chunk = response.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        result['bytes'] += len(chunk)
+                if response.length:
+                    # read(n) returns b'' when the server closes the connection
+                    # early: bytes announced by Content-Length are still missing
+                    raise IncompleteRead(b'', response.length)
+                os.replace(part_path, dest_path)
+                result['path'] = dest_path
+            if connection is not None:
+                self._checkin(key, connection)
+        except (OSError, HTTPException) as error:
+            if connection is not None:
+                # Part of the response may still be unread
+                connection.close()
+            result['error'] = str(error)
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+        result['elapsed'] = time.perf_counter() - start
+        return result
+
+    def fetch_many(self, urls, dest_dir, headers=None):
+        """Download many URLs into dest_dir on a bounded thread pool
+
+        Files are named after the last segment of each URL path, with a _2,
+        _3... suffix for URLs whose names collide (see unique_filenames).
+        Results are returned in the same order as urls.
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.fetch, url, os.path.join(dest_dir, name), headers)
+                for url, name in zip(urls, unique_filenames(urls))
+            ]
+            return [future.result() for future in futures]
@@ -0,0 +1,479 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from mod_batch_converter import convert_one, is_up_to_date
+from mod_columnar_ingest import COLUMNAR_EXTENSIONS
+from mod_metrics import JsonLinesWriter
+from mod_startup import timed_import
+
+# Seconds a file must stay unchanged (same size and mtime) before it is converted
+SETTLE_SECONDS = 2.0
+
+# Seconds between two scans of the polling watcher
+POLL_INTERVAL = 1.0
+
+# Seconds between two stats reports
+STATS_INTERVAL = 10.0
+
+# Longest wait for file events while jobs are running, so finished jobs
+# free their worker quickly
+JOB_CHECK_INTERVAL = 0.1
+
+# Finished jobs kept for the latency percentiles
+LATENCY_WINDOW = 1000
+
+# Extensions handled by the service and the converter of each one
+# (Parquet/Arrow/Feather tables go through the CSV converter too)
+KINDS = {".csv": "csv", ".docx": "docx", **dict.fromkeys(COLUMNAR_EXTENSIONS, "csv")}
+
+# inotify flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+def file_kind(path):
+    """Return "csv" or "docx" for a file the service converts, or None
+    Converter outputs (*_APA.docx), Word lock files (~$*) and hidden files
+    such as partial uploads are ignored
+    """
+    name = os.path.basename(path)
+    if name.startswith(("~$", ".")) or name.endswith("_APA.docx"):
+        return None
+    return KINDS.get(os.path.splitext(name)[1].lower())
+
+def needs_conversion(path):
+    """Check if a file has no output yet or an output older than the file"""
+    if file_kind(path) == "csv":
+        return not is_up_to_date(path)
+    from mod_APA_docx_converter import apa_output_path
+    output_path = apa_output_path(path)
+    return not (os.path.exists(output_path)
+                and os.path.getmtime(output_path) >= os.path.getmtime(path))
+
+def list_files(directories):
+    """Return the files of the watched directories the service converts"""
+    paths = []
+    for directory in directories:
+        for entry in os.scandir(directory):
+            if entry.is_file() and file_kind(entry.path):
+                paths.append(entry.path)
+    return sorted(paths)
+
+def file_signature(path):
+    """Return (size, mtime) of a file, or None if it disappeared"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class InotifyWatcher:
+    """Report the files written or moved into directories with Linux inotify (through ctypes)"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.directories = directories
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.watches[wd] = directory
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of paths that changed"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: look at every file again
+                paths.update(list_files(self.directories))
+            elif name and wd in self.watches:
+                paths.add(os.path.join(self.watches[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Report changed files by scanning the directories (for systems without inotify)"""
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self.signatures = {path: file_signature(path) for path in list_files(directories)}
+        self.next_scan = time.monotonic() + interval
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of paths that changed"""
+        delay = self.next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(delay, 0))
+        self.next_scan = time.monotonic() + self.interval
+
+        signatures = {path: file_signature(path) for path in list_files(self.directories)}
+        changed = {path for path, signature in signatures.items()
+                   if self.signatures.get(path) != signature}
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(directories, polling=False, interval=POLL_INTERVAL):
+    """Return an inotify watcher where available, else a polling watcher"""
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            # No inotify (not Linux) or no watches left: fall back to scanning
+            pass
+    return PollingWatcher(directories, interval)
+
+class Debouncer:
+    """Hold back files until they stop changing, so partially written files are not converted"""
+
+    def __init__(self, settle=SETTLE_SECONDS):
+        self.settle = settle
+        # path -> (deadline, signature, time of the first event)
+        self.pending = {}
+
+    def touch(self, path, now):
+        """Record a change of a file and restart its settle period"""
+        first_seen = self.pending[path][2] if path in self.pending else now
+        self.pending[path] = (now + self.settle, file_signature(path), first_seen)
+
+    def ready(self, now):
+        """Return (path, time of the first event) for the files that settled"""
+        ready = []
+        for path, (deadline, signature, first_seen) in list(self.pending.items()):
+            if deadline > now:
+                continue
+            current = file_signature(path)
+            if current is None:
+                # Deleted or moved away before it settled
+                del self.pending[path]
+            elif current != signature:
+                self.pending[path] = (now + self.settle, current, first_seen)
+            else:
+                del self.pending[path]
+                ready.append((path, first_seen))
+        return ready
+
+    def next_deadline(self):
+        """Return the earliest settle deadline, or None"""
+        return min((deadline for deadline, _, _ in self.pending.values()), default=None)
+
+class QueueStats:
+    """Queue depth, throughput and latency of the service"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.queued = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        # (latency, wait) of the last finished jobs; latency runs from the
+        # first event of the file to the end of its conversion
+        self.recent = deque(maxlen=window)
+
+    def update_depth(self, queued, running):
+        self.queued = queued
+        self.running = running
+        self.max_queue_depth = max(self.max_queue_depth, queued)
+
+    def record(self, latency, wait_seconds, failed):
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.recent.append((latency, wait_seconds))
+
+    def snapshot(self):
+        """Return the current stats as a dict"""
+        latencies = sorted(latency for latency, _ in self.recent)
+        waits = [wait_seconds for _, wait_seconds in self.recent]
+        uptime = time.monotonic() - self.started
+
+        def percentile(fraction):
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)], 3)
+
+        stats = {
+            "queue_depth": self.queued,
+            "running": self.running,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "files_per_min": round((self.completed + self.failed) / uptime * 60, 2) if uptime > 0 else 0.0,
+        }
+        if latencies:
+            stats.update({
+                "latency_avg": round(sum(latencies) / len(latencies), 3),
+                "latency_p50": percentile(0.5),
+                "latency_p95": percentile(0.95),
+                "latency_max": round(latencies[-1], 3),
+                "wait_avg": round(sum(waits) / len(waits), 3),
+            })
+        return stats
+
+    def format(self):
+        """Return a one-line report of the stats"""
+        stats = self.snapshot()
+        line = (f"queue {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+                f"running {stats['running']}, done {stats['completed']}, failed {stats['failed']}")
+        if "latency_avg" in stats:
+            line += (f", latency avg {stats['latency_avg']:.2f}s p95 {stats['latency_p95']:.2f}s "
+                     f"max {stats['latency_max']:.2f}s")
+        return line
+
+def warm_worker():
+    """Pool initializer: import the converters once, so every job finds them loaded"""
+    # Ctrl+C or SIGTERM stop the service, which lets the running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    timed_import("pandas")
+    timed_import("mod_csv_file_converter")
+    timed_import("mod_APA_docx_converter")
+
+def ping():
+    """No-op job that makes the pool start its worker processes"""
+    return os.getpid()
+
+def convert_file(path, csv_options=None, docx_options=None):
+    """Convert one file with the converter of its kind (executed in a worker process)
+
+    Returns:
+    dict: input, output, seconds and error (plus rows for CSV files)
+    """
+    if file_kind(path) == "csv":
+        from mod_csv_file_converter import convert_csv_to_xlsx
+        return convert_one(convert_csv_to_xlsx, path, **(csv_options or {}))
+
+    from mod_APA_docx_converter import format_apa, apa_output_path
+    output_path = apa_output_path(path)
+    start = time.perf_counter()
+    try:
+        format_apa(path, output_path, docx_options)
+        error = None
+    except Exception as e:
+        output_path = None
+        error = str(e)
+    return {"input": path, "output": output_path,
+            "seconds": time.perf_counter() - start, "error": error}
+
+class WatchService:
+    """Watch inbox directories and convert the CSV and DOCX files that land in them
+
+    Settled files wait in a queue and are handed to a pool of max_workers
+    processes, at most one job per worker at a time, so the queue depth
+    shows the backlog. The workers import the converters once at startup
+    and stay alive between jobs.
+    """
+
+    def __init__(self, directories, max_workers=None, settle=SETTLE_SECONDS, polling=False,
+                 poll_interval=POLL_INTERVAL, stats_interval=STATS_INTERVAL,
+                 csv_options=None, docx_options=None, listeners=None, verbose=True):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.debouncer = Debouncer(settle)
+        self.polling = polling
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.csv_options = csv_options or {}
+        self.docx_options = docx_options or {}
+        self.listeners = list(listeners or [])
+        self.verbose = verbose
+        self.stats = QueueStats()
+        # (path, time of the first event, time it was queued)
+        self.queue = deque()
+        self.queued_paths = set()
+        self.stopping = False
+
+    def emit(self, event, **fields):
+        """Send an event dict to every listener"""
+        record = {"event": event, "time": time.time(), **fields}
+        for listener in self.listeners:
+            listener(record)
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    def enqueue(self, path, first_seen, now):
+        """Add a settled file to the queue unless it is queued already"""
+        if path in self.queued_paths:
+            return
+        self.queued_paths.add(path)
+        self.queue.append((path, first_seen, now))
+
+    def stop(self, *args):
+        """Stop watching; running jobs are finished before run() returns"""
+        if not self.stopping:
+            self.log("Stopping, waiting for the running jobs...")
+        self.stopping = True
+
+    def run(self, once=False):
+        """Watch and convert until stopped (SIGINT/SIGTERM), or until idle with once=True
+
+        Args:
+        once(bool): Convert the files already in the inboxes and return
+
+        Returns:
+        dict: Final stats
+        """
+        handlers = {signum: signal.signal(signum, self.stop)
+                    for signum in (signal.SIGINT, signal.SIGTERM)}
+        watcher = make_watcher(self.directories, self.polling, self.poll_interval)
+        self.log(f"Watching {', '.join(self.directories)} with {type(watcher).__name__}, "
+                 f"{self.max_workers} workers")
+
+        running = {}
+        now = time.monotonic()
+        # Files that landed while the service was down
+        for path in list_files(self.directories):
+            if needs_conversion(path):
+                self.enqueue(path, now, now)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=warm_worker) as pool:
+                # Start and warm every worker before the first job
+                wait([pool.submit(ping) for _ in range(self.max_workers)])
+                next_stats = time.monotonic() + self.stats_interval
+
+                while True:
+                    now = time.monotonic()
+                    if not self.stopping:
+                        # Queue the files that settled and hand them to idle workers
+                        for path, first_seen in self.debouncer.ready(now):
+                            self.enqueue(path, first_seen, now)
+                        while self.queue and len(running) < self.max_workers:
+                            path, first_seen, queued_at = self.queue.popleft()
+                            self.queued_paths.discard(path)
+                            future = pool.submit(convert_file, path, self.csv_options, self.docx_options)
+                            running[future] = (path, first_seen, queued_at, now)
+                    self.stats.update_depth(len(self.queue), len(running))
+
+                    if self.stopping and not running:
+                        break
+                    if once and not self.queue and not running and not self.debouncer.pending:
+                        break
+
+                    if self.stopping:
+                        # Only wait for the running jobs
+                        done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    else:
+                        # Sleep until a file changes or settles, or stats are due,
+                        # checking the running jobs at least every JOB_CHECK_INTERVAL
+                        deadline = min(next_stats, self.debouncer.next_deadline() or next_stats)
+                        timeout = min(max(deadline - now, 0.0), self.poll_interval)
+                        if running:
+                            timeout = min(timeout, JOB_CHECK_INTERVAL)
+                        for path in watcher.poll(timeout):
+                            if file_kind(path):
+                                self.debouncer.touch(path, time.monotonic())
+                        done, _ = wait(running, timeout=0) if running else (set(), None)
+                    for future in done:
+                        self.finish(future, *running.pop(future))
+                    self.stats.update_depth(len(self.queue), len(running))
+
+                    if time.monotonic() >= next_stats:
+                        self.emit("stats", **self.stats.snapshot())
+                        self.log(f"[stats] {self.stats.format()}")
+                        next_stats = time.monotonic() + self.stats_interval
+        finally:
+            watcher.close()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        summary = self.stats.snapshot()
+        self.emit("summary", **summary)
+        self.log(f"[summary] {self.stats.format()}")
+        return summary
+
+    def finish(self, future, path, first_seen, queued_at, started_at):
+        """Record the result of a finished job"""
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"input": path, "output": None, "seconds": 0.0, "error": str(e)}
+        latency = time.monotonic() - first_seen
+        self.stats.record(latency, started_at - queued_at, result["error"] is not None)
+        self.emit("job", **result, latency=round(latency, 3),
+                  wait=round(started_at - queued_at, 3))
+        if result["error"]:
+            self.log(f"FAILED {path}: {result['error']}")
+        else:
+            self.log(f"{os.path.basename(path)} -> {os.path.basename(result['output'])} "
+                     f"in {result['seconds']:.2f}s (latency {latency:.2f}s)")
+
+def parse_args():
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Watch inbox folders and convert CSV files to excel and DOCX files to APA format"
+    )
+    parser.add_argument("directories", nargs="+", help="Inbox directories to watch")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help=f"Seconds a file must stay unchanged before it is converted "
+                             f"(default: {SETTLE_SECONDS})")
+    parser.add_argument("--polling", action="store_true",
+                        help="Scan the directories instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between scans when polling (default: {POLL_INTERVAL})")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL,
+                        help=f"Seconds between stats reports (default: {STATS_INTERVAL})")
+    parser.add_argument("--stats-jsonl", help="Append job, stats and summary events to this JSON lines file")
+    parser.add_argument("--once", action="store_true",
+                        help="Convert the files already in the inboxes and exit")
+    parser.add_argument("--stream", action="store_true", help="Convert CSV files in streaming mode")
+    parser.add_argument("--docx-engine", choices=["python-docx", "stream"], default="python-docx",
+                        help="Engine of the APA formatter")
+    parser.add_argument("--running-head", default=None, help="Running head of the DOCX files")
+    return parser.parse_args()
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+    listeners = [JsonLinesWriter(os.path.abspath(args.stats_jsonl))] if args.stats_jsonl else []
+    service = WatchService(
+        args.directories, max_workers=args.workers, settle=args.settle, polling=args.polling,
+        poll_interval=args.poll_interval, stats_interval=args.stats_interval,
+        csv_options={"streaming": args.stream},
+        docx_options={"engine": args.docx_engine, "running_head": args.running_head},
+        listeners=listeners,
+    )
+    service.run(once=args.once)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+from mod_startup import timed_import, print_import_profile
+import os
+import re
+import csv
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+timed_import("openpyxl")
+from openpyxl import load_workbook
+from mod_batch_converter import format_bytes
+from mod_sheet_xml import INDEX_SHEET
+
+# Characters that cannot be used in file names on Windows
+UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|]')
+
+def csv_dir_for(xlsx_path):
+    """Return the folder that receives the CSV files of a workbook (<name>_csv next to it)"""
+    file_dir = os.path.dirname(xlsx_path)
+    file_name = os.path.splitext(os.path.basename(xlsx_path))[0]
+    return os.path.join(file_dir, f"{file_name}_csv")
+
+def csv_value(value):
+    """Return a cell value as CSV text the converter reads back as the same value
+    Dates at midnight are written without the time, other dates and times in
+    ISO format; None becomes an empty field
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0):
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+def column_positions(header, columns):
+    """Return the positions of the selected columns in a header row
+    Names are matched ignoring case and surrounding spaces, since the
+    converter writes the header in upper case
+
+    Args:
+    header(tuple): Values of the header row
+    columns(list): Names of the columns to extract, in output order
+    """
+    names = [str(value).strip().casefold() if value is not None else "" for value in header]
+    positions = []
+    missing = []
+    for column in columns:
+        key = column.strip().casefold()
+        if key in names:
+            positions.append(names.index(key))
+        else:
+            missing.append(column)
+    if missing:
+        available = ", ".join(str(value) for value in header if value is not None)
+        raise ValueError(f"Columns not found: {', '.join(missing)} (available: {available})")
+    return positions
+
+def select_sheets(sheet_names, sheets=None):
+    """Return the sheets to extract from a workbook
+
+    Args:
+    sheet_names(list): Sheet names of the workbook, in order
+    sheets(list): Names to extract (default: every sheet but the INDEX_SHEET
+        of a partitioned workbook)
+    """
+    if sheets:
+        missing = [name for name in sheets if name not in sheet_names]
+        if missing:
+            raise ValueError(f"Sheets not found: {', '.join(missing)} "
+                             f"(available: {', '.join(sheet_names)})")
+        return list(sheets)
+    data_sheets = [name for name in sheet_names if name != INDEX_SHEET]
+    return data_sheets or list(sheet_names)
+
+def extract_sheet(xlsx_path, sheet_name, csv_path, columns=None):
+    """Stream one sheet of a workbook to a CSV file (executed in a worker process)
+    The workbook is opened in read-only mode, so rows are parsed from the
+    worksheet XML one at a time and written straight to the CSV: memory
+    stays constant whatever the size of the sheet
+
+    Args:
+    xlsx_path(str): Path to the excel file
+    sheet_name(str): Sheet to extract
+    csv_path(str): Path to the CSV file to create
+    columns(list): Header names of the columns to extract (default: all)
+
+    Returns:
+    dict: input, sheet, output, rows (data rows written), seconds and error
+    """
+    start = time.perf_counter()
+    rows = 0
+    tmp_path = csv_path + ".tmp"
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        # Workbooks written in write-only mode have no dimension tag; do not
+        # trust it either when present, rows are read until the end
+        ws.reset_dimensions()
+        row_values = ws.iter_rows(values_only=True)
+        header = next(row_values, None)
+
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if header is not None:
+                positions = column_positions(header, columns) if columns else None
+                width = len(header)
+                if positions is not None:
+                    writer.writerow([header[pos] for pos in positions])
+                else:
+                    writer.writerow(["" if value is None else value for value in header])
+                for values in row_values:
+                    if len(values) < width:
+                        # Trailing empty cells may be missing from a row
+                        values = values + (None,) * (width - len(values))
+                    if positions is not None:
+                        writer.writerow([csv_value(values[pos]) for pos in positions])
+                    else:
+                        writer.writerow([csv_value(value) for value in values[:width]])
+                    rows += 1
+        os.replace(tmp_path, csv_path)
+        error = None
+    except Exception as e:
+        # Leave a CSV from an earlier extraction untouched
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        csv_path = None
+        error = str(e)
+    finally:
+        # Read-only workbooks keep the file open until closed
+        wb.close()
+    return {"input": xlsx_path, "sheet": sheet_name, "output": csv_path, "rows": rows,
+            "seconds": time.perf_counter() - start, "error": error}
+
+def plan_extraction(xlsx_paths, sheets=None, output_dir=None):
+    """Return the (workbook, sheet, CSV path) jobs of an extraction
+    Every sheet goes to <output_dir>/<sheet>.csv, by default in a
+    <name>_csv folder next to the workbook (created if needed)
+
+    Args:
+    xlsx_paths(list): Excel files
+    sheets(list): Sheet names to extract from each file (default: data sheets)
+    output_dir(str): Folder for the CSV files (default: one folder per workbook)
+    """
+    jobs = []
+    for xlsx_path in xlsx_paths:
+        # Read-only loading only parses the workbook part to list the sheets
+        wb = load_workbook(xlsx_path, read_only=True)
+        sheet_names = wb.sheetnames
+        wb.close()
+        target_dir = output_dir or csv_dir_for(xlsx_path)
+        os.makedirs(target_dir, exist_ok=True)
+        for sheet_name in select_sheets(sheet_names, sheets):
+            file_name = UNSAFE_NAME_RE.sub("_", sheet_name)
+            if output_dir and len(xlsx_paths) > 1:
+                # Several workbooks share the folder
+                base = os.path.splitext(os.path.basename(xlsx_path))[0]
+                file_name = f"{base}_{file_name}"
+            jobs.append((xlsx_path, sheet_name, os.path.join(target_dir, f"{file_name}.csv")))
+    return jobs
+
+def xlsx_to_csv(xlsx_paths, sheets=None, columns=None, output_dir=None, max_workers=None):
+    """Extract sheets of excel files to CSV files, several sheets in parallel
+
+    Args:
+    xlsx_paths(list): Excel files
+    sheets(list): Sheet names to extract from each file (default: every
+        sheet but the index sheet of a partitioned workbook)
+    columns(list): Header names of the columns to extract (default: all)
+    output_dir(str): Folder for the CSV files (default: <name>_csv next
+        to each workbook)
+    max_workers(int): Worker processes (default: number of CPUs; sheets
+        are extracted in this process when there is only one)
+
+    Returns:
+    tuple: (results sorted by workbook and sheet order, elapsed seconds)
+    """
+    start = time.perf_counter()
+    jobs = plan_extraction(xlsx_paths, sheets, output_dir)
+    if len(jobs) == 1 or max_workers == 1:
+        results = [extract_sheet(*job, columns) for job in jobs]
+    else:
+        results = [None] * len(jobs)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(extract_sheet, *job, columns): index
+                       for index, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    return results, time.perf_counter() - start
+
+def print_extraction_summary(results, elapsed):
+    """Print rows, size and rows/s of every extracted sheet plus the aggregate throughput"""
+    print(f"\n{'Sheet':<40} {'Rows':>10} {'Output':>10} {'Time':>8} {'Rows/s':>10}")
+    for result in results:
+        name = f"{os.path.basename(result['input'])}:{result['sheet']}"
+        if result["error"]:
+            print(f"{name:<40} FAILED: {result['error']}")
+            continue
+        rate = result["rows"] / result["seconds"] if result["seconds"] > 0 else 0.0
+        print(f"{name:<40} {result['rows']:>10} "
+              f"{format_bytes(os.path.getsize(result['output'])):>10} "
+              f"{result['seconds']:>7.2f}s {rate:>10,.0f}")
+
+    extracted = [result for result in results if not result["error"]]
+    total_rows = sum(result["rows"] for result in extracted)
+    print(f"\nExtracted: {len(extracted)} sheets  Failed: {len(results) - len(extracted)}  "
+          f"Wall time: {elapsed:.2f}s")
+    if elapsed > 0 and extracted:
+        print(f"Throughput: {total_rows / elapsed:,.0f} rows/s")
+    if extracted:
+        print(f"Output folder: {os.path.dirname(extracted[0]['output'])}")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Extract the sheets of excel files (for example converted CSVs) back to CSV files")
+    parser.add_argument("paths", nargs="+", help="Excel files")
+    parser.add_argument("--sheets",
+                        help="Comma-separated sheet names (default: all but the index sheet)")
+    parser.add_argument("--columns",
+                        help="Comma-separated header names of the columns to extract (any case)")
+    parser.add_argument("--output-dir",
+                        help="Folder for the CSV files (default: <name>_csv next to each file)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for the sheets (default: number of CPUs)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report the import time of openpyxl")
+    return parser.parse_args()
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+    sheets = [name.strip() for name in args.sheets.split(",")] if args.sheets else None
+    columns = [name.strip() for name in args.columns.split(",")] if args.columns else None
+
+    try:
+        results, elapsed = xlsx_to_csv(args.paths, sheets, columns, args.output_dir, args.workers)
+    except (OSError, ValueError) as e:
+        # Missing file, not an excel file or unknown sheet
+        print(f"Error: {e}")
+    else:
+        print_extraction_summary(results, elapsed)
+
+    if args.profile_startup:
+        print_import_profile()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from openpyxl import load_workbook
+from mod_csv_ingest import SAMPLE_ROWS
+from mod_csv_file_converter import stream_csv_to_xlsx
+from mod_parallel_xlsx import parallel_csv_to_xlsx
+
+
+def sheet_values(path):
+    wb = load_workbook(path, read_only=True)
+    try:
+        return [row for ws in wb.worksheets for row in ws.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+class ParallelCsvToXlsxTest(unittest.TestCase):
+
+    def test_late_decimal_in_integer_column_matches_streaming(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'late.csv')
+            with open(csv_path, 'w', encoding='utf-8') as f:
+                f.write('id,amount\n')
+                # The sampled rows are all integers, the decimal comes in a later range
+                for i in range(SAMPLE_ROWS + 1000):
+                    f.write(f'{i},{i * 2}\n')
+                f.write(f'{SAMPLE_ROWS + 1000},1.5\n')
+            parallel_path = os.path.join(tmp_dir, 'parallel.xlsx')
+            stream_path = os.path.join(tmp_dir, 'stream.xlsx')
+
+            rows = parallel_csv_to_xlsx(csv_path, parallel_path, max_workers=2, rows_per_range=2000)
+            self.assertEqual(rows, SAMPLE_ROWS + 1001)
+            stream_csv_to_xlsx(csv_path, stream_path)
+            self.assertEqual(sheet_values(parallel_path), sheet_values(stream_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mod_urllib_request import HTTPCache, KeepAliveFetcher, make_request, unique_filenames
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves the request path as the body; /loop redirects to itself,
+    /short closes the connection before sending the announced body and
+    /etag answers 304 to a request that carries its ETag"""
+    protocol_version = 'HTTP/1.1'
+    # Client ports of the requests, one per connection used
+    client_ports = []
+
+    def do_GET(self):
+        self.client_ports.append(self.client_address[1])
+        if self.path.startswith('/loop'):
+            self.send_response(302)
+            self.send_header('Location', '/loop')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/short'):
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'partial')
+            self.close_connection = True
+            return
+        if self.path.startswith('/etag') and self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            return
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveFetcherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_unique_filenames(self):
+        names = unique_filenames(['http://h/a/data.csv', 'http://h/b/data.csv',
+                                  'http://h/a/data.csv?x=1', 'http://h/'])
+        self.assertEqual(names, ['data.csv', 'data_2.csv', 'data_3.csv', 'index.html'])
+
+    def test_colliding_names_keep_every_download(self):
+        urls = [f'{self.base}/a/data.csv', f'{self.base}/b/data.csv', f'{self.base}/a/data.csv?v=2']
+        with tempfile.TemporaryDirectory() as dest_dir, KeepAliveFetcher(max_workers=3) as fetcher:
+            results = fetcher.fetch_many(urls, dest_dir)
+            paths = [result['path'] for result in results]
+            self.assertEqual(len(set(paths)), len(urls))
+            for result in results:
+                self.assertIsNone(result['error'])
+                with open(result['path'], 'rb') as f:
+                    self.assertEqual(f.read(), result['url'][len(self.base):].encode('utf-8'))
+
+    def test_connections_are_reused_across_calls(self):
+        urls = [f'{self.base}/a/{number}.csv' for number in range(4)]
+        Handler.client_ports.clear()
+        with tempfile.TemporaryDirectory() as dest_dir, KeepAliveFetcher(max_workers=2) as fetcher:
+            fetcher.fetch_many(urls, dest_dir)
+            fetcher.fetch_many(urls, os.path.join(dest_dir, 'again'))
+        self.assertEqual(len(Handler.client_ports), 8)
+        self.assertLessEqual(len(set(Handler.client_ports)), 2)
+
+    def test_redirect_loop_is_an_error(self):
+        with tempfile.TemporaryDirectory() as dest_dir, KeepAliveFetcher() as fetcher:
+            dest_path = os.path.join(dest_dir, 'loop')
+            result = fetcher.fetch(f'{self.base}/loop', dest_path)
+            self.assertIn('too many redirects', result['error'])
+            self.assertEqual(result['status'], 302)
+            self.assertIsNone(result['path'])
+            self.assertEqual(os.listdir(dest_dir), [])
+
+    def test_broken_download_leaves_no_part_file(self):
+        with tempfile.TemporaryDirectory() as dest_dir, KeepAliveFetcher() as fetcher:
+            result = fetcher.fetch(f'{self.base}/short', os.path.join(dest_dir, 'short'))
+            self.assertIsNotNone(result['error'])
+            self.assertIsNone(result['path'])
+            self.assertEqual(os.listdir(dest_dir), [])
+
+
+class EvictingCache(HTTPCache):
+    """Cache whose files disappear right after the lookup, as when another
+    process evicts them before the 304 arrives"""
+
+    def get(self, key, count=True):
+        cached = super().get(key, count)
+        if cached is not None:
+            os.remove(cached[0])
+        return cached
+
+
+class MakeRequestCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_not_modified_is_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = HTTPCache(cache_dir)
+            url = f'{self.base}/etag'
+            self.assertEqual(make_request(url, cache=cache), b'/etag')
+            self.assertEqual(make_request(url, cache=cache), b'/etag')
+            self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_evicted_entry_is_fetched_again(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            url = f'{self.base}/etag'
+            make_request(url, cache=HTTPCache(cache_dir))
+            cache = EvictingCache(cache_dir)
+            self.assertEqual(make_request(url, cache=cache), b'/etag')
+            self.assertEqual(cache.stats()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()